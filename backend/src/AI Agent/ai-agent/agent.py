@@ -1,7 +1,7 @@
 """
 DQN Leader Election Agent — Phase 1
 =====================================
-Reads real metrics from 4 hospital nodes via Prometheus:
+Reads real metrics from every hospital node scraped by Prometheus:
   - CPU usage
   - Memory usage
   - Average latency (ms)
@@ -9,27 +9,65 @@ Reads real metrics from 4 hospital nodes via Prometheus:
   - Success rate
   - Error rate
 
+Hospitals are discovered from Prometheus' scrape targets, so nodes can be
+added or removed without editing this file.
+
 Uses a Deep Q-Network (DQN) to learn which hospital makes
 the best leader. Prints a full explanation every election round.
 """
 
-import os, time, random, logging
+import os, json, glob, time, random, logging
 import numpy as np
-from collections import deque
 import requests
 import torch
 import torch.nn as nn
 import torch.optim as optim
 
 # ── Settings ───────────────────────────────────────────────────
-PROMETHEUS = os.getenv("PROMETHEUS_URL", "http://prometheus:9090")
-INTERVAL   = int(os.getenv("ELECTION_INTERVAL", "30"))
-HOSPITALS  = ["hospitala", "hospitalb", "hospitalc", "hospitald"]
+PROMETHEUS   = os.getenv("PROMETHEUS_URL", "http://prometheus:9090")
+INTERVAL     = int(os.getenv("ELECTION_INTERVAL", "30"))
+HOSPITAL_JOB = os.getenv("HOSPITAL_JOB", "hospital_nodes")      # Prometheus scrape job
+DISCOVERY_INTERVAL = int(os.getenv("DISCOVERY_INTERVAL", "300"))  # seconds
+TABLE_ROWS   = int(os.getenv("TABLE_ROWS", "20"))               # display limit for large networks
 
-# State = 6 metrics × 4 hospitals = 24 inputs
+# State = hospitals × 6 metrics, one row per hospital
 METRICS    = ["cpu", "memory", "latency", "throughput", "success_rate", "error_rate"]
-STATE_SIZE  = len(HOSPITALS) * len(METRICS)
-ACTION_SIZE = len(HOSPITALS)
+N_METRICS  = len(METRICS)
+
+# PoRI scoring. Each metric is divided by its cap and clipped to 1.0, then
+#   score = clip(Σ weight × normalised metric, 0, 1)
+# Defaults reflect EHR system priorities:
+#   Success rate  +30%  — reliability is most important
+#   Throughput    +25%  — higher capacity = better leader
+#   Latency       -20%  — faster = better ZKP generation
+#   CPU           -15%  — less busy = more headroom
+#   Error rate    -10%  — penalise unreliable nodes
+# PORI_CONFIG may name a JSON file {"caps": {...}, "weights": {...}}
+# overriding any of them.
+PORI_CAPS = {"cpu": 100.0, "memory": 100.0, "latency": 500.0,     # %, %, ms
+             "throughput": 10.0, "success_rate": 1.0, "error_rate": 1.0}  # rps
+PORI_WEIGHTS = {"cpu": -0.15, "memory": 0.0, "latency": -0.20,
+                "throughput": 0.25, "success_rate": 0.30, "error_rate": -0.10}
+
+
+def load_pori_config(path: str | None = os.getenv("PORI_CONFIG")) -> tuple:
+    """(caps, weights) as float32 vectors in METRICS order."""
+    caps, weights = dict(PORI_CAPS), dict(PORI_WEIGHTS)
+    if path:
+        with open(path) as f:
+            cfg = json.load(f)
+        for name, target in (("caps", caps), ("weights", weights)):
+            unknown = set(cfg.get(name, {})) - set(METRICS)
+            if unknown:
+                raise ValueError(f"PORI_CONFIG {name}: unknown metrics {sorted(unknown)}")
+            target.update({k: float(v) for k, v in cfg.get(name, {}).items()})
+        if min(caps.values()) <= 0:
+            raise ValueError("PORI_CONFIG caps must be positive")
+    return (np.array([caps[m] for m in METRICS], dtype=np.float32),
+            np.array([weights[m] for m in METRICS], dtype=np.float32))
+
+
+CAPS, WEIGHTS = load_pori_config()
 
 # DQN hyperparameters
 LR            = 0.001
@@ -40,6 +78,14 @@ EPSILON_DECAY = 0.97
 BATCH_SIZE    = 32
 MEM_SIZE      = 500
 SYNC_EVERY    = 5
+HIDDEN        = 64
+
+# Checkpoints: policy/target nets, optimizer, epsilon, round counter and
+# replay memory, so a restarted agent resumes instead of exploring again
+CHECKPOINT_DIR   = os.getenv("CHECKPOINT_DIR", "checkpoints")
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "1"))    # rounds
+CHECKPOINT_KEEP  = int(os.getenv("CHECKPOINT_KEEP", "3"))
+CHECKPOINT_VERSION = 1
 
 logging.basicConfig(level=logging.WARNING)   # suppress noisy logs
 
@@ -47,131 +93,342 @@ logging.basicConfig(level=logging.WARNING)   # suppress noisy logs
 # ── Neural network ─────────────────────────────────────────────
 class DQN(nn.Module):
     """
-    24 inputs  →  64 hidden  →  64 hidden  →  4 outputs
-    Output = Q-value per hospital (higher = better leader choice)
+    Scores any number of hospitals with the same weights:
+      encoder   6 metrics → 64 → 64 per hospital (shared)
+      pooling   mean + max over all hospitals → network context
+      head      [hospital, mean, max] 192 → 64 → 1 Q-value
+    Input (batch, N, 6), output (batch, N) = Q-value per hospital
+    (higher = better leader choice). Reordering hospitals reorders the
+    output the same way, and adding one does not change any weight shape.
     """
-    def __init__(self):
+    def __init__(self, hidden: int = HIDDEN):
         super().__init__()
-        self.net = nn.Sequential(
-            nn.Linear(STATE_SIZE, 64), nn.ReLU(),
-            nn.Linear(64, 64),         nn.ReLU(),
-            nn.Linear(64, ACTION_SIZE),
+        self.encoder = nn.Sequential(
+            nn.Linear(N_METRICS, hidden), nn.ReLU(),
+            nn.Linear(hidden, hidden),    nn.ReLU(),
+        )
+        self.head = nn.Sequential(
+            nn.Linear(3 * hidden, hidden), nn.ReLU(),
+            nn.Linear(hidden, 1),
         )
     def forward(self, x):
-        return self.net(x)
+        h   = self.encoder(x)                                   # (B, N, H)
+        ctx = torch.cat([h.mean(1), h.amax(1)], dim=-1)         # (B, 2H)
+        ctx = ctx.unsqueeze(1).expand(-1, h.shape[1], -1)       # (B, N, 2H)
+        return self.head(torch.cat([h, ctx], dim=-1)).squeeze(-1)
 
 
 # ── Replay memory ──────────────────────────────────────────────
+PRIORITIZED = os.getenv("REPLAY_PRIORITIZED", "0") == "1"
+PER_ALPHA   = 0.6          # how strongly TD error shapes sampling (0 = uniform)
+PER_BETA    = 0.4          # importance-sampling correction, annealed to 1.0
+PER_BETA_STEPS = 1000      # train steps until beta reaches 1.0
+PER_EPS     = 1e-3         # keeps every transition sampleable
+
+
+class SumTree:
+    """
+    Binary sum tree over `capacity` leaf priorities stored in one array
+    (root at 1, leaves from `size`). Batched updates and prefix-sum
+    sampling walk all indexes level by level with NumPy.
+    """
+    def __init__(self, capacity: int):
+        self.size = 1 << max(capacity - 1, 1).bit_length()
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self) -> float:
+        return self.tree[1]
+
+    def set(self, idx: int, priority: float):
+        """Single-leaf update (every push), without array temporaries."""
+        tree = self.tree
+        i = idx + self.size
+        tree[i] = priority
+        i //= 2
+        while i >= 1:
+            tree[i] = tree[2 * i] + tree[2 * i + 1]
+            i //= 2
+
+    def update(self, idx, priority):
+        i = np.asarray(idx, dtype=np.int64) + self.size
+        self.tree[i] = priority
+        i = np.unique(i // 2)
+        while i[0] >= 1:
+            self.tree[i] = self.tree[2 * i] + self.tree[2 * i + 1]
+            if i[0] == 1:
+                break
+            i = np.unique(i // 2)
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Leaf index whose prefix-sum interval contains each value."""
+        i = np.ones(len(values), dtype=np.int64)
+        values = values.copy()
+        while i[0] < self.size:
+            left = 2 * i
+            go_right = values >= self.tree[left]
+            values -= self.tree[left] * go_right
+            i = left + go_right
+        return i - self.size
+
+    def leaves(self, idx) -> np.ndarray:
+        return self.tree[np.asarray(idx) + self.size]
+
+
 class Memory:
-    def __init__(self):
-        self.buf = deque(maxlen=MEM_SIZE)
+    """
+    Ring buffer of transitions in preallocated arrays; insert is O(1) and
+    sample() gathers a batch with one fancy-index per array. The arrays are
+    allocated on the first push, once the state shape (hospitals × metrics)
+    is known.
+
+    With prioritized=True, transitions are sampled in proportion to
+    (|TD error| + eps)^alpha via a SumTree, and sample() returns
+    importance-sampling weights to correct for the bias. New transitions
+    get the highest priority seen so far.
+    """
+    def __init__(self, capacity: int = MEM_SIZE, prioritized: bool = PRIORITIZED):
+        self.capacity    = capacity
+        self.prioritized = prioritized
+        self.pos  = 0
+        self.size = 0
+        self.states = self.next_states = None
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.rng  = np.random.default_rng()
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+        self.beta = PER_BETA
+
+    def __len__(self):
+        return self.size
+
+    def _allocate(self, state_shape):
+        shape = (self.capacity,) + tuple(state_shape)
+        self.states      = np.zeros(shape, dtype=np.float32)
+        self.next_states = np.zeros(shape, dtype=np.float32)
+
     def push(self, s, a, r, s2):
-        self.buf.append((s, a, r, s2))
-    def sample(self):
-        batch = random.sample(self.buf, BATCH_SIZE)
-        s, a, r, s2 = zip(*batch)
-        return (torch.FloatTensor(np.array(s)),
-                torch.LongTensor(a).unsqueeze(1),
-                torch.FloatTensor(r),
-                torch.FloatTensor(np.array(s2)))
+        if self.states is None:
+            self._allocate(np.shape(s))
+        i = self.pos
+        self.states[i]      = s
+        self.actions[i]     = a
+        self.rewards[i]     = r
+        self.next_states[i] = s2
+        if self.tree is not None:
+            self.tree.set(i, self.max_priority)
+        self.pos  = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size: int = BATCH_SIZE):
+        """(S, A, R, S2, weights, indexes); weights are all 1 unless prioritized."""
+        if self.tree is None:
+            idx = self.rng.integers(0, self.size, batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        else:
+            # One draw per equal slice of the total priority mass
+            total = self.tree.total()
+            bounds = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+            idx = np.minimum(self.tree.find(bounds), self.size - 1)
+            probs = self.tree.leaves(idx) / total
+            weights = (self.size * probs) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+            self.beta = min(1.0, self.beta + (1.0 - PER_BETA) / PER_BETA_STEPS)
+
+        return (torch.from_numpy(self.states[idx]),
+                torch.from_numpy(self.actions[idx]).unsqueeze(1),
+                torch.from_numpy(self.rewards[idx]),
+                torch.from_numpy(self.next_states[idx]),
+                torch.from_numpy(weights),
+                idx)
+
+    def state_dict(self) -> dict:
+        """Filled part of the buffer as tensors (loadable with weights_only)."""
+        out = {"capacity": self.capacity, "prioritized": self.prioritized,
+               "pos": self.pos, "size": self.size,
+               "max_priority": self.max_priority, "beta": self.beta}
+        if self.states is not None:
+            n = self.size
+            out.update(states=torch.from_numpy(self.states[:n].copy()),
+                       actions=torch.from_numpy(self.actions[:n].copy()),
+                       rewards=torch.from_numpy(self.rewards[:n].copy()),
+                       next_states=torch.from_numpy(self.next_states[:n].copy()))
+            if self.tree is not None:
+                out["priorities"] = torch.from_numpy(self.tree.leaves(np.arange(n)))
+        return out
+
+    def load_state_dict(self, state: dict) -> bool:
+        """Restore a buffer saved with the same capacity and mode; False otherwise."""
+        if (state["capacity"], state["prioritized"]) != (self.capacity, self.prioritized):
+            return False
+        self.__init__(self.capacity, self.prioritized)
+        n = state["size"]
+        if n and "states" in state:
+            self._allocate(state["states"].shape[1:])
+            self.states[:n]      = state["states"].numpy()
+            self.actions[:n]     = state["actions"].numpy()
+            self.rewards[:n]     = state["rewards"].numpy()
+            self.next_states[:n] = state["next_states"].numpy()
+            if self.tree is not None:
+                self.tree.update(np.arange(n), state["priorities"].numpy())
+        self.pos, self.size = state["pos"], n
+        self.max_priority, self.beta = state["max_priority"], state["beta"]
+        return True
+
+    def update_priorities(self, idx, td_errors: np.ndarray):
+        if self.tree is None:
+            return
+        priorities = (np.abs(td_errors) + PER_EPS) ** PER_ALPHA
+        self.tree.update(idx, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
     def ready(self):
-        return len(self.buf) >= BATCH_SIZE
+        return self.size >= BATCH_SIZE
 
 
 # ── Prometheus query ───────────────────────────────────────────
-def prom(metric_name: str) -> dict:
+# Prometheus series name → METRICS column
+SERIES = {
+    "hospital_cpu_percent":    "cpu",
+    "hospital_memory_percent": "memory",
+    "hospital_avg_latency_ms": "latency",
+    "hospital_throughput_rps": "throughput",
+    "hospital_success_rate":   "success_rate",
+    "hospital_error_rate":     "error_rate",
+}
+# One query for every metric of every hospital
+QUERY = '{__name__=~"' + "|".join(SERIES) + '"}'
+
+# A missing series must never make a node look good, so it gets the
+# worst value in the range build_state()/pori_scores() care about:
+# 0 for metrics PoRI rewards, the cap for everything else
+WORST = np.where(WEIGHTS > 0, 0.0, CAPS).astype(np.float32)
+
+
+def discover_hospitals(session) -> list:
     """
-    Query Prometheus. Returns {hospitalA: value, hospitalB: value, ...}
-    Returns empty dict if Prometheus isn't ready yet.
+    Hospital names from Prometheus' active scrape targets of HOSPITAL_JOB:
+    the target's `hospital` label if set, else the host part of `instance`.
+    Down targets are kept so they show up as missing rather than vanish.
     """
-    try:
-        r = requests.get(
-            f"{PROMETHEUS}/api/v1/query",
-            params={"query": metric_name},
-            timeout=5
-        )
-        out = {}
-        for item in r.json()["data"]["result"]:
-            h = item["metric"].get("hospital", "")
-            if h:
-                out[h] = float(item["value"][1])
-        return out
-    except:
-        return {}
+    r = session.get(f"{PROMETHEUS}/api/v1/targets", params={"state": "active"}, timeout=(2, 5))
+    r.raise_for_status()
+    names = set()
+    for t in r.json()["data"]["activeTargets"]:
+        labels = t.get("labels", {})
+        if labels.get("job") != HOSPITAL_JOB:
+            continue
+        names.add(labels.get("hospital") or labels.get("instance", "").split(":")[0])
+    names.discard("")
+    return sorted(names)
 
 
-def fetch_all_metrics() -> dict | None:
-    """
-    Fetch all 6 metrics for all 4 hospitals from Prometheus.
-    Returns None if Prometheus has no data yet.
+class MetricCollector:
     """
-    cpu     = prom("hospital_cpu_percent")
-    mem     = prom("hospital_memory_percent")
-    lat     = prom("hospital_avg_latency_ms")
-    tput    = prom("hospital_throughput_rps")
-    succ    = prom("hospital_success_rate")
-    err     = prom("hospital_error_rate")
-
-    if not cpu:
-        return None
-
-    data = {}
-    for h in HOSPITALS:
-        data[h] = {
-            "cpu":          cpu.get(h,  0.0),
-            "memory":       mem.get(h,  0.0),
-            "latency":      lat.get(h,  0.0),
-            "throughput":   tput.get(h, 0.0),
-            "success_rate": succ.get(h, 1.0),
-            "error_rate":   err.get(h,  0.0),
-        }
-    return data
-
+    Fetches all hospital metrics in a single Prometheus round trip into a
+    preallocated (hospitals × metrics) matrix. Missing series are listed in
+    `missing` and filled with WORST values.
 
-def build_state(data: dict) -> np.ndarray:
+    The hospital list comes from discover_hospitals(), refreshed every
+    DISCOVERY_INTERVAL seconds and whenever metrics arrive for an unknown
+    hospital; the matrix is only reallocated when the list changes.
     """
-    Flatten all metrics into a normalised [0,1] state vector.
-    Bad metrics push values toward 1.0 (penalty zone).
+    def __init__(self, hospitals: list = ()):
+        self.col        = {name: METRICS.index(m) for name, m in SERIES.items()}
+        self.worst      = WORST
+        self.missing    = []
+        self.latency_ms = 0.0
+        self.session    = requests.Session()
+        self.discovered_at = 0.0
+        self.set_hospitals(hospitals)
+
+    def set_hospitals(self, hospitals) -> bool:
+        """Adopt a new hospital list. True if it differs from the current one."""
+        hospitals = list(hospitals)
+        if getattr(self, "hospitals", None) == hospitals:
+            return False
+        self.hospitals = hospitals
+        self.row       = {h: i for i, h in enumerate(hospitals)}
+        self.values    = np.empty((len(hospitals), N_METRICS), dtype=np.float32)
+        return True
+
+    def discover(self):
+        try:
+            found = discover_hospitals(self.session)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logging.warning("Prometheus target discovery failed: %s", e)
+            return
+        self.discovered_at = time.monotonic()
+        if found and self.set_hospitals(found):
+            print(f"  Hospitals discovered: {', '.join(found)}")
+
+    def collect(self) -> bool:
+        """
+        Refresh `values` in place. False if Prometheus is unreachable or
+        has no hospital data yet.
+        """
+        if time.monotonic() - self.discovered_at >= DISCOVERY_INTERVAL:
+            self.discover()
+
+        start = time.perf_counter()
+        try:
+            r = self.session.get(
+                f"{PROMETHEUS}/api/v1/query",
+                params={"query": QUERY},
+                timeout=(2, 5)
+            )
+            r.raise_for_status()
+            result = r.json()["data"]["result"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logging.warning("Prometheus query failed: %s", e)
+            return False
+        finally:
+            self.latency_ms = (time.perf_counter() - start) * 1000
+
+        if not result:
+            return False
+
+        # A node Prometheus started scraping since the last discovery
+        seen = {item["metric"].get("hospital", "") for item in result} - {""}
+        if seen - set(self.hospitals):
+            self.discover()
+            if seen - set(self.hospitals):
+                self.set_hospitals(sorted(set(self.hospitals) | seen))
+        if not self.hospitals:
+            return False
+
+        self.values.fill(np.nan)
+        for item in result:
+            i = self.row.get(item["metric"].get("hospital", ""))
+            j = self.col.get(item["metric"].get("__name__", ""))
+            if i is not None and j is not None:
+                self.values[i, j] = float(item["value"][1])
+
+        gaps = np.isnan(self.values)
+        self.missing = [(self.hospitals[i], METRICS[j]) for i, j in zip(*np.nonzero(gaps))]
+        np.copyto(self.values, np.broadcast_to(self.worst, self.values.shape), where=gaps)
+        return True
+
+
+def build_state(values: np.ndarray) -> np.ndarray:
     """
-    vec = []
-    for h in HOSPITALS:
-        m = data[h]
-        vec.append(min(m["cpu"]         / 100.0, 1.0))
-        vec.append(min(m["memory"]      / 100.0, 1.0))
-        vec.append(min(m["latency"]     / 500.0, 1.0))   # cap at 500ms
-        vec.append(min(m["throughput"]  / 10.0,  1.0))   # cap at 10 rps
-        vec.append(m["success_rate"])
-        vec.append(m["error_rate"])
-    return np.array(vec, dtype=np.float32)
-
-
-def pori_score(m: dict) -> float:
+    Normalise a (hospitals × metrics) matrix of raw values into [0,1] by
+    the PoRI caps. Bad metrics push values toward 1.0 (penalty zone).
     """
-    PoRI score = how good this hospital is as a leader.
-    Range 0.0 (worst) to 1.0 (best).
-
-    Formula:
-      score = (success_weight × success_rate)
-            + (throughput_weight × norm_throughput)
-            - (latency_weight × norm_latency)
-            - (cpu_weight × norm_cpu)
-            - (error_weight × error_rate)
-
-    Weights chosen to reflect EHR system priorities:
-      Success rate  30%  — reliability is most important
-      Throughput    25%  — higher capacity = better leader
-      Latency       20%  — faster = better ZKP generation
-      CPU           15%  — less busy = more headroom
-      Error rate    10%  — penalise unreliable nodes
+    return np.minimum(values / CAPS, 1.0)
+
+
+def pori_scores(state: np.ndarray) -> np.ndarray:
+    """
+    PoRI score per hospital = how good it is as a leader, from the
+    normalised state. Range 0.0 (worst) to 1.0 (best).
     """
-    sr   = m["success_rate"]
-    tput = min(m["throughput"] / 10.0, 1.0)
-    lat  = min(m["latency"]    / 500.0, 1.0)
-    cpu  = min(m["cpu"]        / 100.0, 1.0)
-    err  = m["error_rate"]
+    return np.round(np.clip(state @ WEIGHTS, 0.0, 1.0), 4)
 
-    score = (0.30 * sr) + (0.25 * tput) - (0.20 * lat) - (0.15 * cpu) - (0.10 * err)
-    return round(max(min(score, 1.0), 0.0), 4)
+
+def ranking(scores: np.ndarray) -> np.ndarray:
+    """Hospital indexes from best to worst PoRI score (ties keep list order)."""
+    return np.argsort(-scores, kind="stable")
 
 
 # ── DQN Agent ──────────────────────────────────────────────────
@@ -187,30 +444,133 @@ class Agent:
         self.rounds  = 0
         self.prev_s  = None
         self.prev_a  = None
+        self.hospitals = []
+
+    def set_hospitals(self, hospitals: list):
+        """
+        Follow a change in the hospital set. The weights do not depend on
+        the number of hospitals and are kept; stored experiences have the
+        old state shape and an action index into the old list, so they go.
+        """
+        if hospitals == self.hospitals:
+            return
+        if self.hospitals:
+            print(f"  Hospital set changed ({len(self.hospitals)} → {len(hospitals)}); "
+                  f"keeping the model, clearing replay memory")
+            self.mem    = Memory()
+            self.prev_s = None
+            self.prev_a = None
+        self.hospitals = list(hospitals)
+
+    def state_dict(self) -> dict:
+        return {
+            "version":   CHECKPOINT_VERSION,
+            "policy":    self.policy.state_dict(),
+            "target":    self.target.state_dict(),
+            "optimizer": self.opt.state_dict(),
+            "eps":       self.eps,
+            "rounds":    self.rounds,
+            "hospitals": self.hospitals,
+            "memory":    self.mem.state_dict(),
+            "prev_s":    None if self.prev_s is None else torch.from_numpy(self.prev_s),
+            "prev_a":    self.prev_a,
+        }
+
+    def load_state_dict(self, state: dict):
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"checkpoint version {state.get('version')} != {CHECKPOINT_VERSION}")
+        # Load into fresh networks first so a bad checkpoint leaves self untouched
+        policy, target = DQN(), DQN()
+        policy.load_state_dict(state["policy"])
+        target.load_state_dict(state["target"])
+        opt = optim.Adam(policy.parameters(), lr=LR)
+        opt.load_state_dict(state["optimizer"])
+
+        self.policy, self.target, self.opt = policy, target, opt
+        self.target.eval()
+        self.eps       = float(state["eps"])
+        self.rounds    = int(state["rounds"])
+        self.hospitals = list(state["hospitals"])
+        self.mem       = Memory()
+        if self.mem.load_state_dict(state["memory"]):
+            self.prev_s = None if state["prev_s"] is None else state["prev_s"].numpy()
+            self.prev_a = state["prev_a"]
+        else:
+            print("  Replay memory settings changed; starting with an empty buffer")
+            self.prev_s = self.prev_a = None
 
     def act(self, state: np.ndarray) -> int:
         if random.random() < self.eps:
-            return random.randrange(ACTION_SIZE)
+            return random.randrange(len(state))
         with torch.no_grad():
             return int(self.policy(torch.FloatTensor(state).unsqueeze(0)).argmax())
 
     def q_values(self, state: np.ndarray) -> list:
         with torch.no_grad():
-            return self.policy(torch.FloatTensor(state).unsqueeze(0)).squeeze().tolist()
+            return self.policy(torch.FloatTensor(state).unsqueeze(0)).squeeze(0).tolist()
 
     def train(self):
         if not self.mem.ready():
             return None
-        S, A, R, S2 = self.mem.sample()
-        curr = self.policy(S).gather(1, A).squeeze()
+        S, A, R, S2, Wt, idx = self.mem.sample()
+        curr = self.policy(S).gather(1, A).squeeze(1)
         with torch.no_grad():
             tgt = R + GAMMA * self.target(S2).max(1)[0]
-        loss = nn.MSELoss()(curr, tgt)
+        td   = curr - tgt
+        loss = (Wt * td.pow(2)).mean()
         self.opt.zero_grad(); loss.backward(); self.opt.step()
+        self.mem.update_priorities(idx, td.detach().numpy())
         self.eps = max(EPSILON_MIN, self.eps * EPSILON_DECAY)
         return loss.item()
 
 
+# ── Checkpoints ────────────────────────────────────────────────
+def checkpoint_files(directory: str = CHECKPOINT_DIR) -> list:
+    """Checkpoint paths, most recently written first."""
+    # By mtime, not round: a fresh run restarts at a low round number, and
+    # pruning by name would delete its saves in favour of older files
+    paths = glob.glob(os.path.join(directory, "agent-*.pt"))
+    return sorted(paths, key=lambda p: (os.path.getmtime(p), p), reverse=True)
+
+
+def save_checkpoint(agent: Agent, directory: str = CHECKPOINT_DIR, keep: int = CHECKPOINT_KEEP) -> str:
+    """
+    Write agent-<round>.pt atomically (temp file, fsync, rename) and prune
+    all but the newest `keep`. A crash mid-write leaves only a stray .tmp.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"agent-{agent.rounds:010d}.pt")
+    tmp  = path + ".tmp"
+    with open(tmp, "wb") as f:
+        torch.save(agent.state_dict(), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+    for old in checkpoint_files(directory)[keep:]:
+        os.remove(old)
+    return path
+
+
+def restore_checkpoint(agent: Agent, directory: str = CHECKPOINT_DIR) -> str | None:
+    """
+    Load the newest checkpoint that reads and fits the model; its path, or
+    None. Unusable files are renamed to *.bad so they are neither retried
+    nor counted against `keep` when pruning.
+    """
+    for path in checkpoint_files(directory):
+        try:
+            agent.load_state_dict(torch.load(path, map_location="cpu", weights_only=True))
+            return path
+        except Exception as e:
+            logging.warning("Skipping unusable checkpoint %s: %s", path, e)
+            try:
+                os.replace(path, path + ".bad")
+            except OSError as e:
+                logging.warning("Could not move aside %s: %s", path, e)
+    return None
+
+
 # ── Display helpers ─────────────────────────────────────────────
 W = 62
 
@@ -221,12 +581,31 @@ def header(r):
     print(f"  ELECTION ROUND {r}".ljust(W - 1) + "═")
     print("═" * W)
 
-def table(data: dict, scores: dict, elected: int):
+def collection_info(collector):
+    print(f"\n  Metrics collected in {collector.latency_ms:.1f} ms (1 Prometheus query)")
+    if collector.missing:
+        print(f"  ⚠  Missing series (worst-case value used): "
+              + ", ".join(f"{h}/{m}" for h, m in collector.missing))
+
+def shown(order: np.ndarray, elected: int) -> list:
+    """Row indexes to display: all of them, or the TABLE_ROWS best plus the elected node."""
+    if len(order) <= TABLE_ROWS:
+        return list(range(len(order)))
+    rows = order[:TABLE_ROWS].tolist()
+    return rows if elected in rows else rows + [elected]
+
+def more(hospitals: list, rows: list):
+    if len(rows) < len(hospitals):
+        print(f"  ... {len(hospitals) - len(rows)} more hospitals not shown")
+
+def table(hospitals: list, values: np.ndarray, scores: np.ndarray, order: np.ndarray, elected: int):
     print(f"\n  {'Hospital':<12} {'CPU%':>5} {'Mem%':>5} {'Lat ms':>7} {'Tput/s':>7} {'Success%':>9} {'ErrRate':>8}  {'PoRI':>6}")
     line()
-    for i, h in enumerate(HOSPITALS):
-        m  = data[h]
-        s  = scores[h]
+    rows = shown(order, elected)
+    for i in rows:
+        h  = hospitals[i]
+        m  = dict(zip(METRICS, values[i]))
+        s  = scores[i]
         tag = " ◀ elected" if i == elected else ""
         print(
             f"  {h:<12}"
@@ -239,23 +618,26 @@ def table(data: dict, scores: dict, elected: int):
             f"  {s:>6.4f}"
             f"{tag}"
         )
+    more(hospitals, rows)
 
-def qbar(q_vals: list, elected: int):
+def qbar(hospitals: list, order: np.ndarray, q_vals: list, elected: int):
     print(f"\n  Q-VALUES  (DQN confidence — higher = DQN prefers this node)")
     line()
     mn, mx = min(q_vals), max(q_vals)
     rng = max(mx - mn, 0.001)
-    for i, (h, q) in enumerate(zip(HOSPITALS, q_vals)):
+    rows = shown(order, elected)
+    for i in rows:
+        h, q  = hospitals[i], q_vals[i]
         norm  = (q - mn) / rng
         bar   = "█" * int(norm * 24) + "░" * (24 - int(norm * 24))
         arrow = "  ◀ ELECTED" if i == elected else ""
         print(f"  {h:<12}  {q:>7.4f}  {bar}{arrow}")
+    more(hospitals, rows)
 
-def why(data: dict, scores: dict, elected: int):
-    h = HOSPITALS[elected]
-    m = data[h]
-    s = scores[h]
-    ranked = sorted(scores.items(), key=lambda x: -x[1])
+def why(hospitals: list, values: np.ndarray, scores: np.ndarray, order: np.ndarray, elected: int):
+    h = hospitals[elected]
+    m = dict(zip(METRICS, values[elected]))
+    s = scores[elected]
 
     print(f"\n  ✅  ELECTED LEADER: {h.upper()}")
     print(f"\n  WHY {h} was chosen over the others:")
@@ -290,20 +672,26 @@ def why(data: dict, scores: dict, elected: int):
     print(f"  Success rate    {m['success_rate']*100:>6.1f}%     {verdict_succ(m['success_rate'])}")
     print(f"  CPU usage       {m['cpu']:>6.1f}%     {verdict_cpu(m['cpu'])}")
     print(f"  Error rate      {m['error_rate']:>6.3f}       {'low ✓' if m['error_rate'] < 0.05 else 'high ✗'}")
-    print(f"  PoRI Score      {s:>6.4f}       highest in network")
+    rank = int(np.flatnonzero(order == elected)[0]) + 1
+    print(f"  PoRI Score      {s:>6.4f}       "
+          + ("highest in network" if rank == 1 else f"rank {rank} of {len(order)}"))
 
-    if len(ranked) > 1:
-        runner = ranked[1]
-        gap    = s - runner[1]
-        print(f"\n  Runner-up: {runner[0]}  (PoRI {runner[1]:.4f},  gap = +{gap:.4f})")
+    if len(order) > 1:
+        # Best PoRI among the nodes that were not elected
+        runner = order[1] if rank == 1 else order[0]
+        gap    = s - scores[runner]
+        print(f"\n  Runner-up: {hospitals[runner]}  (PoRI {scores[runner]:.4f},  gap = {gap:+.4f})")
 
     # Show what would have happened with other choices
     print(f"\n  All PoRI scores ranked:")
-    for rank, (hosp, sc) in enumerate(ranked, 1):
+    for rank, i in enumerate(order[:TABLE_ROWS], 1):
+        hosp, sc = hospitals[i], scores[i]
         bar = "█" * int(sc * 20)
         print(f"    {rank}. {hosp:<12} {sc:.4f}  {bar}")
+    if len(order) > TABLE_ROWS:
+        print(f"    ... {len(order) - TABLE_ROWS} more")
 
-def training_info(loss, eps, rounds):
+def training_info(loss, eps, rounds, stored):
     print(f"\n  🧠  DQN STATUS")
     line()
     if loss is not None:
@@ -311,10 +699,10 @@ def training_info(loss, eps, rounds):
         print(f"  Loss:         {loss:.6f}   {'↓ learning well' if loss < 0.05 else ''}")
         print(f"  Epsilon:      {eps:.4f}   ({confidence})")
         print(f"  Rounds:       {rounds}")
-        print(f"  Memory:       {rounds} experiences stored")
+        print(f"  Memory:       {stored} experiences stored")
     else:
-        remaining = BATCH_SIZE - rounds
-        print(f"  Collecting experience... ({rounds}/{BATCH_SIZE} needed to start training)")
+        remaining = BATCH_SIZE - stored
+        print(f"  Collecting experience... ({stored}/{BATCH_SIZE} needed to start training)")
         print(f"  Still need {remaining} more rounds before DQN trains.")
     print(f"\n  ⏱   Next election in {INTERVAL}s")
     print("═" * W + "\n")
@@ -323,21 +711,28 @@ def training_info(loss, eps, rounds):
 # ── Main ───────────────────────────────────────────────────────
 def main():
     agent = Agent()
-    round_num = 0
+    collector = MetricCollector()
+
+    restored = restore_checkpoint(agent)
+    round_num = agent.rounds
 
     print("=" * W)
     print("  EHR Network — DQN Leader Election Agent  (Phase 1)")
     print("=" * W)
     print(f"  Prometheus : {PROMETHEUS}")
-    print(f"  Hospitals  : {', '.join(HOSPITALS)}")
+    print(f"  Hospitals  : discovered from job '{HOSPITAL_JOB}' targets")
     print(f"  Metrics    : {', '.join(METRICS)}")
     print(f"  Interval   : {INTERVAL}s")
+    if restored:
+        print(f"  Checkpoint : {restored} (round {agent.rounds}, epsilon {agent.eps:.4f}, "
+              f"{len(agent.mem)} experiences)")
+    else:
+        print(f"  Checkpoint : none in {CHECKPOINT_DIR}/ — starting fresh")
     print(f"\n  Waiting for Prometheus to scrape first metrics...")
 
     # Wait until Prometheus actually has data
     while True:
-        d = fetch_all_metrics()
-        if d:
+        if collector.collect():
             break
         print("  Still waiting for metrics... (this takes ~20s on first run)")
         time.sleep(8)
@@ -345,18 +740,21 @@ def main():
     print("  ✅  Metrics available. Starting elections.\n")
 
     while True:
-        data = fetch_all_metrics()
-        if not data:
+        if not collector.collect():
             print("  Prometheus not responding — retrying in 10s...")
             time.sleep(10)
             continue
+        hospitals = collector.hospitals
+        values    = collector.values
+        agent.set_hospitals(hospitals)
 
         round_num += 1
-        scores = {h: pori_score(data[h]) for h in HOSPITALS}
-        state  = build_state(data)
+        state  = build_state(values)
+        scores = pori_scores(state)
+        order  = ranking(scores)
         action = agent.act(state)
         q_vals = agent.q_values(state)
-        reward = scores[HOSPITALS[action]] * 10.0
+        reward = float(scores[action]) * 10.0
 
         if agent.prev_s is not None:
             agent.mem.push(agent.prev_s, agent.prev_a, reward, state)
@@ -368,13 +766,19 @@ def main():
 
         # Print full report
         header(round_num)
-        table(data, scores, action)
-        qbar(q_vals, action)
-        why(data, scores, action)
-        training_info(loss, agent.eps, agent.rounds)
+        collection_info(collector)
+        table(hospitals, values, scores, order, action)
+        qbar(hospitals, order, q_vals, action)
+        why(hospitals, values, scores, order, action)
+        training_info(loss, agent.eps, agent.rounds, len(agent.mem))
 
         agent.prev_s = state
         agent.prev_a = action
+        if agent.rounds % CHECKPOINT_EVERY == 0:
+            try:
+                save_checkpoint(agent)
+            except OSError as e:
+                logging.warning("Checkpoint failed: %s", e)
         time.sleep(INTERVAL)
 
 
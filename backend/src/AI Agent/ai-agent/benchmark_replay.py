@@ -0,0 +1,103 @@
+"""
+Replay memory: original deque-of-tuples vs the NumPy ring buffer
+(uniform and prioritized) at capacities from 500 to 1M.
+
+For each capacity the buffer is filled once (the agent pushes a fresh state
+array every round), then BATCH_SIZE batches are sampled repeatedly.
+Reported: fill rate, batches/s and traced memory after filling.
+
+Usage:
+    python benchmark_replay.py [max_capacity] [hospitals]
+"""
+
+import csv
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import torch
+
+import agent as ag
+
+MAX_CAPACITY = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+HOSPITALS    = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+CAPACITIES   = [c for c in (500, 10_000, 100_000, 1_000_000) if c <= MAX_CAPACITY]
+SAMPLE_SECONDS = 1.0
+OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_replay.csv")
+
+
+class DequeMemory:
+    """The agent's previous replay memory, kept here as the baseline."""
+    def __init__(self, capacity):
+        self.buf = deque(maxlen=capacity)
+    def push(self, s, a, r, s2):
+        self.buf.append((s, a, r, s2))
+    def sample(self):
+        batch = random.sample(self.buf, ag.BATCH_SIZE)
+        s, a, r, s2 = zip(*batch)
+        return (torch.FloatTensor(np.array(s)),
+                torch.LongTensor(a).unsqueeze(1),
+                torch.FloatTensor(r),
+                torch.FloatTensor(np.array(s2)))
+
+
+IMPLEMENTATIONS = {
+    "deque":       DequeMemory,
+    "ring":        lambda c: ag.Memory(c, prioritized=False),
+    "prioritized": lambda c: ag.Memory(c, prioritized=True),
+}
+
+
+def run(name, capacity):
+    shape = (HOSPITALS, ag.N_METRICS)
+    tracemalloc.start()
+    start = time.perf_counter()
+    mem = IMPLEMENTATIONS[name](capacity)
+    for i in range(capacity):
+        mem.push(np.random.rand(*shape).astype(np.float32), i % HOSPITALS,
+                 random.random(), np.random.rand(*shape).astype(np.float32))
+    fill_s = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    batches = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SAMPLE_SECONDS:
+        out = mem.sample()
+        if name == "prioritized":
+            mem.update_priorities(out[5], np.random.rand(ag.BATCH_SIZE))
+        batches += 1
+    sample_s = time.perf_counter() - start
+
+    return {
+        "capacity": capacity,
+        "memory": name,
+        "push_per_s": round(capacity / fill_s),
+        "batches_per_s": round(batches / sample_s),
+        "memory_mb": round(traced / 2**20, 1),
+    }
+
+
+def main():
+    print(f"Replay memory benchmark (states {HOSPITALS}x{ag.N_METRICS}, batch {ag.BATCH_SIZE})")
+    results = []
+    for capacity in CAPACITIES:
+        for name in IMPLEMENTATIONS:
+            row = run(name, capacity)
+            results.append(row)
+            print(f"  cap={capacity:<8} {name:<12} push {row['push_per_s']:>9}/s   "
+                  f"sample {row['batches_per_s']:>7} batches/s   {row['memory_mb']:>8} MB")
+
+    with open(OUT, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Benchmark complete. Results saved to {OUT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Per-round cost of the election agent at 10, 100 and 500 hospitals.
+
+One round = build_state + PoRI scores + ranking + greedy act + q_values on
+synthetic metrics; the DQN train step (batch of BATCH_SIZE states) is timed
+separately. The same network weights are used for every size. Scoring alone
+is also timed against the previous per-hospital dict/loop implementation.
+
+Usage:
+    python benchmark_inference.py [rounds]
+"""
+
+import csv
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+
+import agent as ag
+
+SIZES  = [10, 100, 500]
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+OUT    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_inference.csv")
+
+
+def synthetic(n: int) -> tuple:
+    hospitals = [f"hospital{i:03d}" for i in range(n)]
+    low  = np.array([5, 20, 10, 0.1, 0.8, 0.0], dtype=np.float32)
+    high = np.array([95, 90, 400, 8, 1.0, 0.2], dtype=np.float32)
+    values = (low + (high - low) * np.random.rand(n, ag.N_METRICS)).astype(np.float32)
+    return hospitals, values
+
+
+def scalar_scoring(data: dict, hospitals: list):
+    """The previous per-hospital build_state/pori_score loops, for comparison."""
+    vec, scores = [], {}
+    for h in hospitals:
+        m = data[h]
+        vec.append(min(m["cpu"] / 100.0, 1.0))
+        vec.append(min(m["memory"] / 100.0, 1.0))
+        vec.append(min(m["latency"] / 500.0, 1.0))
+        vec.append(min(m["throughput"] / 10.0, 1.0))
+        vec.append(m["success_rate"])
+        vec.append(m["error_rate"])
+        score = (0.30 * m["success_rate"]) + (0.25 * min(m["throughput"] / 10.0, 1.0)) \
+            - (0.20 * min(m["latency"] / 500.0, 1.0)) - (0.15 * min(m["cpu"] / 100.0, 1.0)) \
+            - (0.10 * m["error_rate"])
+        scores[h] = round(max(min(score, 1.0), 0.0), 4)
+    ranked = sorted(scores.items(), key=lambda x: -x[1])
+    return np.array(vec, dtype=np.float32), scores, ranked
+
+
+def time_ms(fn, repeats: int) -> list:
+    out = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - start) * 1000)
+    return out
+
+
+def percentiles(samples_ms: list) -> tuple:
+    return tuple(round(float(np.percentile(samples_ms, q)), 3) for q in (50, 95, 99))
+
+
+def main():
+    torch.set_num_threads(1)
+    agent = ag.Agent()
+    agent.eps = 0.0
+    params = sum(p.numel() for p in agent.policy.parameters())
+    print(f"Election round cost ({ROUNDS} rounds, {params} parameters at every size)")
+
+    results = []
+    for n in SIZES:
+        hospitals, values = synthetic(n)
+        agent.set_hospitals(hospitals)
+
+        round_ms = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            state  = ag.build_state(values)
+            scores = ag.pori_scores(state)
+            order  = ag.ranking(scores)
+            action = agent.act(state)
+            agent.q_values(state)
+            round_ms.append((time.perf_counter() - start) * 1000)
+            assert 0 <= action < n and len(order) == n
+
+        data = {h: dict(zip(ag.METRICS, map(float, values[i]))) for i, h in enumerate(hospitals)}
+        _, old_scores, _ = scalar_scoring(data, hospitals)
+        assert np.allclose([old_scores[h] for h in hospitals], scores, atol=1e-4)
+        scalar_ms = time_ms(lambda: scalar_scoring(data, hospitals), ROUNDS)
+        vector_ms = time_ms(lambda: ag.ranking(ag.pori_scores(ag.build_state(values))), ROUNDS)
+
+        for _ in range(ag.BATCH_SIZE):
+            agent.mem.push(state, random.randrange(n), 1.0, state)
+        train_ms = []
+        for _ in range(max(ROUNDS // 10, 5)):
+            start = time.perf_counter()
+            agent.train()
+            train_ms.append((time.perf_counter() - start) * 1000)
+
+        p50, p95, p99 = percentiles(round_ms)
+        t50, t95, _ = percentiles(train_ms)
+        s50 = percentiles(scalar_ms)[0]
+        v50 = percentiles(vector_ms)[0]
+        results.append({
+            "hospitals": n,
+            "round_p50_ms": p50, "round_p95_ms": p95, "round_p99_ms": p99,
+            "train_p50_ms": t50, "train_p95_ms": t95,
+            "scoring_scalar_p50_ms": s50, "scoring_vector_p50_ms": v50,
+        })
+        print(f"  N={n:<4} round p50 {p50:>8.3f} ms  p95 {p95:>8.3f}  p99 {p99:>8.3f}   "
+              f"train p50 {t50:>8.3f} ms  p95 {t95:>8.3f}   "
+              f"scoring {s50:.3f} → {v50:.3f} ms")
+
+    with open(OUT, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Benchmark complete. Results saved to {OUT}")
+
+
+if __name__ == "__main__":
+    main()
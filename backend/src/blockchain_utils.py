@@ -1,7 +1,10 @@
 from web3 import Web3
-import json, os
+import json, os, threading, time
+import requests
 from dotenv import load_dotenv
 
+import chain_cache
+
 load_dotenv()
 
 # ------------------------------------------------------------
@@ -11,17 +14,99 @@ RPC_URL = os.getenv("RPC_URL", "http://127.0.0.1:7545")
 CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
 ABI_PATH = "./AccessRegistry.json"
 
+# Max eth_calls per JSON-RPC batch (one HTTP round trip each)
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", "500"))
+
+# A nonce handed out this long ago that still has not reached the node's
+# pending pool is treated as dropped (wallet rejected or replaced the tx)
+NONCE_PENDING_TIMEOUT = float(os.getenv("NONCE_PENDING_TIMEOUT", "30"))
+GAS_MARGIN = 1.25
+
+# Gas limit floors (the previous fixed values), also used when estimation
+# fails. An estimate taken against a warm storage slot or a short CID can be
+# far below what a later call needs, so cached estimates never go under these.
+GAS_DEFAULTS = {
+    "registerIdentity": 200_000,
+    "storeRecord": 500_000,
+    "updateRecord": 500_000,
+    "toggleConsent": 300_000,
+    "requestAccess": 800_000,
+}
+
 w3 = Web3(Web3.HTTPProvider(RPC_URL))
 
 
-def _load_contract():
-    with open(ABI_PATH) as f:
-        abi = json.load(f)
+# ------------------------------------------------------------
+# CONTRACT REGISTRY
+# ------------------------------------------------------------
+class ContractRegistry:
+    """
+    Process-wide cache of bound contract objects and event decoders.
+
+    The ABI file is read, validated and bound once per (path, address).
+    Every lookup does a single os.stat; if the file's mtime changed the
+    ABI is reloaded and all handles/decoders for it are rebuilt.
+    """
+
+    def __init__(self, web3: Web3):
+        self.w3 = web3
+        self._lock = threading.Lock()
+        self._entries = {}      # (path, address) -> (mtime_ns, contract, {event: decoder})
+
+    @staticmethod
+    def _read_abi(path: str) -> list:
+        with open(path) as f:
+            abi = json.load(f)
+
+        # Accept both a bare ABI and a Truffle/Hardhat artifact
+        if isinstance(abi, dict) and "abi" in abi:
+            abi = abi["abi"]
+        if not isinstance(abi, list) or not all(isinstance(e, dict) and "type" in e for e in abi):
+            raise ValueError(f"Invalid ABI in {path}")
+        return abi
+
+    def _entry(self, path: str, address: str):
+        if not address:
+            raise ValueError("Contract address not configured")
+
+        key = (os.path.abspath(path), address.lower())
+        mtime = os.stat(key[0]).st_mtime_ns
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == mtime:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                contract = self.w3.eth.contract(
+                    address=Web3.to_checksum_address(address),
+                    abi=self._read_abi(key[0]),
+                )
+                entry = (mtime, contract, {})
+                self._entries[key] = entry
+            return entry
+
+    def contract(self, path: str = ABI_PATH, address: str = CONTRACT_ADDRESS):
+        return self._entry(path, address)[1]
+
+    def event(self, name: str, path: str = ABI_PATH, address: str = CONTRACT_ADDRESS):
+        """Cached event decoder, e.g. event("AccessRequested").process_log(log)."""
+        _, contract, decoders = self._entry(path, address)
+        decoder = decoders.get(name)
+        if decoder is None:
+            decoder = decoders.setdefault(name, contract.events[name]())
+        return decoder
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+contracts = ContractRegistry(w3)
 
-    return w3.eth.contract(
-        address=Web3.to_checksum_address(CONTRACT_ADDRESS),
-        abi=abi
-    )
+
+def _load_contract():
+    return contracts.contract()
 
 # ------------------------------------------------------------
 # HELPERS
@@ -37,6 +122,207 @@ def _b32(x):
     raise ValueError("Invalid bytes32")
 
 
+def _record_dict(rec):
+    owner, h, encryptedCid, consent, timestamp = rec
+    return {
+        "owner": owner,
+        "h": h.hex(),
+        "encryptedCid": encryptedCid,
+        "consent": consent,
+        "timestamp": timestamp,
+    }
+
+
+# ------------------------------------------------------------
+# TX PREPARATION
+# ------------------------------------------------------------
+class NonceTracker:
+    """
+    Per-address pending-nonce allocator. Every reservation reads
+    eth_getTransactionCount(addr, "pending") and hands out the local
+    counter, so concurrent builds for one sender get consecutive nonces
+    before any of them is broadcast. The counter resyncs to the chain when
+    the chain is ahead (txs sent elsewhere), and when it is behind and the
+    first missing nonce was handed out more than `pending_timeout` seconds
+    ago: that tx was never broadcast, and every later nonce would sit
+    behind the gap.
+    """
+
+    def __init__(self, web3: Web3, pending_timeout: float = NONCE_PENDING_TIMEOUT):
+        self.w3 = web3
+        self.pending_timeout = pending_timeout
+        self._lock = threading.Lock()
+        self._locks = {}        # address -> Lock
+        self._state = {}        # address -> [next nonce, {issued nonce: time}]
+
+    def _addr_lock(self, address: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(address, threading.Lock())
+
+    def reserve(self, address: str, count: int = 1) -> int:
+        """Reserve `count` consecutive nonces for `address`; returns the first."""
+        address = Web3.to_checksum_address(address)
+        with self._addr_lock(address):
+            now = time.monotonic()
+            chain = self.w3.eth.get_transaction_count(address, "pending")
+            state = self._state.setdefault(address, [chain, {}])
+            issued = state[1]
+            for nonce in [n for n in issued if n < chain]:
+                del issued[nonce]       # reached the node
+
+            if chain > state[0]:
+                state[0] = chain
+            elif chain < state[0] and now - issued.get(chain, float("-inf")) > self.pending_timeout:
+                state[0] = chain
+                issued.clear()
+
+            first = state[0]
+            for nonce in range(first, first + count):
+                issued[nonce] = now
+            state[0] += count
+            return first
+
+    def release(self, address: str, nonce: int):
+        """Give back the most recent nonce if its tx could not be built."""
+        address = Web3.to_checksum_address(address)
+        with self._addr_lock(address):
+            state = self._state.get(address)
+            if state is not None and state[0] == nonce + 1:
+                state[0] = nonce
+                state[1].pop(nonce, None)
+
+    def reset(self, address: str = None):
+        with self._lock:
+            if address is None:
+                self._state.clear()
+            else:
+                self._state.pop(Web3.to_checksum_address(address), None)
+
+
+class TxPreparer:
+    """
+    Builds unsigned contract transactions with as few RPC calls as possible:
+    chain id is read once, the gas limit
+    is estimated once per (function selector, call data length) with
+    GAS_MARGIN headroom, floored at GAS_DEFAULTS, and reused. Call data is
+    ABI-encoded locally. Fee fields are left to the signing wallet.
+
+    Every tx this backend builds is signed in the browser wallet, which
+    assigns its own nonce, so no nonce is set by default. with_nonce=True
+    reserves one from NonceTracker and is only for txs the server signs
+    and broadcasts itself; a reserved nonce that is never broadcast
+    leaves a gap for later txs from that sender.
+    """
+
+    def __init__(self, web3: Web3, registry: ContractRegistry):
+        self.w3 = web3
+        self.registry = registry
+        self.nonces = NonceTracker(web3)
+        self._chain_id = None
+        self._gas = {}          # (selector, call data length) -> gas limit
+        self._lock = threading.Lock()
+
+    @property
+    def chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    @staticmethod
+    def _gas_key(data: str) -> tuple:
+        # Dynamic arguments (CID strings, signatures) change the data length
+        return data[:10], len(data)
+
+    def _gas_limit(self, contract, fn_name: str, args, sender: str, data: str) -> int:
+        key = self._gas_key(data)
+        gas = self._gas.get(key)
+        if gas is not None:
+            return gas
+
+        floor = GAS_DEFAULTS.get(fn_name, 500_000)
+        try:
+            estimate = contract.functions[fn_name](*args).estimate_gas({"from": sender})
+            gas = max(int(estimate * GAS_MARGIN), floor)
+        except Exception as e:
+            print(f"Gas estimation failed for {fn_name}, using default:", e)
+            gas = floor
+
+        with self._lock:
+            return self._gas.setdefault(key, gas)
+
+    def check_receipt(self, tx_hash) -> bool:
+        """
+        Look up a mined tx built here; if it ran out of gas, drop the cached
+        limit for its call so the next one is re-estimated. Returns whether
+        the tx ran out of gas.
+        """
+        receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+        tx = self.w3.eth.get_transaction(tx_hash)
+        if receipt["status"] == 1 or receipt["gasUsed"] < tx["gas"]:
+            return False
+
+        data = Web3.to_hex(tx["input"])
+        with self._lock:
+            self._gas.pop(self._gas_key(data), None)
+        print(f"Tx {tx_hash} ran out of gas at {tx['gas']}; re-estimating next time")
+        return True
+
+    def _build(self, contract, sender: str, fn_name: str, args, nonce) -> dict:
+        data = contract.encode_abi(fn_name, args=list(args))
+        tx = {
+            "from": sender,
+            "to": contract.address,
+            "data": data,
+            "value": 0,
+            "gas": self._gas_limit(contract, fn_name, args, sender, data),
+            "chainId": self.chain_id,
+        }
+        if nonce is not None:
+            tx["nonce"] = nonce
+        return tx
+
+    def prepare(self, sender: str, fn_name: str, *args, with_nonce: bool = False) -> dict:
+        contract = self.registry.contract()
+        sender = Web3.to_checksum_address(sender)
+
+        nonce = self.nonces.reserve(sender) if with_nonce else None
+        try:
+            return self._build(contract, sender, fn_name, args, nonce)
+        except Exception:
+            if nonce is not None:
+                self.nonces.release(sender, nonce)
+            raise
+
+    def prepare_many(self, calls: list, with_nonce: bool = False) -> list:
+        """
+        Prepare [(sender, fn_name, args), ...] in one pass. Nonces are
+        reserved once per sender as a consecutive block, in call order.
+        """
+        contract = self.registry.contract()
+        calls = [(Web3.to_checksum_address(sender), fn, tuple(args)) for sender, fn, args in calls]
+
+        next_nonce = {}
+        if with_nonce:
+            counts = {}
+            for sender, _, _ in calls:
+                counts[sender] = counts.get(sender, 0) + 1
+            next_nonce = {
+                sender: self.nonces.reserve(sender, n) for sender, n in counts.items()
+            }
+
+        txs = []
+        for sender, fn_name, args in calls:
+            nonce = None
+            if with_nonce:
+                nonce = next_nonce[sender]
+                next_nonce[sender] += 1
+            txs.append(self._build(contract, sender, fn_name, args, nonce))
+        return txs
+
+
+tx_preparer = TxPreparer(w3, contracts)
+
+
 # ------------------------------------------------------------
 # IDENTITY
 # ------------------------------------------------------------
@@ -45,91 +331,80 @@ def register_identity(eth_address: str, pubkey_bytes: bytes):
     Prepares tx for:
     registerIdentity(bytes pubKey)
     """
-    contract = _load_contract()
-    eth_address = Web3.to_checksum_address(eth_address)
-
-    tx = contract.functions.registerIdentity(
-        pubkey_bytes
-    ).build_transaction({
-        "from": eth_address,
-        "nonce": w3.eth.get_transaction_count(eth_address),
-        "gas": 200_000,
-        "chainId": w3.eth.chain_id,
-    })
-
-    return tx
+    return tx_preparer.prepare(eth_address, "registerIdentity", pubkey_bytes)
 
 
 # ------------------------------------------------------------
 # RECORDS
 # ------------------------------------------------------------
-def store_record(eth_address, record_id, ch_hash, cid, consent):
-    contract = _load_contract()
-    eth_address = Web3.to_checksum_address(eth_address)
+def _store_record_args(record_id, ch_hash, cid, consent):
+    return (_b32(record_id), _b32(ch_hash), cid, bool(consent))
 
-    tx = contract.functions.storeRecord(
-        _b32(record_id),
-        _b32(ch_hash),
-        cid,
-        bool(consent),
-    ).build_transaction({
-        "from": eth_address,
-        "nonce": w3.eth.get_transaction_count(eth_address),
-        "gas": 500_000,
-        "chainId": w3.eth.chain_id,
-    })
 
-    return tx
+def store_record(eth_address, record_id, ch_hash, cid, consent, with_nonce: bool = False):
+    return tx_preparer.prepare(
+        eth_address, "storeRecord",
+        *_store_record_args(record_id, ch_hash, cid, consent),
+        with_nonce=with_nonce,
+    )
 
 
-def update_record(eth_address, record_id, cid, ch_hash):
-    contract = _load_contract()
-    eth_address = Web3.to_checksum_address(eth_address)
+def store_records_bulk(items: list, with_nonce: bool = False) -> list:
+    """
+    Prepare many storeRecord txs in one pass.
+    items: [(eth_address, record_id, ch_hash, cid, consent), ...]
+    """
+    return tx_preparer.prepare_many(
+        [
+            (eth_address, "storeRecord", _store_record_args(record_id, ch_hash, cid, consent))
+            for eth_address, record_id, ch_hash, cid, consent in items
+        ],
+        with_nonce=with_nonce,
+    )
+
 
-    tx = contract.functions.updateRecord(
+def update_record(eth_address, record_id, cid, ch_hash, with_nonce: bool = False):
+    return tx_preparer.prepare(
+        eth_address, "updateRecord",
         _b32(record_id),
         _b32(ch_hash),
-        cid
-    ).build_transaction({
-        "from": eth_address,
-        "nonce": w3.eth.get_transaction_count(eth_address),
-        "gas": 500_000,
-        "chainId": w3.eth.chain_id,
-    })
+        cid,
+        with_nonce=with_nonce,
+    )
 
-    return tx
+
+def update_records_bulk(items: list, with_nonce: bool = False) -> list:
+    """
+    Prepare many updateRecord txs in one pass.
+    items: [(eth_address, record_id, cid, ch_hash), ...]
+    """
+    return tx_preparer.prepare_many(
+        [
+            (eth_address, "updateRecord", (_b32(record_id), _b32(ch_hash), cid))
+            for eth_address, record_id, cid, ch_hash in items
+        ],
+        with_nonce=with_nonce,
+    )
 
 
 def get_record_by_id(record_id: str):
-    contract = _load_contract()
-    owner, h, encryptedCid, consent, timestamp = contract.functions.getRecord(
-        _b32(record_id)
-    ).call()
+    """Cached; invalidated by RecordStored / RecordUpdated / ConsentToggled."""
+    def load():
+        contract = _load_contract()
+        rec = contract.functions.getRecord(
+            _b32(record_id)
+        ).call()
+        return _record_dict(rec)
 
-    return {
-        "owner": owner,
-        "h": h.hex(),
-        "encryptedCid": encryptedCid,
-        "consent": consent,
-        "timestamp": timestamp,
-    }
+    return dict(chain_cache.records.get_or_load(chain_cache.record_key(record_id), load))
 
 
 def toggle_consent_tx(eth_address, record_id, active):
-    contract = _load_contract()
-    eth_address = Web3.to_checksum_address(eth_address)
-
-    tx = contract.functions.toggleConsent(
+    return tx_preparer.prepare(
+        eth_address, "toggleConsent",
         _b32(record_id),
         bool(active)
-    ).build_transaction({
-        "from": eth_address,
-        "nonce": w3.eth.get_transaction_count(eth_address),
-        "gas": 300_000,
-        "chainId": w3.eth.chain_id,
-    })
-
-    return tx
+    )
 
 
 # ------------------------------------------------------------
@@ -145,12 +420,10 @@ def submit_access_request(
     v, r, s,
     ttl
 ):
-    contract = _load_contract()
-
-    doctor  = Web3.to_checksum_address(doctor)
     patient = Web3.to_checksum_address(patient)
 
-    tx = contract.functions.requestAccess(
+    return tx_preparer.prepare(
+        doctor, "requestAccess",
         patient,
         _b32(record_id),
         int(role),
@@ -160,19 +433,20 @@ def submit_access_request(
         _b32(r),
         _b32(s),
         int(ttl)
-    ).build_transaction({
-        "from": doctor,
-        "nonce": w3.eth.get_transaction_count(doctor),
-        "gas": 800_000,
-        "chainId": w3.eth.chain_id,
-    })
-
-    return tx
+    )
 
 
 def check_token_valid(token: str):
-    contract = _load_contract()
-    return contract.functions.tokenValid(_b32(token)).call()
+    """
+    Evaluated locally against the token's cached expiresAt. The expiry is
+    read from the chain once, then kept current by AccessRequested events.
+    """
+    def load():
+        contract = _load_contract()
+        return int(contract.functions.tokenExpiry(_b32(token)).call())
+
+    expires_at = chain_cache.token_expiry.get_or_load(chain_cache.record_key(token), load)
+    return expires_at > time.time()
 
 def get_record_id_by_owner(patient_address: str):
     contract = _load_contract()
@@ -241,32 +515,207 @@ def fetch_access_logs_for_patient(patient: str):
             "expiresAt": int(ev["args"]["expiresAt"]),
         }
         for ev in map(
-            registry.events.AccessRequested().process_log, logs
+            contracts.event("AccessRequested").process_log, logs
         )
     ]
 
 def is_identity_registered(user: str) -> bool:
-    contract = _load_contract()  # AccessRegistry
-    return contract.functions.isRegistered(
-        Web3.to_checksum_address(user)
-    ).call()
+    def load():
+        contract = _load_contract()  # AccessRegistry
+        return contract.functions.isRegistered(
+            Web3.to_checksum_address(user)
+        ).call()
+
+    return chain_cache.registered.get_or_load(chain_cache.wallet_key(user), load)
 
 def get_patient_pubkey(wallet: str):
     """
     Fetch patient public key from AccessRegistry contract.
     Returns pubkey bytes or None.
     """
-    contract = _load_contract()
-    wallet = Web3.to_checksum_address(wallet)
+    def load():
+        contract = _load_contract()
 
-    identity = contract.functions.identities(wallet).call()
+        identity = contract.functions.identities(
+            Web3.to_checksum_address(wallet)
+        ).call()
 
-    # identity = (idHash, pubKey, exists)
-    id_hash = identity[0]
-    pub_key = identity[1]
-    exists = identity[2]
+        # identity = (idHash, pubKey, exists)
+        id_hash = identity[0]
+        pub_key = identity[1]
+        exists = identity[2]
 
-    if not exists or not pub_key:
-        return None
+        if not exists or not pub_key:
+            return None
+
+        return pub_key
+
+    # Cached; invalidated by IdentityRegistered
+    return chain_cache.pubkeys.get_or_load(chain_cache.wallet_key(wallet), load)
+
+
+# ------------------------------------------------------------
+# BATCHED READS
+# ------------------------------------------------------------
+class RpcError(Exception):
+    pass
 
-    return pub_key
\ No newline at end of file
+
+class ReadBatch:
+    """
+    Collects view calls and sends them as JSON-RPC batches of eth_call,
+    RPC_BATCH_SIZE calls per HTTP round trip.
+
+        batch = ReadBatch()
+        batch.add("getRecordIdByOwner", wallet_a)
+        batch.add("getRecordIdByOwner", wallet_b)
+        id_a, id_b = batch.execute()
+
+    Each result is the decoded return value (a tuple when the function
+    returns several values). Calls that revert yield None instead of
+    failing the whole batch.
+    """
+
+    _session = requests.Session()
+
+    def __init__(self, contract=None, block="latest"):
+        self.contract = contract or _load_contract()
+        self.block = block
+        self._calls = []        # (calldata, output types)
+
+    def add(self, fn_name: str, *args) -> int:
+        fn = self.contract.get_function_by_name(fn_name)
+        types = [o["type"] for o in fn.abi["outputs"]]
+        data = self.contract.encode_abi(fn_name, args=list(args))
+        self._calls.append((data, types))
+        return len(self._calls) - 1
+
+    def __len__(self):
+        return len(self._calls)
+
+    def _send(self, calls: list) -> list:
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "eth_call",
+                "params": [{"to": self.contract.address, "data": data}, self.block],
+            }
+            for i, (data, _) in enumerate(calls)
+        ]
+        resp = self._session.post(RPC_URL, json=payload, timeout=30)
+        resp.raise_for_status()
+        replies = resp.json()
+        if not isinstance(replies, list):
+            raise RpcError(f"RPC node rejected batch: {replies}")
+
+        by_id = {r.get("id"): r for r in replies}
+        results = []
+        for i, (_, types) in enumerate(calls):
+            reply = by_id.get(i)
+            if reply is None:
+                raise RpcError(f"Missing reply for batched call {i}")
+            if "error" in reply:
+                results.append(None)
+                continue
+            values = w3.codec.decode(types, Web3.to_bytes(hexstr=reply["result"]))
+            results.append(values[0] if len(values) == 1 else tuple(values))
+        return results
+
+    def execute(self) -> list:
+        results = []
+        for start in range(0, len(self._calls), RPC_BATCH_SIZE):
+            results += self._send(self._calls[start:start + RPC_BATCH_SIZE])
+        self._calls = []
+        return results
+
+
+def get_records_by_owners(owners: list) -> list:
+    """
+    Latest record of each owner in two batched round trips
+    (getRecordIdByOwner, then getRecord). Returns, per owner,
+    None or the get_record_by_id() dict plus "record_id".
+    """
+    batch = ReadBatch()
+    for owner in owners:
+        batch.add("getRecordIdByOwner", Web3.to_checksum_address(owner))
+    record_ids = batch.execute()
+
+    present = [
+        i for i, rid in enumerate(record_ids)
+        if rid is not None and any(rid)
+    ]
+    for i in present:
+        batch.add("getRecord", record_ids[i])
+
+    keys = [chain_cache.record_key(record_ids[i]) for i in present]
+    out = [None] * len(owners)
+    loaded = {}
+    generations = [chain_cache.records.begin_load(key) for key in keys]
+    try:
+        for i, rec in zip(present, batch.execute()):
+            if rec is not None:
+                record = _record_dict(rec)
+                loaded[i] = record
+                out[i] = {"record_id": record_ids[i].hex(), **record}
+    finally:
+        for i, key, generation in zip(present, keys, generations):
+            chain_cache.records.end_load(key, generation, loaded.get(i, chain_cache.MISSING))
+    return out
+
+
+def get_records_by_ids(record_ids: list) -> list:
+    """Batched get_record_by_id(); None where the read reverted."""
+    batch = ReadBatch()
+    for record_id in record_ids:
+        batch.add("getRecord", _b32(record_id))
+
+    keys = [chain_cache.record_key(record_id) for record_id in record_ids]
+    out = []
+    generations = [chain_cache.records.begin_load(key) for key in keys]
+    try:
+        out = [_record_dict(rec) if rec is not None else None for rec in batch.execute()]
+    finally:
+        for i, (key, generation) in enumerate(zip(keys, generations)):
+            record = out[i] if i < len(out) and out[i] is not None else chain_cache.MISSING
+            chain_cache.records.end_load(key, generation, record)
+    return out
+
+
+def check_tokens_valid(tokens: list) -> list:
+    batch = ReadBatch()
+    for token in tokens:
+        batch.add("tokenValid", _b32(token))
+    return [bool(v) for v in batch.execute()]
+
+
+def get_patient_pubkeys(wallets: list) -> dict:
+    """
+    Batched get_patient_pubkey(): {lowercase wallet: pubkey bytes | None}.
+    Served from the identity cache where possible; the rest is fetched in
+    one batched pass and cached.
+    """
+    out = {}
+    missing = []
+    for wallet in {chain_cache.wallet_key(w) for w in wallets}:
+        cached = chain_cache.pubkeys.get(wallet, None)
+        if cached is None:
+            missing.append(wallet)
+        else:
+            out[wallet] = cached
+
+    batch = ReadBatch()
+    for wallet in missing:
+        batch.add("identities", Web3.to_checksum_address(wallet))
+
+    generations = [chain_cache.pubkeys.begin_load(wallet) for wallet in missing]
+    try:
+        for wallet, identity in zip(missing, batch.execute()):
+            # identity = (idHash, pubKey, exists)
+            pub_key = identity[1] if identity and identity[2] and identity[1] else None
+            out[wallet] = pub_key
+    finally:
+        for wallet, generation in zip(missing, generations):
+            chain_cache.pubkeys.end_load(wallet, generation, out.get(wallet, chain_cache.MISSING))
+
+    return out
@@ -0,0 +1,148 @@
+"""
+Re-verify the chameleon hash of every record version from indexed chain data.
+
+Records and their redactions come from the event index (RecordStored /
+RecordUpdated in record_events), the committed hash from one batched
+getRecord pass, owner public keys from one batched identities pass, and the
+(cid, r, consent) openings from ch_witnesses. Openings handed out by
+/chameleon-hash are kept in ch_openings and only become witnesses once the
+record that uses that hash is approved. Every version of a record must
+hash to the same on-chain value; all of them are checked with
+chameleon_hash.verify.verify_many().
+
+Usage (from backend/src):
+    python ch_audit.py [--fail-fast]
+"""
+
+import argparse
+import json
+
+from db_pool import Db, pool
+from chain_cache import record_key
+from blockchain_utils import get_records_by_ids, get_patient_pubkeys
+from chameleon_hash.ch_secp256k1 import encode_message
+from chameleon_hash.verify import verify_many
+
+
+def record_witness(db: Db, record_id: str, cid: str, r: int, consent: bool, now: int):
+    """Remember the opening of one record version (caller commits)."""
+    db.execute(
+        "INSERT OR REPLACE INTO ch_witnesses VALUES (?,?,?,?,?)",
+        (record_key(record_id), cid, hex(r), int(bool(consent)), now),
+    )
+
+
+def record_opening(db: Db, record_id: str, ch: str, cid: str, r: int, consent: bool, now: int):
+    """Remember an opening whose hash may or may not be committed (caller commits)."""
+    db.execute(
+        "INSERT OR IGNORE INTO ch_openings VALUES (?,?,?,?,?,?)",
+        (record_key(record_id), record_key(ch), cid, hex(r), int(bool(consent)), now),
+    )
+
+
+def commit_opening(db: Db, record_id: str, ch: str, now: int) -> bool:
+    """
+    Promote the opening of `ch` to the record's witness and drop the other
+    candidates for that record (caller commits). False if none was recorded.
+    """
+    record_id, ch = record_key(record_id), record_key(ch)
+    row = db.one(
+        "SELECT cid, r, consent FROM ch_openings WHERE record_id=? AND ch=?",
+        (record_id, ch),
+    )
+    if row is None:
+        return False
+    cid, r, consent = row
+    record_witness(db, record_id, cid, int(r, 16), bool(consent), now)
+    db.execute("DELETE FROM ch_openings WHERE record_id=?", (record_id,))
+    return True
+
+
+def audit_records(db: Db, fail_fast: bool = False) -> dict:
+    stored = db.all("""
+        SELECT record_id, owner FROM record_events
+        WHERE kind='stored' ORDER BY block_number, log_index
+    """)
+    updates = {}
+    for record_id, new_cid in db.all("""
+        SELECT record_id, new_cid FROM record_events
+        WHERE kind='updated' ORDER BY block_number, log_index
+    """):
+        updates.setdefault(record_id, []).append(new_cid)
+
+    witnesses = {}
+    for record_id, cid, r, consent in db.all(
+        "SELECT record_id, cid, r, consent FROM ch_witnesses"
+    ):
+        witnesses.setdefault(record_id, {})[cid] = (int(r, 16), bool(consent))
+
+    records = get_records_by_ids([record_id for record_id, _ in stored])
+    pubkeys = get_patient_pubkeys([owner for _, owner in stored])
+
+    items, where, failures = [], [], []
+
+    for (record_id, owner), rec in zip(stored, records):
+        if rec is None:
+            failures.append({"record_id": record_id, "reason": "getRecord failed"})
+            continue
+        pk = pubkeys.get(owner)
+        if pk is None:
+            failures.append({"record_id": record_id, "reason": "owner identity not registered"})
+            continue
+
+        opened = witnesses.get(record_id, {})
+        redactions = updates.get(record_id, [])
+        initial = [cid for cid in opened if cid not in redactions]
+        versions = initial + redactions
+        if not versions:
+            versions = [rec["encryptedCid"]]
+
+        for cid in versions:
+            if cid not in opened:
+                failures.append({"record_id": record_id, "cid": cid, "reason": "missing witness"})
+                continue
+            r, consent = opened[cid]
+            items.append((encode_message(cid, consent, pk), r, pk, rec["h"]))
+            where.append((record_id, cid))
+
+        if fail_fast and failures:
+            break
+
+    if fail_fast and failures:
+        report = {"ok": False, "checked": 0, "total": len(items), "failures": []}
+    else:
+        report = verify_many(items, fail_fast=fail_fast)
+
+    for f in report["failures"]:
+        record_id, cid = where[f["index"]]
+        failures.append({
+            "record_id": record_id,
+            "cid": cid,
+            "reason": "hash mismatch",
+            "expected": f["expected"],
+            "actual": f["actual"],
+        })
+
+    return {
+        "ok": not failures and report["ok"],
+        "records": len(stored),
+        "versions_checked": report["checked"],
+        "versions_total": report["total"],
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit chameleon hashes of all indexed records")
+    parser.add_argument("--fail-fast", action="store_true")
+    args = parser.parse_args()
+
+    with pool.connection() as db:
+        report = audit_records(db, fail_fast=args.fail_fast)
+
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# backend/src/chain_cache.py
+#
+# Read-through TTL+LRU caches for on-chain state that only changes when an
+# AccessRegistry event fires. blockchain_utils reads through them, and the
+# event indexer calls on_event() for every decoded log, so entries are
+# dropped (or, for tokens, filled) as soon as the change is indexed. The
+# TTL only bounds staleness if the indexer falls behind or is not running.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from web3 import Web3
+
+CACHE_TTL = float(os.getenv("CHAIN_CACHE_TTL", "300"))
+CACHE_SIZE = int(os.getenv("CHAIN_CACHE_SIZE", "10000"))
+
+MISSING = object()       # "no value" sentinel for get() and end_load()
+
+
+class TtlLruCache:
+    """
+    Read-through fills are guarded against racing writes: each key with a
+    load in flight has a generation that put/invalidate/clear bump, and the
+    loaded value is only stored if the generation is unchanged, so a value
+    read before an event cannot overwrite the invalidation that event caused.
+    Use get_or_load(), or begin_load()/end_load() around a batched read.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()      # key -> (expires_at, value)
+        self._loading = {}              # key -> [loads in flight, generation]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def _bump(self, key):
+        loading = self._loading.get(key)
+        if loading is not None:
+            loading[1] += 1
+
+    def _store(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def put(self, key, value):
+        with self._lock:
+            self._bump(key)
+            self._store(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._bump(key)
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            for loading in self._loading.values():
+                loading[1] += 1
+            self._data.clear()
+
+    def begin_load(self, key) -> int:
+        """Call before reading `key` from the chain; pass the result to end_load()."""
+        with self._lock:
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[0] += 1
+            return loading[1]
+
+    def end_load(self, key, generation: int, value=MISSING):
+        """Store `value` unless the key changed since begin_load(); always pair with it."""
+        with self._lock:
+            loading = self._loading[key]
+            if value is not MISSING and loading[1] == generation:
+                self._store(key, value)
+            loading[0] -= 1
+            if not loading[0]:
+                del self._loading[key]
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        generation = self.begin_load(key)
+        value = MISSING
+        try:
+            value = loader()
+            return value
+        finally:
+            self.end_load(key, generation, value)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+def record_key(record_id) -> str:
+    if isinstance(record_id, str):
+        record_id = bytes.fromhex(record_id.removeprefix("0x").zfill(64))
+    return Web3.to_hex(record_id)
+
+
+def wallet_key(wallet: str) -> str:
+    return wallet.lower()
+
+
+records = TtlLruCache()         # record id -> get_record_by_id() dict
+pubkeys = TtlLruCache()         # wallet -> identity pubkey bytes | None
+registered = TtlLruCache()      # wallet -> bool
+token_expiry = TtlLruCache()    # token -> expiresAt (0 if unknown on-chain)
+
+
+def on_event(name: str, args):
+    """Apply one decoded AccessRegistry event to the caches."""
+    if name in ("RecordStored", "RecordUpdated", "ConsentToggled"):
+        records.invalidate(record_key(args["recordId"]))
+    elif name == "IdentityRegistered":
+        pubkeys.invalidate(wallet_key(args["user"]))
+        registered.invalidate(wallet_key(args["user"]))
+    elif name == "AccessRequested":
+        token_expiry.put(record_key(args["token"]), int(args["expiresAt"]))
+
+
+def clear_all():
+    """Drop everything, e.g. after the event index was rolled back by a reorg."""
+    for cache in (records, pubkeys, registered, token_expiry):
+        cache.clear()
+
+
+def stats() -> dict:
+    return {
+        "records": records.stats(),
+        "pubkeys": pubkeys.stats(),
+        "registered": registered.stats(),
+        "token_expiry": token_expiry.stats(),
+    }
@@ -0,0 +1,80 @@
+"""
+Chameleon-hash throughput: per-message ch_hash() vs ch_hash_many().
+
+For each batch size the same (message, r) pairs are hashed three ways:
+a ch_hash() loop, ch_hash_many() in-process, and ch_hash_many() with the
+process pool. Each is repeated and the best run is reported as hashes/s,
+after checking that all three produce identical digests.
+
+Usage (from backend/src):
+    python -m chameleon_hash.benchmark [max_batch]
+"""
+
+import csv
+import os
+import sys
+import time
+
+from coincurve import PrivateKey
+
+from .ch_secp256k1 import (
+    OUT_DIR, CH_PROCESSES, encode_message, ch_hash, ch_hash_many, _rand_scalar
+)
+
+MAX_BATCH = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+BATCH_SIZES = [n for n in (1, 10, 100, 1_000, 10_000, 100_000) if n <= MAX_BATCH]
+
+
+def _best(fn, repeats: int) -> tuple:
+    best, out = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    pk = PrivateKey().public_key.format(compressed=True)
+    results = []
+
+    # Start the process pool outside the timed region
+    warm = [encode_message("warm-up", True, pk)] * 8192
+    ch_hash_many(warm, [_rand_scalar()] * len(warm), pk)
+
+    print(f"Chameleon hash throughput ({CH_PROCESSES} processes available)")
+    for n in BATCH_SIZES:
+        messages = [encode_message(f"Qm{i:046d}", True, pk) for i in range(n)]
+        rs = [_rand_scalar() for _ in range(n)]
+        repeats = max(1, min(20, 10_000 // n))
+
+        t_loop, ref = _best(lambda: [ch_hash(m, r, pk) for m, r in zip(messages, rs)], repeats)
+        t_batch, out_batch = _best(lambda: ch_hash_many(messages, rs, pk, parallel=False), repeats)
+        t_pool, out_pool = _best(lambda: ch_hash_many(messages, rs, pk), repeats)
+        assert out_batch == ref and out_pool == ref
+
+        row = {
+            "batch": n,
+            "ch_hash_per_s": round(n / t_loop),
+            "ch_hash_many_per_s": round(n / t_batch),
+            "ch_hash_many_pool_per_s": round(n / t_pool),
+            "speedup": round(t_loop / min(t_batch, t_pool), 2),
+        }
+        results.append(row)
+        print(
+            f"  n={n:<7} ch_hash {row['ch_hash_per_s']:>9}/s   "
+            f"batch {row['ch_hash_many_per_s']:>9}/s   "
+            f"batch+pool {row['ch_hash_many_pool_per_s']:>9}/s   x{row['speedup']}"
+        )
+
+    csv_path = os.path.join(OUT_DIR, "ch_batch_throughput.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"Benchmark complete. Results saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 # backend/src/chameleon_hash.py
 import os
 import secrets
-from Crypto.Hash import SHA256, keccak
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from Crypto.Hash import keccak
 from coincurve import PublicKey
 
 OUT_DIR = os.path.join(os.path.dirname(__file__), "outputs")
@@ -10,15 +15,15 @@ os.makedirs(OUT_DIR, exist_ok=True)
 # secp256k1 order
 SECP256K1_N = int("FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141", 16)
 
+# Batches at least this large are split across a process pool
+CH_PARALLEL_MIN = int(os.environ.get("CH_PARALLEL_MIN", "4096"))
+CH_PROCESSES = int(os.environ.get("CH_PROCESSES", str(os.cpu_count() or 1)))
+
 def _sha256(b: bytes) -> bytes:
-    h = SHA256.new()
-    h.update(b)
-    return h.digest()
+    return hashlib.sha256(b).digest()
 
 def _keccak256(b: bytes) -> bytes:
-    k = keccak.new(digest_bits=256)
-    k.update(b)
-    return k.digest()
+    return keccak.new(data=b, digest_bits=256).digest()
 
 def _hash_to_scalar(b: bytes) -> int:
     s = int.from_bytes(_sha256(b), "big") % SECP256K1_N
@@ -66,3 +71,92 @@ def forge_r(original_r: int, trapdoor_x: int, original_message: bytes, new_messa
     delta = (H_orig - H_new) % SECP256K1_N
     r_new = (original_r + (trapdoor_x * delta)) % SECP256K1_N
     return r_new
+
+
+# ------------------------------------------------------------
+# Batched hashing
+# ------------------------------------------------------------
+@lru_cache(maxsize=1024)
+def _pk_table(pk_pubbytes: bytes):
+    """
+    Per-public-key precomputation for _combine(): P's x coordinate (mod n),
+    the parity of y, and the parsed key for the fallback path.
+    None for x ≥ n, where the recovery trick does not apply.
+    """
+    P = PublicKey(pk_pubbytes)
+    x, y = P.point()
+    if x >= SECP256K1_N:
+        return None, P
+    return (x, y & 1), P
+
+def _combine(r: int, hm: int, table, P: PublicKey) -> PublicKey:
+    """
+    r*G + hm*P as one double-scalar multiplication.
+
+    ECDSA public-key recovery computes Q = rx⁻¹·(s·R − z·G) with libsecp256k1's
+    Strauss multi-scalar ecmult (G side uses its precomputed tables), where R is
+    the point with x-coordinate rx. Taking R = P, s = hm·rx and z = −r·rx gives
+    Q = hm·P + r·G. All inputs are public, so variable time is fine.
+    """
+    if table is not None:
+        rx, recid = table
+        s = hm * rx % SECP256K1_N
+        z = -r * rx % SECP256K1_N
+        sig = rx.to_bytes(32, "big") + s.to_bytes(32, "big") + bytes([recid])
+        try:
+            return PublicKey.from_signature_and_message(sig, z.to_bytes(32, "big"), hasher=None)
+        except Exception:
+            pass        # s == 0 or a point at infinity: take the generic path
+
+    rG = PublicKey.from_valid_secret(r.to_bytes(32, "big"))
+    hmP = P.multiply(hm.to_bytes(32, "big"))
+    return PublicKey.combine_keys([rG, hmP])
+
+def _ch_hash_chunk(messages, rs, pk_pubbytes: bytes):
+    table, P = _pk_table(pk_pubbytes)
+    out = []
+    for m_bytes, r in zip(messages, rs):
+        comp = _combine(r, _hash_to_scalar(m_bytes), table, P).format(compressed=True)
+        out.append((_keccak256(comp).hex(), comp))
+    return out
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    # Created lazily from request threads, so fork would copy whatever locks
+    # those threads hold; spawned workers start from a clean interpreter
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=CH_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+def ch_hash_many(messages, rs, pk_pubbytes: bytes, parallel: bool = True):
+    """
+    Batched ch_hash() for one public key: returns [(digest_hex, compressed), ...]
+    in input order, identical to calling ch_hash() per message.
+    Batches of CH_PARALLEL_MIN or more are spread over a process pool.
+    """
+    messages = list(messages)
+    rs = list(rs)
+    if len(messages) != len(rs):
+        raise ValueError("messages and rs must have the same length")
+
+    if not parallel or CH_PROCESSES <= 1 or len(messages) < CH_PARALLEL_MIN:
+        return _ch_hash_chunk(messages, rs, pk_pubbytes)
+
+    pool = _get_process_pool()
+    size = -(-len(messages) // (CH_PROCESSES * 4))   # a few chunks per worker
+    futures = [
+        pool.submit(_ch_hash_chunk, messages[i:i + size], rs[i:i + size], pk_pubbytes)
+        for i in range(0, len(messages), size)
+    ]
+
+    out = []
+    for fut in futures:
+        out += fut.result()
+    return out
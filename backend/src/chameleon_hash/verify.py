@@ -0,0 +1,73 @@
+# backend/src/chameleon_hash/verify.py
+#
+# Verification of chameleon hashes: recompute keccak(r*G + H(m)*P) and compare
+# with the expected digest. Batches are grouped by public key and run through
+# ch_hash_many(); with fail_fast the batch is processed in slices and stops at
+# the first slice containing a mismatch.
+#
+# A randomized batch check (one random linear combination of all
+# r_i*G + h_i*P_i - C_i) needs the committed points C_i, but only their keccak
+# digests are stored on-chain, so every hash is recomputed individually.
+
+from collections import defaultdict
+
+from .ch_secp256k1 import ch_hash, ch_hash_many
+
+FAIL_FAST_SLICE = 1024
+
+
+def _norm(digest: str) -> str:
+    digest = digest.lower()
+    return digest[2:] if digest.startswith("0x") else digest
+
+
+def verify(m_bytes: bytes, r: int, pk_pubbytes: bytes, expected_hex: str) -> bool:
+    """True iff ch_hash(m, r, pk) equals `expected_hex` (with or without 0x)."""
+    digest, _ = ch_hash(m_bytes, r, pk_pubbytes)
+    return digest == _norm(expected_hex)
+
+
+def verify_many(items, fail_fast: bool = False) -> dict:
+    """
+    Verify [(m_bytes, r, pk_pubbytes, expected_hex), ...].
+
+    Returns {"ok", "checked", "total", "failures": [{"index", "expected", "actual"}]}.
+    `checked` is smaller than `total` when fail_fast stopped early; failure
+    indexes refer to positions in `items`.
+    """
+    items = list(items)
+    by_pk = defaultdict(list)
+    for i, (_, _, pk, _) in enumerate(items):
+        by_pk[bytes(pk)].append(i)
+
+    failures = []
+    checked = 0
+    step = FAIL_FAST_SLICE if fail_fast else len(items) or 1
+
+    for pk, indexes in by_pk.items():
+        for start in range(0, len(indexes), step):
+            part = indexes[start:start + step]
+            results = ch_hash_many(
+                [items[i][0] for i in part],
+                [items[i][1] for i in part],
+                pk,
+            )
+            checked += len(part)
+
+            for i, (digest, _) in zip(part, results):
+                expected = _norm(items[i][3])
+                if digest != expected:
+                    failures.append({"index": i, "expected": expected, "actual": digest})
+
+            if fail_fast and failures:
+                break
+        if fail_fast and failures:
+            break
+
+    failures.sort(key=lambda f: f["index"])
+    return {
+        "ok": not failures and checked == len(items),
+        "checked": checked,
+        "total": len(items),
+        "failures": failures,
+    }
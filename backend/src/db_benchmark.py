@@ -0,0 +1,178 @@
+"""
+Lookup latency on auth.db before and after the index migration.
+
+Seeds a scratch database with N users (plus one OTP row per user and a
+pending record for every fifth patient) at schema version 1, times the
+hot ehr_routes lookups, applies the remaining migrations and times them
+again. The query plan for each lookup is printed next to its latency.
+
+Usage (from the repo root):
+    python backend/src/db_benchmark.py [n_users]
+"""
+
+import csv
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from db_init import migrate, schema_version  # noqa: E402
+
+OUT_DIR = Path(__file__).resolve().parent / "outputs"
+N_USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+SAMPLES = 200
+
+# (name, sql, key column used to pick lookup parameters)
+LOOKUPS = [
+    ("users by patient_id",
+     "SELECT wallet FROM users WHERE patient_id=? AND role='patient'",
+     "patient_id"),
+    ("users by wallet",
+     "SELECT patient_id FROM users WHERE wallet=? AND role='patient'",
+     "wallet"),
+    ("users by email",
+     "SELECT patient_id, wallet FROM users WHERE email=? AND role='patient'",
+     "email"),
+    ("otp by email",
+     "SELECT code, expires FROM otp WHERE email=?",
+     "email"),
+    ("pending by patient",
+     """
+     SELECT id, admin_wallet, cid, record_id, tx_data
+     FROM pending_records
+     WHERE patient_id=? AND status='pending'
+     """,
+     "patient_id"),
+]
+
+
+def _seed(conn: sqlite3.Connection, n: int):
+    now = int(time.time())
+    roles = ("patient", "patient", "patient", "doctor", "admin")
+
+    def users():
+        for i in range(n):
+            role = roles[i % len(roles)]
+            yield (
+                f"user{i}@example.com",
+                f"0x{i:040x}",
+                role,
+                f"P{i:08d}" if role == "patient" else None,
+                now,
+            )
+
+    def otps():
+        for i in range(n):
+            yield (f"user{i}@example.com", f"{i % 1_000_000:06d}", now + 300)
+
+    def pending():
+        for i in range(0, n, 5):
+            yield (f"P{i:08d}", "0xadmin", f"cid{i}", "ch", f"rec{i}", "{}",
+                   "pending" if i % 10 else "approved", now)
+
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (email, wallet, role, patient_id, created_at) VALUES (?,?,?,?,?)",
+        users(),
+    )
+    conn.executemany("INSERT INTO otp VALUES (?,?,?)", otps())
+    conn.executemany(
+        """
+        INSERT INTO pending_records
+        (patient_id, admin_wallet, cid, ch, record_id, tx_data, status, created_at)
+        VALUES (?,?,?,?,?,?,?,?)
+        """,
+        pending(),
+    )
+    conn.execute("COMMIT")
+
+
+def _keys(conn: sqlite3.Connection) -> dict:
+    rng = random.Random(0)
+    rows = conn.execute(
+        "SELECT patient_id, wallet, email FROM users WHERE role='patient'"
+    ).fetchall()
+    picks = [rows[rng.randrange(len(rows))] for _ in range(SAMPLES)]
+    return {
+        "patient_id": [r[0] for r in picks],
+        "wallet": [r[1] for r in picks],
+        "email": [r[2] for r in picks],
+    }
+
+
+def _plan(conn: sqlite3.Connection, sql: str, param) -> str:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (param,)).fetchall()
+    return "; ".join(r[-1] for r in rows)
+
+
+def _time(conn: sqlite3.Connection, sql: str, params: list) -> list:
+    samples = []
+    for p in params:
+        start = time.perf_counter()
+        conn.execute(sql, (p,)).fetchall()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _run(conn: sqlite3.Connection, keys: dict, stage: str) -> list:
+    results = []
+    print(f"\nSchema version {schema_version(conn)} ({stage})")
+    for name, sql, key in LOOKUPS:
+        samples = sorted(_time(conn, sql, keys[key]))
+        median = statistics.median(samples)
+        p99 = samples[int(len(samples) * 0.99) - 1]
+        plan = _plan(conn, sql, keys[key][0])
+        print(f"  {name:<20} median {median:10.1f} us   p99 {p99:10.1f} us   {plan}")
+        results.append({
+            "stage": stage,
+            "lookup": name,
+            "median_us": round(median, 2),
+            "p99_us": round(p99, 2),
+            "plan": plan,
+        })
+    return results
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+
+        migrate(conn, target=1)
+
+        print(f"Seeding {N_USERS:,} users")
+        start = time.perf_counter()
+        _seed(conn, N_USERS)
+        conn.execute("ANALYZE")
+        print(f"  seeded in {time.perf_counter() - start:.1f}s")
+
+        keys = _keys(conn)
+        results = _run(conn, keys, "unindexed")
+
+        start = time.perf_counter()
+        migrate(conn)
+        print(f"  migrated in {time.perf_counter() - start:.1f}s")
+
+        results += _run(conn, keys, "indexed")
+        conn.close()
+
+    OUT_DIR.mkdir(exist_ok=True)
+    csv_path = OUT_DIR / "db_lookup_latency.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"\nDB benchmark complete. Results saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
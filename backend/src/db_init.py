@@ -1,46 +1,271 @@
 import sqlite3
 
-def init_db():
-    conn = sqlite3.connect("auth.db")
-    cur = conn.cursor()
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-
-    email TEXT UNIQUE NOT NULL,
-    wallet TEXT UNIQUE NOT NULL,
-
-    role TEXT CHECK(role IN ('patient','doctor','admin')) NOT NULL,
-
-    patient_id TEXT UNIQUE,     -- only for patients
-    verified INTEGER DEFAULT 0,
-
-    created_at INTEGER
-)
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS otp (
-        email TEXT,
-        code TEXT,
-        expires INTEGER
-    )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS pending_records (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    patient_id TEXT NOT NULL,
-    admin_wallet TEXT NOT NULL,
-    cid TEXT NOT NULL,
-    ch TEXT NOT NULL,
-    record_id TEXT NOT NULL,
-    tx_data TEXT NOT NULL,
-    status TEXT DEFAULT 'pending',
-    created_at INTEGER
-);
-    """)
-
-    conn.commit()
-    conn.close()
+from db_pool import DB_PATH
+
+# ======================================================
+# MIGRATIONS
+# ======================================================
+# Each entry is (version, description, statements). The applied version is
+# stored in PRAGMA user_version, so every migration runs exactly once per
+# database file. Append new migrations; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "baseline schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+            email TEXT UNIQUE NOT NULL,
+            wallet TEXT UNIQUE NOT NULL,
+
+            role TEXT CHECK(role IN ('patient','doctor','admin')) NOT NULL,
+
+            patient_id TEXT UNIQUE,     -- only for patients
+            verified INTEGER DEFAULT 0,
+
+            created_at INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS otp (
+            email TEXT,
+            code TEXT,
+            expires INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS pending_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id TEXT NOT NULL,
+            admin_wallet TEXT NOT NULL,
+            cid TEXT NOT NULL,
+            ch TEXT NOT NULL,
+            record_id TEXT NOT NULL,
+            tx_data TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at INTEGER
+        )
+        """,
+    ]),
+    (2, "lookup indexes", [
+        # users lookups by patient_id / wallet / email already resolve to a
+        # single row through the UNIQUE autoindexes; extra covering indexes
+        # there are ignored by the planner and only slow down writes.
+
+        # otp WHERE email=? -> code, expires
+        """
+        CREATE INDEX IF NOT EXISTS idx_otp_email
+        ON otp(email, code, expires)
+        """,
+        # pending_records WHERE patient_id=? AND status='pending'
+        """
+        CREATE INDEX IF NOT EXISTS idx_pending_patient
+        ON pending_records(patient_id) WHERE status='pending'
+        """,
+    ]),
+    (3, "on-chain event index", [
+        # Highest indexed block plus the recent block hashes used to detect
+        # reorgs. Only the last REORG_DEPTH checkpoints are kept.
+        """
+        CREATE TABLE IF NOT EXISTS indexed_blocks (
+            number INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS access_requests (
+            block_number INTEGER NOT NULL,
+            log_index INTEGER NOT NULL,
+            tx_hash TEXT NOT NULL,
+            provider TEXT NOT NULL,     -- lowercase 0x address
+            patient TEXT NOT NULL,      -- lowercase 0x address
+            record_id TEXT NOT NULL,    -- 0x bytes32
+            token TEXT NOT NULL,        -- 0x bytes32
+            expires_at INTEGER NOT NULL,
+            PRIMARY KEY (block_number, log_index)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_access_patient
+        ON access_requests(patient, block_number)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_access_provider
+        ON access_requests(provider, block_number)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS record_events (
+            block_number INTEGER NOT NULL,
+            log_index INTEGER NOT NULL,
+            tx_hash TEXT NOT NULL,
+            kind TEXT CHECK(kind IN ('stored','updated')) NOT NULL,
+            record_id TEXT NOT NULL,
+            owner TEXT,                 -- RecordStored only
+            new_cid TEXT,               -- RecordUpdated only
+            PRIMARY KEY (block_number, log_index)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_record_events_record
+        ON record_events(record_id, block_number)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS consent_events (
+            block_number INTEGER NOT NULL,
+            log_index INTEGER NOT NULL,
+            tx_hash TEXT NOT NULL,
+            patient TEXT NOT NULL,
+            record_id TEXT NOT NULL,
+            active INTEGER NOT NULL,
+            PRIMARY KEY (block_number, log_index)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_consent_record
+        ON consent_events(record_id, block_number)
+        """,
+    ]),
+    (4, "batch onboarding jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS onboard_jobs (
+            id TEXT PRIMARY KEY,
+            admin_wallet TEXT NOT NULL,
+            root TEXT NOT NULL,         -- directory manifest paths resolve against
+            status TEXT CHECK(status IN ('created','running','done','failed')) NOT NULL,
+            total INTEGER NOT NULL,
+            error TEXT,
+            created_at INTEGER,
+            updated_at INTEGER
+        )
+        """,
+        # One row per manifest line. cid/ch/r/record_id are kept as soon as
+        # the item is uploaded and hashed, so a resumed job skips that work.
+        """
+        CREATE TABLE IF NOT EXISTS onboard_items (
+            job_id TEXT NOT NULL,
+            line INTEGER NOT NULL,
+            patient_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            status TEXT CHECK(status IN ('pending','uploaded','done','failed'))
+                NOT NULL DEFAULT 'pending',
+            cid TEXT,
+            ch TEXT,
+            r TEXT,
+            record_id TEXT,
+            error TEXT,
+            PRIMARY KEY (job_id, line)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_onboard_items_status
+        ON onboard_items(job_id, status)
+        """,
+    ]),
+    (5, "chameleon hash witnesses", [
+        # The (cid, r, consent) opening behind each record version's hash,
+        # so audits can recompute it. r is public randomness, not a secret.
+        """
+        CREATE TABLE IF NOT EXISTS ch_witnesses (
+            record_id TEXT NOT NULL,    -- 0x bytes32, as in record_events
+            cid TEXT NOT NULL,
+            r TEXT NOT NULL,            -- 0x hex scalar
+            consent INTEGER NOT NULL,
+            created_at INTEGER,
+            PRIMARY KEY (record_id, cid)
+        )
+        """,
+    ]),
+    (6, "bulk redaction jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS redact_jobs (
+            id TEXT PRIMARY KEY,
+            transform TEXT NOT NULL,    -- JSON transform spec
+            status TEXT CHECK(status IN ('created','running','done','failed')) NOT NULL,
+            total INTEGER NOT NULL,
+            error TEXT,
+            created_at INTEGER,
+            updated_at INTEGER
+        )
+        """,
+        # Trapdoor keys are never stored; a resumed job must be given them again.
+        """
+        CREATE TABLE IF NOT EXISTS redact_items (
+            job_id TEXT NOT NULL,
+            record_id TEXT NOT NULL,    -- 0x bytes32
+            status TEXT CHECK(status IN ('pending','uploaded','done','failed'))
+                NOT NULL DEFAULT 'pending',
+            owner TEXT,
+            old_cid TEXT,
+            new_cid TEXT,
+            new_r TEXT,
+            tx_data TEXT,
+            error TEXT,
+            PRIMARY KEY (job_id, record_id)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_redact_items_status
+        ON redact_items(job_id, status)
+        """,
+    ]),
+    (7, "chameleon hash openings awaiting commit", [
+        """
+        CREATE TABLE IF NOT EXISTS ch_openings (
+            record_id TEXT NOT NULL,    -- 0x bytes32
+            ch TEXT NOT NULL,           -- 0x bytes32
+            cid TEXT NOT NULL,
+            r TEXT NOT NULL,
+            consent INTEGER NOT NULL,
+            created_at INTEGER,
+            PRIMARY KEY (record_id, ch)
+        )
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = LATEST_VERSION) -> list:
+    """
+    Apply every migration above the database's current version, up to
+    `target`. Each migration commits atomically together with its
+    version bump. Returns the versions that were applied.
+    """
+    applied = []
+    current = schema_version(conn)
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version={int(version)}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+
+    return applied
+
+
+def init_db(path: str = DB_PATH):
+    # isolation_level=None: migrate() manages its own transactions
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
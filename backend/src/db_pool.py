@@ -0,0 +1,138 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = os.getenv("DB_PATH", "auth.db")
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+# Applied once per connection when it is opened, not per request
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",     # 256 MiB
+    "PRAGMA cache_size=-65536",       # 64 MiB
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# sqlite3 keeps an LRU of prepared statements per connection, keyed by SQL text
+STATEMENT_CACHE = 256
+
+
+class Db:
+    """
+    Thin query helper over a pooled connection. Prepared statements are
+    reused across requests because the connection (and its statement
+    cache) outlives the request.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def one(self, sql: str, params=()):
+        return self.conn.execute(sql, params).fetchone()
+
+    def all(self, sql: str, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params=()):
+        return self.conn.execute(sql, params)
+
+    def executemany(self, sql: str, rows):
+        return self.conn.executemany(sql, rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE … COMMIT, rolled back on error."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+
+class ConnectionPool:
+    """
+    Fixed-size, thread-safe pool of SQLite connections. Connections are
+    opened lazily up to `size` and handed out one caller at a time, so
+    they can cross FastAPI's threadpool threads safely.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE, timeout: float = 30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise Exception("Timed out waiting for a database connection")
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield Db(conn)
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+    def stats(self) -> dict:
+        return {"size": self.size, "opened": self._opened, "idle": self._idle.qsize()}
+
+
+pool = ConnectionPool()
+
+
+def get_db():
+    """FastAPI dependency: check a connection out for the request, return it after."""
+    with pool.connection() as db:
+        yield db
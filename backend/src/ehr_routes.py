@@ -1,16 +1,43 @@
 import json
 
-from fastapi import APIRouter, UploadFile, Form, HTTPException
+from fastapi import APIRouter, UploadFile, Form, Header, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from web3 import Web3
-import io, time, sqlite3, random, smtplib
+import time, random, smtplib
 from email.message import EmailMessage
 
 # -------------------- IPFS + CRYPTO --------------------
-from ipfs.ipfs_helper import upload_to_ipfs_bytes, download_from_ipfs_bytes as download_from_ipfs
-from ipfs.aes_gcm import encrypt_bytes, decrypt_bytes
+from ipfs.ipfs_helper import (
+    upload_to_ipfs_bytes,
+    upload_to_ipfs_stream,
+    download_from_ipfs_stream,
+    download_from_ipfs_stream_async,
+    ipfs_client,
+    async_ipfs_client,
+    cid_cache,
+    open_ranged,
+    open_ranged_async,
+    use_dag_upload,
+)
+from ipfs.aes_gcm import encrypt_stream_async, aiter_upload, iter_file
 from chameleon_hash.ch_secp256k1 import encode_message, ch_hash, _rand_scalar, forge_r
-from key_generation.ecc import generate_ecc_key_pair
+from chameleon_hash.verify import verify
+from key_generation.key_pool import key_pool
+
+# -------------------- DATABASE --------------------
+from db_pool import Db, get_db
+import chain_cache
+from event_indexer import (
+    indexer,
+    access_requests_for_patient,
+    access_requests_for_doctor,
+    unexpired_access_tokens
+)
+
+from onboarding import OnboardingJob, parse_manifest
+from redaction import RedactionJob
+from ch_audit import record_witness, record_opening, commit_opening, audit_records
 
 # -------------------- BLOCKCHAIN --------------------
 from blockchain_utils import (
@@ -20,12 +47,13 @@ from blockchain_utils import (
     submit_access_request,
     get_record_by_id,
     get_record_id_by_owner,
-    fetch_access_logs_for_patient,
-    fetch_access_logs_for_doctor,
+    get_records_by_owners,
     check_token_valid,
+    check_tokens_valid,
     toggle_consent_tx,
     is_identity_registered,
-    get_patient_pubkey
+    get_patient_pubkey,
+    tx_preparer,
 )
 from dotenv import load_dotenv
 import os
@@ -37,23 +65,14 @@ router = APIRouter(prefix="/ehr", tags=["EHR"])
 EMAIL = str(os.getenv("EMAIL"))
 PASSWORD = str(os.getenv("EMAIL_PASSWORD"))
 
-# ======================================================
-# DATABASE
-# ======================================================
-def get_db():
-    conn = sqlite3.connect("auth.db", check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    return conn
-
 # ======================================================
 # AUTH — EMAIL OTP (PATIENT + DOCTOR)
 # ======================================================
 @router.post("/auth/request-otp")
-def request_otp(email: str = Form(...)):
+def request_otp(email: str = Form(...), db: Db = Depends(get_db)):
     code = str(random.randint(100000, 999999))
     expires = int(time.time()) + 300
 
-    db = get_db()
     db.execute("DELETE FROM otp WHERE email=?", (email,))
     db.execute("INSERT INTO otp VALUES (?,?,?)", (email, code, expires))
     db.commit()
@@ -74,14 +93,13 @@ def request_otp(email: str = Form(...)):
 @router.post("/auth/verify-otp")
 def verify_otp(
     email: str = Form(...),
-    otp: str = Form(...)
+    otp: str = Form(...),
+    db: Db = Depends(get_db)
 ):
-    db = get_db()
-
-    row = db.execute(
+    row = db.one(
         "SELECT code, expires FROM otp WHERE email=?",
         (email,)
-    ).fetchone()
+    )
 
     if not row or row[0] != otp or row[1] < time.time():
         raise HTTPException(status_code=401, detail="Invalid OTP")
@@ -102,18 +120,17 @@ def verify_otp(
 def register(
     email: str = Form(...),
     wallet: str = Form(...),
-    role: str = Form(...)
+    role: str = Form(...),
+    db: Db = Depends(get_db)
 ):
     if role not in ("patient", "doctor", "admin"):
         raise HTTPException(400, "Invalid role")
 
-    db = get_db()
-
     # ❌ Do not allow duplicate users
-    if db.execute(
+    if db.one(
         "SELECT 1 FROM users WHERE email=?",
         (email,)
-    ).fetchone():
+    ):
         raise HTTPException(409, "User already registered")
 
     import uuid
@@ -146,14 +163,13 @@ def register(
 def login(
     email: str = Form(...),
     wallet: str = Form(...),
-    role: str = Form(...)
+    role: str = Form(...),
+    db: Db = Depends(get_db)
 ):
-    db = get_db()
-
-    user = db.execute("""
+    user = db.one("""
         SELECT role, patient_id FROM users
         WHERE email=?
-    """, (email,)).fetchone()
+    """, (email,))
 
     if not user:
         raise HTTPException(401, "Invalid credentials")
@@ -178,19 +194,18 @@ def identity_registered(wallet: str):
 # ======================================================
 @router.post("/generate-keys")
 def generate_keys():
-    sk, pk = generate_ecc_key_pair(save_to_disk=False)
-
-    from cryptography.hazmat.primitives import serialization
-    pub_bytes = pk.public_bytes(
-        encoding=serialization.Encoding.X962,
-        format=serialization.PublicFormat.CompressedPoint
-    )
+    # Served from the pre-generated pool; falls back to inline generation when empty
+    private_key, public_key = key_pool.take()
 
     return {
-        "private_key": sk.private_numbers().private_value.to_bytes(32, "big").hex(),
-        "public_key": pub_bytes.hex()
+        "private_key": private_key,
+        "public_key": public_key
     }
 
+@router.get("/keys/metrics")
+def key_pool_metrics():
+    return key_pool.metrics()
+
 # ======================================================
 # REGISTER IDENTITY (ON-CHAIN)
 # ======================================================
@@ -214,26 +229,45 @@ def register_identity_api(
 # ======================================================
 @router.post("/encrypt")
 async def encrypt_ehr(file: UploadFile):
-    encrypted = encrypt_bytes(await file.read())
-    return StreamingResponse(io.BytesIO(encrypted), media_type="application/octet-stream")
+    # Stream the upload through the chunked encryptor without buffering it
+    encrypted = encrypt_stream_async(aiter_upload(file))
+    return StreamingResponse(encrypted, media_type="application/octet-stream")
 
 @router.post("/ipfs-upload")
 async def upload_ipfs(file: UploadFile):
-    cid = upload_to_ipfs_bytes(await file.read())
+    if file.size and use_dag_upload(file.size):
+        # Large records (if enabled): parallel block upload from the spooled temp file
+        cid = await run_in_threadpool(upload_to_ipfs_stream, iter_file(file.file))
+    else:
+        cid = await async_ipfs_client.add(aiter_upload(file))
     return {"cid": cid}
 
+@router.get("/ipfs/metrics")
+def ipfs_metrics():
+    return {
+        "sync": ipfs_client.metrics(),
+        "async": async_ipfs_client.metrics(),
+        "cache": cid_cache.stats()
+    }
+
+@router.get("/chain/metrics")
+def chain_metrics(db: Db = Depends(get_db)):
+    return {
+        "indexer": indexer.status(db),
+        "cache": chain_cache.stats()
+    }
+
 @router.post("/chameleon-hash/{cid}")
 def compute_ch(
     cid: str,
-    patient_id: str = Form(...)
+    patient_id: str = Form(...),
+    db: Db = Depends(get_db)
 ):
-    db = get_db()
-
     # 1️⃣ Resolve wallet
-    row = db.execute(
+    row = db.one(
         "SELECT wallet FROM users WHERE patient_id=? AND role='patient'",
         (patient_id,)
-    ).fetchone()
+    )
 
     if not row:
         raise HTTPException(404, "Patient not found")
@@ -254,6 +288,12 @@ def compute_ch(
     r = _rand_scalar()
     ch_hex, _ = ch_hash(msg, r, pub_bytes)
 
+    # 4️⃣ Keep the opening (same record_id as prepare-record); it becomes the
+    # audit witness only when the record using this ch is approved
+    record_id = Web3.keccak(text=cid + row[0]).hex()
+    record_opening(db, record_id, ch_hex, cid, r, True, int(time.time()))
+    db.commit()
+
     return {
         "ch": ch_hex,
         "r": hex(r)
@@ -264,15 +304,14 @@ def prepare_record(
     patient_id: str = Form(...),
     cid: str = Form(...),
     ch: str = Form(...),
-    admin_wallet: str = Form(...)
+    admin_wallet: str = Form(...),
+    db: Db = Depends(get_db)
 ):
-    db = get_db()
-
     # 1️⃣ Resolve patient wallet
-    row = db.execute(
+    row = db.one(
         "SELECT wallet FROM users WHERE patient_id=? AND role='patient'",
         (patient_id,),
-    ).fetchone()
+    )
 
     if not row:
         raise HTTPException(404, "Patient not found")
@@ -282,19 +321,16 @@ def prepare_record(
     # 2️⃣ Deterministic record_id
     record_id = Web3.keccak(text=cid + patient_wallet).hex()
 
-    # 3️⃣ Build tx (DO NOT EXECUTE)
+    # 3️⃣ Build tx (DO NOT EXECUTE) — no nonce, MetaMask assigns it on signing
     tx_data = store_record(
         patient_wallet,
         record_id,
         ch,
         cid,
-        True
+        True,
+        with_nonce=False,
     )
 
-    # ✅ Remove nonce if exists (MetaMask will handle it)
-    if "nonce" in tx_data:
-        del tx_data["nonce"]
-
     # 4️⃣ Store pending record
     db.execute(
         """
@@ -320,6 +356,60 @@ def prepare_record(
         "record_id": record_id
     }
 
+@router.get("/admin/audit-hashes")
+def audit_hashes(fail_fast: bool = False, db: Db = Depends(get_db)):
+    try:
+        return audit_records(db, fail_fast=fail_fast)
+    except Exception as e:
+        print("AUDIT ERROR:", e)
+        raise HTTPException(502, "Failed to read on-chain records")
+
+@router.post("/admin/onboard-batch")
+async def onboard_batch(
+    manifest: UploadFile,
+    admin_wallet: str = Form(...)
+):
+    """
+    Bulk version of encrypt → ipfs-upload → chameleon-hash → prepare-record.
+    Manifest paths are read from the server-side ONBOARD_ROOT directory;
+    onboarding is disabled until it is set.
+    """
+    try:
+        entries = parse_manifest((await manifest.read()).decode())
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    if not entries:
+        raise HTTPException(400, "Manifest is empty")
+
+    try:
+        job = await run_in_threadpool(OnboardingJob.create, entries, admin_wallet)
+    except ValueError as e:
+        print("ONBOARDING DISABLED:", e)
+        raise HTTPException(503, f"Onboarding is disabled: {e}")
+    job.start()
+
+    return {"job_id": job.id, "total": len(entries)}
+
+@router.get("/admin/onboard-batch/{job_id}")
+def onboard_batch_status(job_id: str):
+    try:
+        return OnboardingJob.load(job_id).progress()
+    except KeyError:
+        raise HTTPException(404, "Job not found")
+
+@router.post("/admin/onboard-batch/{job_id}/resume")
+def onboard_batch_resume(job_id: str):
+    try:
+        job = OnboardingJob.load(job_id)
+    except KeyError:
+        raise HTTPException(404, "Job not found")
+
+    if not job.start():
+        raise HTTPException(409, "Job is already running")
+
+    return job.progress()
+
 @router.post("/redact")
 def redact_ehr(
     file: UploadFile,
@@ -330,26 +420,91 @@ def redact_ehr(
     old_r_hex: str = Form(...),
     record_id: str = Form(...),
     eth_address: str = Form(...),
-    consent_active: bool = Form(...)
+    consent_active: bool = Form(...),
+    db: Db = Depends(get_db)
 ):
-    new_cid = upload_to_ipfs_bytes(file.file.read())
-
     pub = bytes.fromhex(public_key_hex)
     sk = int(private_key_hex, 16)
     old_r = int(old_r_hex, 16)
 
     old_msg = encode_message(old_cid, consent_active, pub)
+    if not verify(old_msg, old_r, pub, c_hash):
+        raise HTTPException(400, "old_r does not open c_hash for old_cid")
+
+    new_cid = upload_to_ipfs_bytes(file.file.read())
     new_msg = encode_message(new_cid, consent_active, pub)
 
     new_r = forge_r(old_r, sk, old_msg, new_msg)
+    if not verify(new_msg, new_r, pub, c_hash):
+        raise HTTPException(400, "Private key does not match public key: forged hash differs")
+
     tx_data = update_record(eth_address, record_id, new_cid, c_hash)
 
+    record_witness(db, record_id, new_cid, new_r, consent_active, int(time.time()))
+    db.commit()
+
     return {
         "new_cid": new_cid,
         "new_r": hex(new_r),
         "tx_data": tx_data
     }
 
+def _parse_json_form(value: str, name: str, kind: type):
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        raise HTTPException(400, f"{name} must be JSON")
+    if not isinstance(parsed, kind):
+        raise HTTPException(400, f"{name} must be a JSON {kind.__name__}")
+    return parsed
+
+@router.post("/admin/redact-batch")
+async def redact_batch(
+    record_ids: str = Form(...),
+    transform: str = Form(...),
+    trapdoors: str = Form(...)
+):
+    """
+    Bulk version of /redact: download → transform → re-encrypt → upload for
+    every record, then batch-forge r and prepare all updateRecord txs.
+    record_ids: JSON list; transform: JSON spec (see redaction.build_transform);
+    trapdoors: JSON {owner wallet: private key hex}, kept in memory only.
+    """
+    ids = _parse_json_form(record_ids, "record_ids", list)
+    spec = _parse_json_form(transform, "transform", dict)
+    keys = _parse_json_form(trapdoors, "trapdoors", dict)
+
+    if not ids:
+        raise HTTPException(400, "record_ids is empty")
+
+    try:
+        job = await run_in_threadpool(RedactionJob.create, ids, spec)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    job.start(keys)
+
+    return {"job_id": job.id, "total": len(ids)}
+
+@router.get("/admin/redact-batch/{job_id}")
+def redact_batch_status(job_id: str):
+    try:
+        return RedactionJob.load(job_id).progress(with_transactions=True)
+    except KeyError:
+        raise HTTPException(404, "Job not found")
+
+@router.post("/admin/redact-batch/{job_id}/resume")
+def redact_batch_resume(job_id: str, trapdoors: str = Form(...)):
+    keys = _parse_json_form(trapdoors, "trapdoors", dict)
+    try:
+        job = RedactionJob.load(job_id)
+    except KeyError:
+        raise HTTPException(404, "Job not found")
+
+    if not job.start(keys):
+        raise HTTPException(409, "Job is already running")
+
+    return job.progress()
+
 # ======================================================
 # ACCESS REQUEST (DOCTOR → PATIENT via EMAIL)
 # ======================================================
@@ -363,15 +518,14 @@ def access_request(
     sig_v: int = Form(...),
     sig_r: str = Form(...),
     sig_s: str = Form(...),
-    ttl: int = Form(...)
+    ttl: int = Form(...),
+    db: Db = Depends(get_db)
 ):
-    db = get_db()
-
     # 1️⃣ Resolve patient wallet from patient_id
-    row = db.execute(
+    row = db.one(
         "SELECT wallet FROM users WHERE patient_id=? AND role='patient'",
         (patient_id,)
-    ).fetchone()
+    )
 
     if not row:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -421,66 +575,108 @@ def access_request(
 # REQUEST LISTING
 # ======================================================
 @router.get("/requests/patient")
-def patient_requests(email: str):
-    db = get_db()
-    wallet = db.execute(
+def patient_requests(email: str, db: Db = Depends(get_db)):
+    wallet = db.one(
         "SELECT wallet FROM users WHERE email=?", (email,)
-    ).fetchone()
+    )
 
     if not wallet:
         raise HTTPException(404, "User not found")
     
-    return {"requests": fetch_access_logs_for_patient(wallet[0])}
+    return {"requests": access_requests_for_patient(db, wallet[0])}
 
 @router.get("/requests/doctor")
-def doctor_requests(wallet: str):
-    db = get_db()
-    logs = fetch_access_logs_for_doctor(wallet)
+def doctor_requests(wallet: str, db: Db = Depends(get_db)):
     now = int(time.time())
     result = []
 
-    for ev in logs:
-        patient_address = Web3.to_checksum_address(ev["args"]["patient"]).lower()
-        print("Patient address from event:", patient_address)
-
-        row = db.execute(
-            "SELECT patient_id FROM users WHERE wallet=? AND role='patient'",
-            (patient_address,)
-        ).fetchone()
-
-        expires_at = int(ev["args"]["expiresAt"])
-        print("Access request expires at:", expires_at, "Current time:", now)
-
+    for provider, patient_address, patient_id, record_id, token, expires_at in \
+            access_requests_for_doctor(db, wallet):
         if expires_at > now:
             status = "approved"
         else:
             status = "expired"
 
         result.append({
-            "doctor_address": ev["args"]["provider"],
+            "doctor_address": Web3.to_checksum_address(provider),
             "patient_address": patient_address,
-            "patient_id": row[0] if row else None,   # ✅ ADD THIS
-            "record_id": "0x" + ev["args"]["recordId"].hex(),
-            "token": "0x" + ev["args"]["token"].hex(),
-            "expiresAt": int(ev["args"]["expiresAt"]),
+            "patient_id": patient_id,
+            "record_id": record_id,
+            "token": token,
+            "expiresAt": expires_at,
             "status": status
         })
 
-    print(result)
     return result
 
 # ======================================================
 # VIEW + CONSENT
 # ======================================================
+def _parse_range(range_header: str, size: int):
+    """
+    Parse a single "bytes=" range against `size` → (start, end) inclusive.
+    Returns None for headers we don't honour (multi-range, other units),
+    meaning "send the whole file"; raises 416 if unsatisfiable.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)              # suffix range: last N bytes
+            start, end = max(size - length, 0), size - 1
+            if length == 0:
+                start = size
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(416, "Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def _range_headers(start: int, end: int, size: int, extra=None):
+    return {
+        **(extra or {}),
+        "Accept-Ranges": "bytes",
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1)
+    }
+
 @router.get("/view/{record_id}")
-def view_ehr(record_id: str, token: str):
+def view_ehr(record_id: str, token: str, range: str | None = Header(None)):
     if not check_token_valid(token):
         raise HTTPException(403, "Token expired")
 
     rec = get_record_by_id(record_id)
-    data = download_from_ipfs(rec["encryptedCid"])
-
-    return StreamingResponse(io.BytesIO(data), media_type="application/pdf")
+    cid = rec["encryptedCid"]
+
+    # Ranged read: fetch + decrypt only the chunks that cover the range
+    bundle = open_ranged(cid) if range else None
+    if bundle is not None:
+        try:
+            span = _parse_range(range, bundle.size)
+        except HTTPException:
+            bundle.close()
+            raise
+        if span is not None:
+            return StreamingResponse(
+                bundle.read(*span),
+                status_code=206,
+                media_type="application/pdf",
+                headers=_range_headers(*span, bundle.size)
+            )
+        bundle.close()
+
+    data = download_from_ipfs_stream(cid)
+
+    return StreamingResponse(data, media_type="application/pdf",
+                             headers={"Accept-Ranges": "bytes"})
 
 @router.post("/toggle-consent")
 def toggle_consent(record_id: str = Form(...), eth_address: str = Form(...), active: bool = Form(...)):
@@ -488,27 +684,53 @@ def toggle_consent(record_id: str = Form(...), eth_address: str = Form(...), act
     return {"tx_data": tx_data}
 
 @router.get("/download/{cid}")
-async def download_ehr(cid: str):
-    decrypted_bytes = download_from_ipfs(cid)
+async def download_ehr(cid: str, range: str | None = Header(None)):
+    disposition = {"Content-Disposition": f'attachment; filename="{cid}.pdf"'}
+
+    try:
+        bundle = await open_ranged_async(cid) if range else None
+    except Exception as e:
+        print("DOWNLOAD ERROR:", e)
+        raise HTTPException(502, "IPFS download failed")
+
+    if bundle is not None:
+        try:
+            span = _parse_range(range, bundle.size)
+        except HTTPException:
+            bundle.close()
+            raise
+        if span is not None:
+            return StreamingResponse(
+                bundle.aread(*span),
+                status_code=206,
+                media_type="application/pdf",
+                headers=_range_headers(*span, bundle.size, disposition)
+            )
+        bundle.close()
+
+    try:
+        decrypted = await download_from_ipfs_stream_async(cid)
+    except Exception as e:
+        print("DOWNLOAD ERROR:", e)
+        raise HTTPException(502, "IPFS download failed")
 
     return StreamingResponse(
-        io.BytesIO(decrypted_bytes),
+        decrypted,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{cid}.pdf"'}
+        headers={**disposition, "Accept-Ranges": "bytes"}
     )
 
 @router.get("/resolve-patient/{patient_id}")
-def resolve_patient(patient_id: str):
-    db = get_db()
+def resolve_patient(patient_id: str, db: Db = Depends(get_db)):
     print("Resolving patient_id:", patient_id)
 
-    row = db.execute(
+    row = db.one(
         """
         SELECT wallet FROM users
         WHERE patient_id=? AND role='patient'
         """,
         (patient_id,)
-    ).fetchone()
+    )
 
     if not row:
         raise HTTPException(404, "Patient not found")
@@ -540,34 +762,48 @@ def resolve_patient(patient_id: str):
 # GET ALL PATIENTS (ADMIN)
 # ======================================================
 @router.get("/patients")
-def get_patients():
-    db = get_db()
-
-    rows = db.execute("""
+def get_patients(db: Db = Depends(get_db)):
+    rows = db.all("""
         SELECT patient_id, wallet
         FROM users
         WHERE role='patient'
-    """).fetchall()
+    """)
+
+    # Batched eth_calls: a fixed number of round trips however many patients
+    try:
+        records = get_records_by_owners([r[1] for r in rows])
+
+        grants = unexpired_access_tokens(db, int(time.time()))
+        valid = check_tokens_valid([token for _, token in grants])
+    except Exception as e:
+        print("PATIENT STATUS ERROR:", e)
+        raise HTTPException(502, "Failed to read on-chain status")
+
+    with_access = {patient for (patient, _), ok in zip(grants, valid) if ok}
 
     patients = []
 
-    for r in rows:
+    for (patient_id, wallet), rec in zip(rows, records):
+        if rec is None:
+            consent = "No record"
+        else:
+            consent = "Enabled" if rec["consent"] else "Disabled"
+
         patients.append({
-            "patient_id": r[0],
-            "consent": "Unknown",
-            "doctor_access": "Unknown"
+            "patient_id": patient_id,
+            "record_id": rec["record_id"] if rec else None,
+            "consent": consent,
+            "doctor_access": "Granted" if wallet.lower() in with_access else "None"
         })
 
     return patients
     
 @router.get("/patient-profile")
-def patient_profile(email: str):
-    db = get_db()
-
-    row = db.execute(
+def patient_profile(email: str, db: Db = Depends(get_db)):
+    row = db.one(
         "SELECT patient_id, wallet FROM users WHERE email=? AND role='patient'",
         (email,)
-    ).fetchone()
+    )
 
     if not row:
         raise HTTPException(404, "Patient not found")
@@ -592,24 +828,22 @@ def patient_profile(email: str):
     }
 
 @router.get("/patient/pending")
-def get_pending_records(email: str):
-    db = get_db()
-
-    row = db.execute(
+def get_pending_records(email: str, db: Db = Depends(get_db)):
+    row = db.one(
         "SELECT patient_id FROM users WHERE email=? AND role='patient'",
         (email,)
-    ).fetchone()
+    )
 
     if not row:
         raise HTTPException(404, "Patient not found")
 
     patient_id = row[0]
 
-    records = db.execute("""
+    records = db.all("""
         SELECT id, admin_wallet, cid, record_id, tx_data
         FROM pending_records
         WHERE patient_id=? AND status='pending'
-    """, (patient_id,)).fetchall()
+    """, (patient_id,))
 
     result = []
 
@@ -626,14 +860,14 @@ def get_pending_records(email: str):
 
 @router.post("/patient/approve-record")
 def approve_record(
-    pending_id: int = Form(...)
+    pending_id: int = Form(...),
+    tx_hash: str = Form(None),
+    db: Db = Depends(get_db)
 ):
-    db = get_db()
-
-    row = db.execute("""
-        SELECT status FROM pending_records
+    row = db.one("""
+        SELECT status, record_id, ch FROM pending_records
         WHERE id=?
-    """, (pending_id,)).fetchone()
+    """, (pending_id,))
 
     if not row:
         raise HTTPException(404, "Pending record not found")
@@ -646,34 +880,16 @@ def approve_record(
         SET status='approved'
         WHERE id=?
     """, (pending_id,))
+    commit_opening(db, row[1], row[2], int(time.time()))
 
     db.commit()
 
-    return {"message": "Marked approved"}
-
-from fastapi.responses import Response
-from ipfs.aes_gcm import decrypt_bytes
-
-@router.get("/download/{cid}")
-async def download_ehr(cid: str):
-
-    try:
-        encrypted_bytes = download_from_ipfs(cid)
-
-        print("Encrypted first bytes:", encrypted_bytes[:20])
-
-        decrypted_bytes = decrypt_bytes(encrypted_bytes)
+    # Optional hash of the mined storeRecord tx: an out-of-gas receipt makes
+    # the next prepare re-estimate instead of reusing the cached limit
+    if tx_hash:
+        try:
+            tx_preparer.check_receipt(tx_hash)
+        except Exception as e:
+            print("Receipt check failed:", e)
 
-        print("Decrypted first bytes:", decrypted_bytes[:20])
-
-        return Response(
-            content=decrypted_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": "inline; filename=ehr.pdf"
-            }
-        )
-
-    except Exception as e:
-        print("DECRYPT ERROR:", e)
-        raise HTTPException(500, "Decryption failed")
+    return {"message": "Marked approved"}
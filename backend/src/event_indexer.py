@@ -0,0 +1,271 @@
+"""
+Incremental indexer for AccessRegistry events.
+
+A background thread follows the chain from the last stored checkpoint and
+writes decoded AccessRequested, RecordStored, RecordUpdated and
+ConsentToggled logs into local tables (see db_init migration 3), so the
+request-listing routes answer from indexed SQLite queries instead of
+scanning the chain from block 0 on every call. Every decoded event,
+IdentityRegistered included, is also passed to chain_cache.on_event().
+
+Reorgs: after every batch the hash of its last block is stored as a
+checkpoint, and the last REORG_DEPTH checkpoints are kept. Each pass first
+compares the newest checkpoint against the chain; on mismatch it walks back
+to the newest checkpoint that still matches, drops everything indexed above
+it and re-indexes from there. INDEXER_CONFIRMATIONS keeps the indexer that
+many blocks behind the head so it does not index blocks that are likely to
+be rolled back; it defaults to 0 because a dev chain such as Ganache only
+mines a block per transaction, and the latest events would otherwise never
+be indexed.
+"""
+
+import os
+import threading
+
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+
+from blockchain_utils import w3, contracts
+from db_pool import Db, pool
+import chain_cache
+
+START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", "0"))
+LOG_BATCH = int(os.getenv("INDEXER_LOG_BATCH", "2000"))       # blocks per eth_getLogs
+REORG_DEPTH = int(os.getenv("INDEXER_REORG_DEPTH", "64"))     # checkpoints kept
+POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", "2"))
+CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "0"))  # blocks behind head
+
+EVENTS = {
+    "AccessRequested": "AccessRequested(address,address,bytes32,bytes32,uint64)",
+    "RecordStored": "RecordStored(bytes32,address)",
+    "RecordUpdated": "RecordUpdated(bytes32,string)",
+    "ConsentToggled": "ConsentToggled(address,bytes32,bool)",
+    "IdentityRegistered": "IdentityRegistered(address,bytes32)",
+}
+
+# topic0 -> event name
+TOPICS = {bytes(Web3.keccak(text=sig)): name for name, sig in EVENTS.items()}
+
+EVENT_TABLES = ("access_requests", "record_events", "consent_events")
+
+
+def _hex(b) -> str:
+    return Web3.to_hex(b)
+
+
+def _addr(a: str) -> str:
+    return Web3.to_checksum_address(a).lower()
+
+
+class EventIndexer:
+    def __init__(self, db_pool=pool, start_block: int = START_BLOCK,
+                 batch: int = LOG_BATCH, reorg_depth: int = REORG_DEPTH,
+                 interval: float = POLL_INTERVAL, confirmations: int = CONFIRMATIONS):
+        self.pool = db_pool
+        self.start_block = start_block
+        self.batch = batch
+        self.reorg_depth = reorg_depth
+        self.interval = interval
+        self.confirmations = confirmations
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------------- decoding ----------------
+    def _store(self, db: Db, log):
+        name = TOPICS.get(bytes(log["topics"][0]))
+        if name is None:
+            return
+        ev = contracts.event(name).process_log(log)
+        args = ev["args"]
+        key = (ev["blockNumber"], ev["logIndex"], _hex(ev["transactionHash"]))
+
+        chain_cache.on_event(name, args)
+
+        if name == "AccessRequested":
+            db.execute(
+                "INSERT OR REPLACE INTO access_requests VALUES (?,?,?,?,?,?,?,?)",
+                key + (
+                    _addr(args["provider"]),
+                    _addr(args["patient"]),
+                    _hex(args["recordId"]),
+                    _hex(args["token"]),
+                    int(args["expiresAt"]),
+                ),
+            )
+        elif name == "RecordStored":
+            db.execute(
+                "INSERT OR REPLACE INTO record_events VALUES (?,?,?,'stored',?,?,NULL)",
+                key + (_hex(args["recordId"]), _addr(args["owner"])),
+            )
+        elif name == "RecordUpdated":
+            db.execute(
+                "INSERT OR REPLACE INTO record_events VALUES (?,?,?,'updated',?,NULL,?)",
+                key + (_hex(args["recordId"]), args["newCid"]),
+            )
+        elif name == "ConsentToggled":
+            db.execute(
+                "INSERT OR REPLACE INTO consent_events VALUES (?,?,?,?,?,?)",
+                key + (
+                    _addr(args["patient"]),
+                    _hex(args["recordId"]),
+                    int(bool(args["active"])),
+                ),
+            )
+
+    # ---------------- reorg handling ----------------
+    def _chain_hash(self, number: int):
+        try:
+            return _hex(w3.eth.get_block(number)["hash"])
+        except BlockNotFound:
+            return None
+
+    def _rollback(self, db: Db, above: int):
+        with db.transaction():
+            for table in EVENT_TABLES:
+                db.execute(f"DELETE FROM {table} WHERE block_number > ?", (above,))
+            db.execute("DELETE FROM indexed_blocks WHERE number > ?", (above,))
+        # Cached reads may reflect the orphaned blocks
+        chain_cache.clear_all()
+
+    def _rewind(self, db: Db) -> int:
+        """
+        Return the last indexed block that is still on the canonical chain,
+        rolling back anything indexed above it.
+        """
+        checkpoints = db.all("SELECT number, hash FROM indexed_blocks ORDER BY number DESC")
+
+        for i, (number, block_hash) in enumerate(checkpoints):
+            if self._chain_hash(number) == block_hash:
+                if i:
+                    print(f"Reorg detected: rolling event index back to block {number}")
+                    self._rollback(db, number)
+                return number
+
+        if checkpoints:
+            # Deeper than REORG_DEPTH, or the chain was reset (e.g. Ganache restart)
+            print("Event index no longer matches the chain: re-indexing from scratch")
+            self._rollback(db, -1)
+
+        return self.start_block - 1
+
+    # ---------------- sync ----------------
+    def sync(self) -> int:
+        """
+        Index everything up to `confirmations` blocks behind the head.
+        Returns the last block indexed.
+        """
+        address = contracts.contract().address
+        head = w3.eth.block_number - self.confirmations
+        topics = [[Web3.to_hex(topic) for topic in TOPICS]]
+
+        with self.pool.connection() as db:
+            cursor = self._rewind(db)
+
+            while cursor < head:
+                to_block = min(cursor + self.batch, head)
+
+                # Read the hash before the logs: if the chain reorgs in between,
+                # the stored hash is stale and the next pass rolls this batch back.
+                block_hash = self._chain_hash(to_block)
+                if block_hash is None:
+                    # The node no longer has this block (reorg or reset in
+                    # progress); leave the batch for the next pass
+                    break
+                logs = w3.eth.get_logs({
+                    "address": address,
+                    "fromBlock": cursor + 1,
+                    "toBlock": to_block,
+                    "topics": topics,
+                })
+
+                with db.transaction():
+                    for log in logs:
+                        self._store(db, log)
+                    db.execute(
+                        "INSERT OR REPLACE INTO indexed_blocks VALUES (?,?)",
+                        (to_block, block_hash),
+                    )
+                    db.execute(
+                        """
+                        DELETE FROM indexed_blocks WHERE number NOT IN (
+                            SELECT number FROM indexed_blocks
+                            ORDER BY number DESC LIMIT ?
+                        )
+                        """,
+                        (self.reorg_depth,),
+                    )
+
+                cursor = to_block
+
+        return cursor
+
+    # ---------------- background thread ----------------
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print("Event indexer error:", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def status(self, db: Db) -> dict:
+        row = db.one("SELECT MAX(number) FROM indexed_blocks")
+        return {"indexed_block": row[0], "running": bool(self._thread and self._thread.is_alive())}
+
+
+indexer = EventIndexer()
+
+
+# ======================================================
+# QUERIES
+# ======================================================
+def access_requests_for_patient(db: Db, patient: str) -> list:
+    rows = db.all("""
+        SELECT provider, patient, record_id, token, expires_at
+        FROM access_requests
+        WHERE patient=?
+        ORDER BY block_number, log_index
+    """, (_addr(patient),))
+
+    return [
+        {
+            "doctor_address": Web3.to_checksum_address(provider),
+            "patient_address": Web3.to_checksum_address(patient_addr),
+            "record_id": record_id,
+            "token": token,
+            "expiresAt": expires_at,
+        }
+        for provider, patient_addr, record_id, token, expires_at in rows
+    ]
+
+
+def access_requests_for_doctor(db: Db, doctor: str) -> list:
+    """Access requests made by `doctor`, joined with the patient's patient_id."""
+    return db.all("""
+        SELECT a.provider, a.patient, u.patient_id, a.record_id, a.token, a.expires_at
+        FROM access_requests a
+        LEFT JOIN users u ON u.wallet = a.patient AND u.role = 'patient'
+        WHERE a.provider=?
+        ORDER BY a.block_number, a.log_index
+    """, (_addr(doctor),))
+
+
+def unexpired_access_tokens(db: Db, now: int) -> list:
+    """(patient, token) for every access grant whose expiry is still ahead."""
+    return db.all("""
+        SELECT patient, token FROM access_requests WHERE expires_at > ?
+    """, (now,))
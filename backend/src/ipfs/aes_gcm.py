@@ -1,26 +1,83 @@
 # backend/src/ipfs/aes_gcm.py
 
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from hashlib import sha256
 import os
-from dotenv import load_dotenv
+import struct
 
-load_dotenv()
+from .key_manager import get_keyring, DEFAULT_KID, KDF_SHA256
 
-# Optional: default password from ENV
-DEFAULT_PASSWORD = os.environ.get("FILE_ENCRYPT_PASSWORD")
+# Segmented container format (STREAM construction):
+#
+#   header  = MAGIC(4) | VERSION(1) | kdf(1) | kid_len(1) | chunk_size(4, big-endian)
+#             | nonce_prefix(7) | kid(kid_len)
+#   body    = chunk_0 | chunk_1 | ... | chunk_n     (each chunk = ciphertext + 16-byte tag)
+#
+# Chunk i is sealed with nonce = nonce_prefix | i (4 bytes) | final flag (1 byte)
+# and the header as associated data, so reordering, truncation and
+# header tampering all fail authentication. The key id names the key-ring
+# entry the bundle was sealed with ("" = caller-supplied password).
+#
+# Version 1 headers (no kdf / kid fields, SHA-256 key of the default
+# password) are still accepted for decryption.
+STREAM_MAGIC = b"EHRS"
+STREAM_VERSION = 2
+STREAM_HEADER = struct.Struct(">4sBBBI7s")
+STREAM_HEADER_V1 = struct.Struct(">4sBI7s")
+STREAM_HEADER_SIZE = STREAM_HEADER.size          # 18 bytes + key id
+NONCE_PREFIX_SIZE = 7
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNKS = 2 ** 32
+MAX_KID_LEN = 255
 
 
-def _derive_key(password: str = "") -> bytes:
+def _chunk_nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    if index >= MAX_CHUNKS:
+        raise Exception("Stream too long for a single nonce prefix")
+    return prefix + struct.pack(">I", index) + (b"\x01" if final else b"\x00")
+
+
+def is_stream_bundle(head: bytes) -> bool:
     """
-    Derive 32-byte AES key using SHA-256.
-    If no password is supplied, fallback to ENV password.
+    True if `head` (at least the first 5 bytes of a bundle) starts a
+    segmented stream container rather than a legacy nonce + ciphertext blob.
     """
-    pwd = password or DEFAULT_PASSWORD
-    if pwd is None:
-        raise Exception("No AES password provided")
+    return head[:4] == STREAM_MAGIC and head[4:5] in (b"\x01", b"\x02")
+
 
-    return sha256(str(pwd).encode()).digest()   # 32 bytes → AES-256
+def header_size(head: bytes) -> int:
+    """
+    Total header length given at least its fixed part, or 0 if more
+    bytes are needed to tell.
+    """
+    if head[4:5] == b"\x01":
+        return STREAM_HEADER_V1.size
+    if len(head) < STREAM_HEADER_SIZE:
+        return 0
+    return STREAM_HEADER_SIZE + head[6]
+
+
+def parse_header(header: bytes, password: str = ""):
+    """
+    Parse a full stream header → (chunk_size, nonce_prefix, AESGCM).
+    The cipher comes from the process-wide key ring, so no key derivation
+    happens here after the first use of a key.
+    """
+    ring = get_keyring()
+    if header[4:5] == b"\x01":
+        _, _, chunk_size, prefix = STREAM_HEADER_V1.unpack(header)
+        aesgcm = ring.cipher(DEFAULT_KID, KDF_SHA256, password)
+    else:
+        magic, version, kdf, kid_len, chunk_size, prefix = STREAM_HEADER.unpack(
+            header[:STREAM_HEADER_SIZE]
+        )
+        if magic != STREAM_MAGIC or version != STREAM_VERSION:
+            raise Exception("Not an EHR stream bundle")
+        kid = header[STREAM_HEADER_SIZE:STREAM_HEADER_SIZE + kid_len].decode()
+        aesgcm = ring.cipher(kid, kdf, password)
+
+    if chunk_size <= 0:
+        raise Exception("Invalid chunk size in stream header")
+    return chunk_size, prefix, aesgcm
 
 
 #######################################################################
@@ -29,15 +86,9 @@ def _derive_key(password: str = "") -> bytes:
 def encrypt_bytes(plaintext: bytes, password: str = "") -> bytes:
     """
     Encrypt bytes with AES-GCM.
-    Returns nonce + ciphertext
+    Returns a segmented stream bundle (header + sealed chunks).
     """
-    key = _derive_key(password)
-    aesgcm = AESGCM(key)
-
-    nonce = os.urandom(12)
-    ciphertext = aesgcm.encrypt(nonce, plaintext, None)
-
-    return nonce + ciphertext
+    return b"".join(encrypt_stream([plaintext], password))
 
 
 #######################################################################
@@ -45,13 +96,268 @@ def encrypt_bytes(plaintext: bytes, password: str = "") -> bytes:
 #######################################################################
 def decrypt_bytes(bundle: bytes, password: str = "") -> bytes:
     """
-    Decrypt nonce + ciphertext → plaintext
+    Decrypt a stream bundle or a legacy nonce + ciphertext blob → plaintext
     """
-    key = _derive_key(password)
-    aesgcm = AESGCM(key)
+    if not is_stream_bundle(bundle):
+        return _decrypt_legacy(bundle, password)
+
+    return b"".join(decrypt_stream([bundle], password))
+
+
+def _decrypt_legacy(bundle: bytes, password: str = "") -> bytes:
+    aesgcm = get_keyring().cipher(DEFAULT_KID, KDF_SHA256, password)
 
     nonce = bundle[:12]
     ciphertext = bundle[12:]
 
-    plaintext = aesgcm.decrypt(nonce, ciphertext, None)
-    return plaintext
+    return aesgcm.decrypt(nonce, ciphertext, None)
+
+
+#######################################################################
+# ✅ Streaming encryption / decryption
+#######################################################################
+class StreamEncryptor:
+    """
+    Push-style encryptor: feed() plaintext of any size, collect sealed
+    segments; finish() seals the final chunk. Shared by the sync and
+    async stream helpers.
+    """
+
+    def __init__(self, password: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE):
+        kid, kdf, self.aesgcm = get_keyring().active(password)
+        kid_bytes = kid.encode()
+        if len(kid_bytes) > MAX_KID_LEN:
+            raise Exception("Key id too long")
+
+        self.chunk_size = chunk_size
+        self.prefix = os.urandom(NONCE_PREFIX_SIZE)
+        self.header = STREAM_HEADER.pack(
+            STREAM_MAGIC, STREAM_VERSION, kdf, len(kid_bytes), chunk_size, self.prefix
+        ) + kid_bytes
+        self.buf = bytearray()
+        self.index = 0
+
+    def feed(self, data: bytes) -> list:
+        self.buf += data
+        out = []
+        # Only seal a chunk as non-final once we know more data follows it
+        while len(self.buf) > self.chunk_size:
+            nonce = _chunk_nonce(self.prefix, self.index, False)
+            out.append(self.aesgcm.encrypt(nonce, bytes(self.buf[:self.chunk_size]), self.header))
+            del self.buf[:self.chunk_size]
+            self.index += 1
+        return out
+
+    def finish(self) -> bytes:
+        nonce = _chunk_nonce(self.prefix, self.index, True)
+        final = self.aesgcm.encrypt(nonce, bytes(self.buf), self.header)
+        self.buf.clear()
+        return final
+
+
+class StreamDecryptor:
+    """
+    Push-style decryptor: feed() bundle bytes of any size, collect
+    plaintext; finish() opens the final chunk (and fails on truncation).
+    Legacy single-blob bundles are buffered and decrypted in finish().
+    """
+
+    def __init__(self, password: str = ""):
+        self.password = password
+        self.buf = bytearray()
+        self.legacy = None          # undecided until the header is seen
+        self.header = None
+        self.index = 0
+
+    def _read_header(self) -> bool:
+        if len(self.buf) < 5:
+            return False
+        if not is_stream_bundle(bytes(self.buf[:5])):
+            self.legacy = True
+            return True
+        size = header_size(bytes(self.buf[:STREAM_HEADER_SIZE]))
+        if not size or len(self.buf) < size:
+            return False
+
+        self.header = bytes(self.buf[:size])
+        self.chunk_size, self.prefix, self.aesgcm = parse_header(self.header, self.password)
+        self.segment = self.chunk_size + TAG_SIZE
+        self.legacy = False
+        del self.buf[:size]
+        return True
+
+    def feed(self, data: bytes) -> list:
+        self.buf += data
+        if self.legacy is None and not self._read_header():
+            return []
+        if self.legacy:
+            return []
+
+        out = []
+        while len(self.buf) > self.segment:
+            nonce = _chunk_nonce(self.prefix, self.index, False)
+            out.append(self.aesgcm.decrypt(nonce, bytes(self.buf[:self.segment]), self.header))
+            del self.buf[:self.segment]
+            self.index += 1
+        return out
+
+    def finish(self) -> bytes:
+        if self.legacy is None:
+            self._read_header()
+        if self.legacy is None:
+            raise Exception("Truncated stream header")
+        if self.legacy:
+            return _decrypt_legacy(bytes(self.buf), self.password)
+
+        if len(self.buf) < TAG_SIZE:
+            raise Exception("Truncated stream bundle")
+        nonce = _chunk_nonce(self.prefix, self.index, True)
+        return self.aesgcm.decrypt(nonce, bytes(self.buf), self.header)
+
+
+class StreamLayout:
+    """
+    Random-access view of a stream bundle of known total size. Maps
+    plaintext byte ranges onto the sealed chunks that cover them, so a
+    range read only fetches and opens those chunks.
+    """
+
+    def __init__(self, header: bytes, total_size: int, password: str = ""):
+        self.header = header
+        self.header_size = len(header)
+        self.total_size = total_size
+        self.chunk_size, self.prefix, self.aesgcm = parse_header(header, password)
+        self.segment = self.chunk_size + TAG_SIZE
+
+        body = total_size - self.header_size
+        if body < TAG_SIZE:
+            raise Exception("Truncated stream bundle")
+        self.chunks = -(-body // self.segment)
+        self.plaintext_size = body - TAG_SIZE * self.chunks
+
+    @classmethod
+    def from_head(cls, head: bytes, total_size: int, password: str = ""):
+        """Build from the first bytes of a bundle; None for legacy blobs."""
+        if not is_stream_bundle(head[:5]):
+            return None
+        size = header_size(head[:STREAM_HEADER_SIZE])
+        if not size or len(head) < size:
+            raise Exception("Truncated stream header")
+        return cls(head[:size], total_size, password)
+
+    def encrypted_range(self, start: int, end: int):
+        """Inclusive plaintext range → inclusive byte range of its chunks."""
+        first = start // self.chunk_size
+        last = min(end // self.chunk_size, self.chunks - 1)
+        enc_start = self.header_size + first * self.segment
+        enc_end = min(self.header_size + (last + 1) * self.segment, self.total_size) - 1
+        return enc_start, enc_end
+
+    def decrypt_range(self, segments, start: int, end: int):
+        """
+        Decrypt the chunks covering plaintext [start, end] from `segments`
+        (the bytes of encrypted_range(start, end), in any chunking) and
+        yield exactly the requested plaintext.
+        """
+        dec = RangeDecryptor(self, start, end)
+        for data in segments:
+            yield from dec.feed(data)
+        dec.finish()
+
+
+class RangeDecryptor:
+    """Push-style decryptor for one plaintext range of a StreamLayout."""
+
+    def __init__(self, layout: StreamLayout, start: int, end: int):
+        self.layout = layout
+        self.start = start
+        self.end = end
+        self.index = start // layout.chunk_size
+        self.last = min(end // layout.chunk_size, layout.chunks - 1)
+        self.final_len = (layout.total_size - layout.header_size
+                          - (layout.chunks - 1) * layout.segment)
+        self.buf = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        L = self.layout
+        self.buf += data
+        out = []
+        while self.index <= self.last:
+            final = self.index == L.chunks - 1
+            need = self.final_len if final else L.segment
+            if len(self.buf) < need:
+                break
+            nonce = _chunk_nonce(L.prefix, self.index, final)
+            plain = L.aesgcm.decrypt(nonce, bytes(self.buf[:need]), L.header)
+            del self.buf[:need]
+
+            offset = self.index * L.chunk_size
+            out.append(plain[max(self.start - offset, 0):self.end - offset + 1])
+            self.index += 1
+        return out
+
+    def finish(self):
+        if self.index <= self.last:
+            raise Exception("Truncated stream bundle")
+
+
+def encrypt_stream(chunks, password: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Encrypt an iterable of plaintext byte chunks (any sizes).
+    Yields the stream header followed by one sealed segment per
+    `chunk_size` bytes of plaintext. Memory use is bounded by ~2 chunks.
+    """
+    enc = StreamEncryptor(password, chunk_size)
+    yield enc.header
+    for data in chunks:
+        yield from enc.feed(data)
+    yield enc.finish()
+
+
+def decrypt_stream(chunks, password: str = ""):
+    """
+    Decrypt an iterable of bundle byte chunks (any sizes).
+    Yields plaintext chunk by chunk. Legacy single-blob bundles are
+    buffered and decrypted in one go.
+    """
+    dec = StreamDecryptor(password)
+    for data in chunks:
+        yield from dec.feed(data)
+    yield dec.finish()
+
+
+async def encrypt_stream_async(chunks, password: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Async-iterable counterpart of encrypt_stream()."""
+    enc = StreamEncryptor(password, chunk_size)
+    yield enc.header
+    async for data in chunks:
+        for sealed in enc.feed(data):
+            yield sealed
+    yield enc.finish()
+
+
+async def decrypt_stream_async(chunks, password: str = ""):
+    """Async-iterable counterpart of decrypt_stream()."""
+    dec = StreamDecryptor(password)
+    async for data in chunks:
+        for plain in dec.feed(data):
+            yield plain
+    yield dec.finish()
+
+
+def iter_file(fileobj, size: int = DEFAULT_CHUNK_SIZE):
+    """Yield `size`-byte reads from a binary file object until EOF."""
+    while True:
+        data = fileobj.read(size)
+        if not data:
+            break
+        yield data
+
+
+async def aiter_upload(upload, size: int = DEFAULT_CHUNK_SIZE):
+    """Yield `size`-byte reads from a Starlette UploadFile until EOF."""
+    while True:
+        data = await upload.read(size)
+        if not data:
+            break
+        yield data
@@ -0,0 +1,215 @@
+# backend/src/ipfs/cid_cache.py
+#
+# Size-bounded on-disk cache of IPFS payloads keyed by CID. CIDs are
+# immutable, so an entry never goes stale; it only leaves the cache by
+# LRU or TTL eviction. Entries are the bundles exactly as fetched from
+# the gateway, i.e. still AES-GCM encrypted at rest, and are read back
+# through mmap so warm views never touch the gateway.
+
+import mmap
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from hashlib import sha256
+
+from dotenv import load_dotenv
+
+from .aes_gcm import DEFAULT_CHUNK_SIZE
+
+load_dotenv()
+
+# Default is backend/src/ipfs_cache whatever the working directory
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get("IPFS_CACHE_DIR", os.path.join(_SRC_DIR, "ipfs_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("IPFS_CACHE_MAX_BYTES", str(1024 ** 3)))   # 1 GiB
+CACHE_TTL = int(os.environ.get("IPFS_CACHE_TTL", str(7 * 24 * 3600)))           # 7 days
+
+
+class CidCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key → (size, stored_at); ordered least → most recently used
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "stores": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def _key(cid: str) -> str:
+        # CIDs come from URLs — never use them as file names directly
+        return sha256(cid.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load_index(self):
+        """Rebuild the LRU index from disk, oldest access first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.endswith(".tmp"):
+                os.remove(path)     # leftover from an interrupted fill
+                continue
+            st = os.stat(path)
+            entries.append((st.st_atime, name, st.st_size, st.st_mtime))
+
+        for _, name, size, mtime in sorted(entries):
+            self._index[name] = (size, mtime)
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    # --------------------------------------------------------
+    # Eviction
+    # --------------------------------------------------------
+    def _drop_locked(self, key: str):
+        size, _ = self._index.pop(key)
+        self._bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict_locked(self):
+        now = time.time()
+        for key, (_, stored_at) in list(self._index.items()):
+            if now - stored_at > self.ttl:
+                self._drop_locked(key)
+                self._counters["expired"] += 1
+
+        while self._bytes > self.max_bytes and self._index:
+            self._drop_locked(next(iter(self._index)))
+            self._counters["evictions"] += 1
+
+    # --------------------------------------------------------
+    # Read path
+    # --------------------------------------------------------
+    def _open_file(self, cid: str):
+        key = self._key(cid)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl:
+                self._drop_locked(key)
+                self._counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+
+            try:
+                f = open(self._path(key), "rb")
+            except FileNotFoundError:
+                self._index.pop(key)
+                self._bytes -= entry[0]
+                self._counters["misses"] += 1
+                return None
+
+            self._index.move_to_end(key)
+            self._counters["hits"] += 1
+            # Persist recency for the next index rebuild; keep mtime = stored_at
+            os.utime(self._path(key), (time.time(), entry[1]))
+        return f
+
+    def open(self, cid: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Return an iterator of cached bytes for `cid` (served from an mmap),
+        or None on a miss.
+        """
+        f = self._open_file(cid)
+        if f is None:
+            return None
+        return self._iter_mmap(f, chunk_size)
+
+    def open_mapped(self, cid: str):
+        """Return a read-only mmap of the entry (caller closes it), or None."""
+        f = self._open_file(cid)
+        if f is None:
+            return None
+        with f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _iter_mmap(f, chunk_size):
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for off in range(0, len(mm), chunk_size):
+                yield mm[off:off + chunk_size]
+
+    def __contains__(self, cid: str) -> bool:
+        with self._lock:
+            return self._key(cid) in self._index
+
+    # --------------------------------------------------------
+    # Write path
+    # --------------------------------------------------------
+    def writer(self, cid: str):
+        """
+        Context manager that fills the entry for `cid`. Bytes go to a temp
+        file which is committed on a clean exit and discarded if the block
+        raises (e.g. decryption failed or the client went away), so partial
+        or corrupt payloads never become cache hits.
+        """
+        return _CacheWriter(self, cid)
+
+    def _commit(self, key: str, tmp: str):
+        size = os.path.getsize(tmp)
+        if size > self.max_bytes:
+            os.remove(tmp)
+            return
+
+        with self._lock:
+            if key in self._index:
+                self._drop_locked(key)
+            os.replace(tmp, self._path(key))
+            self._index[key] = (size, time.time())
+            self._bytes += size
+            self._counters["stores"] += 1
+            self._evict_locked()
+
+    def put(self, cid: str, data: bytes):
+        with self.writer(cid) as w:
+            w.write(data)
+
+    # --------------------------------------------------------
+    # Metrics
+    # --------------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class _CacheWriter:
+    def __init__(self, cache: CidCache, cid: str):
+        self.cache = cache
+        self.key = cache._key(cid)
+        self.tmp = cache._path(f"{self.key}.{uuid.uuid4().hex}.tmp")
+        self.f = None
+
+    def __enter__(self):
+        self.f = open(self.tmp, "wb")
+        return self
+
+    def write(self, data: bytes):
+        self.f.write(data)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.f.close()
+        if exc_type is None:
+            self.cache._commit(self.key, self.tmp)
+        else:
+            try:
+                os.remove(self.tmp)
+            except FileNotFoundError:
+                pass
+        return False
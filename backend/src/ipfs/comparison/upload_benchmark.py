@@ -0,0 +1,120 @@
+"""
+Parallel DAG upload vs single /add upload against a local mock IPFS API.
+
+The mock daemon charges a fixed per-request latency plus a per-byte
+ingest cost, which is roughly how a real daemon behind a network link
+behaves, so serial upload time grows with size while the block uploader
+scales with the worker count.
+
+Usage (from the repo root):
+    python backend/src/ipfs/comparison/upload_benchmark.py [size_mb]
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from hashlib import sha256
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ipfs.ipfs_helper import IpfsClient                      # noqa: E402
+from ipfs.dag_upload import DagUploader, cid_bytes, cid_str  # noqa: E402
+
+OUT_DIR = Path(__file__).resolve().parent / "results"
+SIZE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+WORKERS = [1, 2, 4, 8, 16]
+
+REQUEST_LATENCY = 0.005            # 5 ms per request
+INGEST_BYTES_PER_S = 200 * 1024 ** 2   # 200 MB/s per connection
+CODECS = {"raw": 0x55, "dag-pb": 0x70}
+
+
+class MockIpfs(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024            # one write per response (avoids Nagle stalls)
+
+    def log_message(self, *args):
+        pass
+
+    def _multipart_file(self) -> bytes:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        return body.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n--", 1)[0]
+
+    def _reply(self, obj):
+        out = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.endswith("/pin/add"):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            return self._reply({"Pins": query["arg"]})
+
+        data = self._multipart_file()
+        time.sleep(REQUEST_LATENCY + len(data) / INGEST_BYTES_PER_S)
+
+        if url.path.endswith("/block/put"):
+            codec = CODECS[query["cid-codec"][0]]
+            return self._reply({"Key": cid_str(cid_bytes(codec, data)), "Size": len(data)})
+        return self._reply({"Hash": "Qm" + sha256(data).hexdigest()[:44]})
+
+
+def _chunks(total: int, size: int = 1024 * 1024):
+    block = os.urandom(size)
+    sent = 0
+    while sent < total:
+        n = min(size, total - sent)
+        yield block[:n]
+        sent += n
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockIpfs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = f"http://127.0.0.1:{server.server_address[1]}/api/v0"
+    total = SIZE_MB * 1024 * 1024
+    results = []
+
+    print(f"Uploading {SIZE_MB} MB to mock IPFS at {api}")
+
+    client = IpfsClient(api_url=api, pool_size=max(WORKERS), deadline=3600, attempt_timeout=600)
+    start = time.perf_counter()
+    client.add(b"".join(_chunks(total)))
+    elapsed = time.perf_counter() - start
+    results.append({"Mode": "single /add", "Workers": 1,
+                    "Time (s)": round(elapsed, 3), "Throughput (MB/s)": round(SIZE_MB / elapsed, 2)})
+    print(f"  single /add         {elapsed:8.2f}s  {SIZE_MB / elapsed:8.2f} MB/s")
+
+    for workers in WORKERS:
+        client = IpfsClient(api_url=api, pool_size=workers, deadline=3600)
+        start = time.perf_counter()
+        DagUploader(client, workers=workers).upload(_chunks(total))
+        elapsed = time.perf_counter() - start
+        results.append({"Mode": "block DAG", "Workers": workers,
+                        "Time (s)": round(elapsed, 3), "Throughput (MB/s)": round(SIZE_MB / elapsed, 2)})
+        print(f"  block DAG  x{workers:<3}     {elapsed:8.2f}s  {SIZE_MB / elapsed:8.2f} MB/s")
+
+    server.shutdown()
+
+    OUT_DIR.mkdir(exist_ok=True)
+    csv_path = OUT_DIR / "upload_scaling.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Upload benchmark complete. Results saved to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# backend/src/ipfs/dag_upload.py
+#
+# Parallel block upload for large payloads. The byte stream is cut into
+# fixed-size raw leaf blocks which are pushed to the daemon concurrently
+# with /block/put; a balanced UnixFS (dag-pb) tree over those leaves is
+# built locally and its root is put and pinned last. Every block is also
+# pinned as it is put, so a GC run before the root pin cannot collect it.
+# This is the layout `ipfs add --raw-leaves --cid-version=1` produces, so
+# the gateway serves the root CID like any other file.
+
+import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from hashlib import sha256
+
+BLOCK_SIZE = 256 * 1024
+MAX_LINKS = 174                     # go-ipfs balanced layout fan-out
+UPLOAD_WORKERS = int(os.environ.get("IPFS_UPLOAD_WORKERS", "8"))
+
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+SHA2_256 = 0x12
+
+
+# ------------------------------------------------------------
+# Encoding helpers (CIDv1, protobuf, dag-pb, UnixFS)
+# ------------------------------------------------------------
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _pb_bytes(field: int, data: bytes) -> bytes:
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+
+def _pb_uint(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+
+def cid_bytes(codec: int, block: bytes) -> bytes:
+    """Binary CIDv1 with a sha2-256 multihash."""
+    return _varint(1) + _varint(codec) + bytes([SHA2_256, 32]) + sha256(block).digest()
+
+
+def cid_str(cid: bytes) -> str:
+    """Multibase base32 (lowercase, unpadded) string form of a binary CID."""
+    return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+
+def _unixfs_file(filesize: int, blocksizes) -> bytes:
+    data = _pb_uint(1, 2) + _pb_uint(3, filesize)       # Type = File
+    for size in blocksizes:
+        data += _pb_uint(4, size)
+    return data
+
+
+def _dag_pb_node(links, data: bytes) -> bytes:
+    """links: [(cid_bytes, tsize)] — dag-pb encodes Links before Data."""
+    out = b""
+    for cid, tsize in links:
+        out += _pb_bytes(2, _pb_bytes(1, cid) + _pb_bytes(2, b"") + _pb_uint(3, tsize))
+    return out + _pb_bytes(1, data)
+
+
+class _Node:
+    """A finished child: its CID, cumulative tree size and file bytes covered."""
+    __slots__ = ("cid", "tsize", "filesize")
+
+    def __init__(self, cid, tsize, filesize):
+        self.cid = cid
+        self.tsize = tsize
+        self.filesize = filesize
+
+
+def build_parent(children):
+    """Return (block, _Node) for a UnixFS file node over `children`."""
+    block = _dag_pb_node(
+        [(c.cid, c.tsize) for c in children],
+        _unixfs_file(sum(c.filesize for c in children), [c.filesize for c in children]),
+    )
+    node = _Node(cid_bytes(CODEC_DAG_PB, block),
+                 len(block) + sum(c.tsize for c in children),
+                 sum(c.filesize for c in children))
+    return block, node
+
+
+# ------------------------------------------------------------
+# Uploader
+# ------------------------------------------------------------
+def _blocks(chunks, block_size):
+    buf = bytearray()
+    for data in chunks:
+        buf += data
+        while len(buf) >= block_size:
+            yield bytes(buf[:block_size])
+            del buf[:block_size]
+    if buf:
+        yield bytes(buf)
+
+
+class DagUploader:
+    """
+    Upload an iterable of byte chunks as a UnixFS DAG.
+
+    At most `workers * 2` leaf blocks are buffered at once, so memory stays
+    flat regardless of file size while `workers` block/put requests run
+    in parallel over the client's keep-alive pool.
+    """
+
+    def __init__(self, client, workers=UPLOAD_WORKERS, block_size=BLOCK_SIZE):
+        self.client = client
+        self.workers = workers
+        self.block_size = block_size
+        self.bytes_uploaded = 0
+        self.pin = True
+        self._lock = threading.Lock()
+
+    def _put(self, block: bytes, codec: int, expected: bytes):
+        key = self.client.block_put(block, "raw" if codec == CODEC_RAW else "dag-pb", pin=self.pin)
+        if key != cid_str(expected):
+            raise Exception(f"IPFS block CID mismatch: expected {cid_str(expected)}, got {key}")
+        with self._lock:
+            self.bytes_uploaded += len(block)
+
+    def upload(self, chunks, pin=True) -> str:
+        self.pin = pin
+        leaves = []
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for block in _blocks(chunks, self.block_size):
+                cid = cid_bytes(CODEC_RAW, block)
+                leaves.append(_Node(cid, len(block), len(block)))
+                pending.add(pool.submit(self._put, block, CODEC_RAW, cid))
+
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        fut.result()
+
+            if not leaves:
+                # Empty file: a single empty raw block
+                cid = cid_bytes(CODEC_RAW, b"")
+                leaves.append(_Node(cid, 0, 0))
+                pending.add(pool.submit(self._put, b"", CODEC_RAW, cid))
+
+            for fut in pending:
+                fut.result()
+
+            # Build the balanced tree bottom-up; intermediate levels are tiny
+            level = leaves
+            while len(level) > 1:
+                parents = []
+                futures = []
+                for i in range(0, len(level), MAX_LINKS):
+                    block, node = build_parent(level[i:i + MAX_LINKS])
+                    parents.append(node)
+                    futures.append(pool.submit(self._put, block, CODEC_DAG_PB, node.cid))
+                for fut in futures:
+                    fut.result()
+                level = parents
+
+        root = cid_str(level[0].cid)
+        if pin:
+            self.client.pin(root)
+        return root
@@ -1,34 +1,625 @@
 # backend/src/ipfs/ipfs_helper.py
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+
+import httpx
 import requests
-from .aes_gcm import encrypt_bytes, decrypt_bytes   # updated AES helpers (see below)
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
 
+from .aes_gcm import (
+    encrypt_bytes, decrypt_bytes, decrypt_stream, StreamDecryptor, StreamLayout, RangeDecryptor,
+    DEFAULT_CHUNK_SIZE, STREAM_HEADER_SIZE, MAX_KID_LEN
+)
+from .cid_cache import CidCache
+from .dag_upload import DagUploader, UPLOAD_WORKERS
 
-def upload_to_ipfs_bytes(raw_bytes: bytes, ipfs_api="http://127.0.0.1:5001/api/v0/add") -> str:
-    files = {
-        "file": ("file.bin", raw_bytes)
-    }
+load_dotenv()
 
-    resp = requests.post(ipfs_api, files=files, timeout=60)
+IPFS_API_URL = os.environ.get("IPFS_API_URL", "http://127.0.0.1:5001/api/v0")
+IPFS_GATEWAY_URL = os.environ.get("IPFS_GATEWAY_URL", "http://127.0.0.1:8080/ipfs/")
+
+# Payloads above this go through the parallel block/DAG uploader; 0 (the
+# default) keeps everything on /add, which was faster than the DAG path at
+# every worker count in ipfs/comparison/upload_benchmark.py. Opt in only
+# where a benchmark against the real daemon shows a win.
+DAG_UPLOAD_THRESHOLD = int(os.environ.get("IPFS_DAG_UPLOAD_THRESHOLD", "0"))
+
+# Enough leading bytes to hold any stream header
+PROBE_SIZE = STREAM_HEADER_SIZE + MAX_KID_LEN
+
+# Status codes worth retrying — the daemon/gateway is busy or restarting
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def use_dag_upload(size) -> bool:
+    """Whether a payload of `size` bytes (None if unknown) goes through DagUploader."""
+    return DAG_UPLOAD_THRESHOLD > 0 and (size is None or size > DAG_UPLOAD_THRESHOLD)
+
+
+def _total_size(status, headers):
+    """Full object size from a (possibly ranged) gateway response."""
+    if status == 206:
+        content_range = headers.get("Content-Range", "")
+        total = content_range.rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _slice(chunks, skip: int, length: int):
+    try:
+        for data in chunks:
+            if skip >= len(data):
+                skip -= len(data)
+                continue
+            data = data[skip:skip + length]
+            skip = 0
+            length -= len(data)
+            yield data
+            if length <= 0:
+                return
+    finally:
+        chunks.close()
+
+
+async def _aslice(chunks, skip: int, length: int):
+    try:
+        async for data in chunks:
+            if skip >= len(data):
+                skip -= len(data)
+                continue
+            data = data[skip:skip + length]
+            skip = 0
+            length -= len(data)
+            yield data
+            if length <= 0:
+                return
+    finally:
+        await chunks.aclose()
 
-    if resp.status_code == 200:
-        return resp.json()["Hash"]
-    else:
-        raise Exception(f"IPFS upload failed: {resp.status_code} {resp.text}")
 
-def download_from_ipfs_bytes(cid: str, ipfs_gateway="http://127.0.0.1:8080/ipfs/") -> bytes:
+class IpfsClient:
     """
-    Download encrypted bytes from IPFS, decrypt in-memory, return decrypted bytes.
+    Keep-alive HTTP client for the IPFS daemon API and gateway.
+
+    One pooled `requests.Session` is shared by every call, so uploads and
+    downloads reuse TCP connections instead of opening one per request.
+    Each call gets a total `deadline` (seconds) that covers all retries;
+    individual attempts are capped at `attempt_timeout` and retried with
+    exponential backoff + jitter while budget remains.
     """
 
-    url = f"{ipfs_gateway}{cid}"
-    resp = requests.get(url, timeout=60)
+    def __init__(self, api_url=IPFS_API_URL, gateway_url=IPFS_GATEWAY_URL,
+                 pool_size=10, deadline=60.0, attempt_timeout=20.0,
+                 max_retries=3, backoff=0.2):
+        self.api_url = api_url.rstrip("/")
+        self.gateway_url = gateway_url if gateway_url.endswith("/") else gateway_url + "/"
+        self.pool_size = pool_size
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            pool_size=int(os.environ.get("IPFS_POOL_SIZE", "10")),
+            deadline=float(os.environ.get("IPFS_DEADLINE", "60")),
+            attempt_timeout=float(os.environ.get("IPFS_ATTEMPT_TIMEOUT", "20")),
+            max_retries=int(os.environ.get("IPFS_MAX_RETRIES", "3")),
+        )
+
+    # --------------------------------------------------------
+    # Core request loop
+    # --------------------------------------------------------
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _request(self, method, url, deadline=None, retry=True, **kwargs):
+        budget = self.deadline if deadline is None else deadline
+        end = time.monotonic() + budget
+        attempt = 0
+
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                self._count("failures")
+                raise Exception(f"IPFS {method} {url} exceeded {budget:.1f}s deadline")
+
+            self._count("requests")
+            try:
+                resp = self.session.request(
+                    method, url, timeout=min(self.attempt_timeout, remaining), **kwargs
+                )
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                error = Exception(f"{resp.status_code} {resp.text[:200]}")
+                resp.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            attempt += 1
+            sleep = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+            if not retry or attempt > self.max_retries or time.monotonic() + sleep >= end:
+                self._count("failures")
+                raise Exception(f"IPFS {method} {url} failed after {attempt} attempt(s): {error}")
+
+            self._count("retries")
+            time.sleep(sleep)
+
+    # --------------------------------------------------------
+    # API
+    # --------------------------------------------------------
+    def add(self, raw_bytes: bytes, api_url=None, deadline=None) -> str:
+        url = api_url or f"{self.api_url}/add"
+        resp = self._request("POST", url, deadline, files={"file": ("file.bin", raw_bytes)})
+
+        if resp.status_code == 200:
+            return resp.json()["Hash"]
+        raise Exception(f"IPFS upload failed: {resp.status_code} {resp.text}")
+
+    def add_stream(self, chunks, deadline=None) -> str:
+        """
+        /add an iterable of byte chunks as one multipart file with chunked
+        transfer encoding. A consumed iterable cannot be replayed, so there
+        is a single attempt.
+        """
+        boundary = uuid.uuid4().hex
+
+        def _multipart():
+            yield (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="file"; filename="file.bin"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n"
+            ).encode()
+            yield from chunks
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        resp = self._request(
+            "POST", f"{self.api_url}/add", deadline, retry=False, data=_multipart(),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        if resp.status_code == 200:
+            return resp.json()["Hash"]
+        raise Exception(f"IPFS upload failed: {resp.status_code} {resp.text}")
+
+    def block_put(self, block: bytes, codec="raw", deadline=None, pin=False) -> str:
+        """Store one block (raw or dag-pb) and return its CIDv1 string."""
+        url = f"{self.api_url}/block/put"
+        resp = self._request(
+            "POST", url, deadline,
+            params={"cid-codec": codec, "mhtype": "sha2-256", "pin": str(bool(pin)).lower()},
+            files={"file": ("block", block)},
+        )
+
+        if resp.status_code == 200:
+            return resp.json()["Key"]
+        raise Exception(f"IPFS block put failed: {resp.status_code} {resp.text}")
 
-    if resp.status_code == 200:
-        encrypted_bytes = resp.content
-        print("RAW:", encrypted_bytes[:100])
-        decrypted_bytes = decrypt_bytes(encrypted_bytes)
-        print(decrypted_bytes[:100])
+    def pin(self, cid: str, deadline=None):
+        resp = self._request("POST", f"{self.api_url}/pin/add", deadline, params={"arg": cid})
 
-        return decrypted_bytes
-    else:
+        if resp.status_code != 200:
+            raise Exception(f"IPFS pin failed: {resp.status_code} {resp.text}")
+
+    def cat(self, cid: str, gateway_url=None, deadline=None) -> bytes:
+        url = f"{gateway_url or self.gateway_url}{cid}"
+        resp = self._request("GET", url, deadline)
+
+        if resp.status_code == 200:
+            return resp.content
         raise Exception(f"IPFS download failed: {resp.status_code} {resp.text}")
+
+    def stream(self, cid: str, gateway_url=None, deadline=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               byte_range=None):
+        """
+        Open a streaming gateway GET and return an iterator of raw bytes.
+        The deadline covers connecting and the response headers; the body
+        is read with per-read `attempt_timeout`. `byte_range=(start, end)`
+        (inclusive) asks the gateway for a slice; gateways that ignore
+        Range are sliced client-side.
+        """
+        url = f"{gateway_url or self.gateway_url}{cid}"
+        headers = {"Range": "bytes=%d-%d" % byte_range} if byte_range else None
+        resp = self._request("GET", url, deadline, stream=True, headers=headers)
+
+        if resp.status_code not in (200, 206):
+            resp.close()
+            raise Exception(f"IPFS download failed: {resp.status_code} {resp.text}")
+
+        def _gen():
+            with resp:
+                yield from resp.iter_content(chunk_size=chunk_size)
+
+        if byte_range and resp.status_code == 200:
+            return _slice(_gen(), byte_range[0], byte_range[1] - byte_range[0] + 1)
+        return _gen()
+
+    def probe(self, cid: str, size: int, gateway_url=None, deadline=None):
+        """
+        Fetch the first `size` bytes of `cid` → (head, total_size).
+        total_size is None if the gateway reports neither Content-Range
+        nor Content-Length.
+        """
+        url = f"{gateway_url or self.gateway_url}{cid}"
+        resp = self._request("GET", url, deadline, stream=True,
+                             headers={"Range": f"bytes=0-{size - 1}"})
+        with resp:
+            if resp.status_code not in (200, 206):
+                raise Exception(f"IPFS download failed: {resp.status_code} {resp.text}")
+            head = b""
+            for data in resp.iter_content(chunk_size=size):
+                head += data
+                if len(head) >= size:
+                    break
+            return head[:size], _total_size(resp.status_code, resp.headers)
+
+    # --------------------------------------------------------
+    # Metrics
+    # --------------------------------------------------------
+    def metrics(self) -> dict:
+        """Request/retry counters plus per-host urllib3 pool stats."""
+        pools = {}
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests_sent": pool.num_requests,
+                "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                "max_size": self.pool_size,
+            }
+
+        with self._lock:
+            return {**self._counters, "pools": pools}
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncIpfsClient:
+    """
+    asyncio-native counterpart of IpfsClient built on httpx.AsyncClient.
+
+    Request bodies and gateway responses are streamed, so an upload or
+    download holds at most a few chunks in memory and never blocks the
+    event loop. Retries only apply when the request body is replayable
+    (bytes); streamed uploads get a single attempt within the deadline.
+    """
+
+    def __init__(self, api_url=IPFS_API_URL, gateway_url=IPFS_GATEWAY_URL,
+                 pool_size=100, deadline=60.0, attempt_timeout=20.0,
+                 max_retries=3, backoff=0.2):
+        self.api_url = api_url.rstrip("/")
+        self.gateway_url = gateway_url if gateway_url.endswith("/") else gateway_url + "/"
+        self.pool_size = pool_size
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._client = None
+        self._counters = {"requests": 0, "retries": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            pool_size=int(os.environ.get("IPFS_ASYNC_POOL_SIZE", "100")),
+            deadline=float(os.environ.get("IPFS_DEADLINE", "60")),
+            attempt_timeout=float(os.environ.get("IPFS_ATTEMPT_TIMEOUT", "20")),
+            max_retries=int(os.environ.get("IPFS_MAX_RETRIES", "3")),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+                timeout=self.attempt_timeout,
+            )
+        return self._client
+
+    async def _send(self, method, url, deadline=None, content=None, headers=None):
+        budget = self.deadline if deadline is None else deadline
+        end = time.monotonic() + budget
+        replayable = content is None or isinstance(content, (bytes, bytearray))
+        attempt = 0
+
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                self._counters["failures"] += 1
+                raise Exception(f"IPFS {method} {url} exceeded {budget:.1f}s deadline")
+
+            self._counters["requests"] += 1
+            request = self.client.build_request(
+                method, url, content=content, headers=headers,
+                timeout=min(self.attempt_timeout, remaining),
+            )
+            try:
+                resp = await asyncio.wait_for(self.client.send(request, stream=True), remaining)
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                await resp.aread()
+                error = Exception(f"{resp.status_code} {resp.text[:200]}")
+                await resp.aclose()
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                error = e
+
+            attempt += 1
+            sleep = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+            if (not replayable or attempt > self.max_retries
+                    or time.monotonic() + sleep >= end):
+                self._counters["failures"] += 1
+                raise Exception(f"IPFS {method} {url} failed after {attempt} attempt(s): {error}")
+
+            self._counters["retries"] += 1
+            await asyncio.sleep(sleep)
+
+    async def add(self, body, api_url=None, deadline=None) -> str:
+        """
+        Upload `body` (bytes or an async iterable of bytes) as a single
+        multipart file. Iterables are sent with chunked transfer encoding.
+        """
+        url = api_url or f"{self.api_url}/add"
+        boundary = uuid.uuid4().hex
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="file.bin"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        if isinstance(body, (bytes, bytearray)):
+            content = head + bytes(body) + tail
+        else:
+            async def _multipart():
+                yield head
+                async for data in body:
+                    yield data
+                yield tail
+            content = _multipart()
+
+        resp = await self._send(
+            "POST", url, deadline, content=content,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        try:
+            await resp.aread()
+            if resp.status_code == 200:
+                return resp.json()["Hash"]
+            raise Exception(f"IPFS upload failed: {resp.status_code} {resp.text}")
+        finally:
+            await resp.aclose()
+
+    async def stream(self, cid: str, gateway_url=None, deadline=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     byte_range=None):
+        """
+        Open a streaming gateway GET and return an async iterator of raw
+        bytes. Errors surface here, before any body byte is consumed.
+        `byte_range=(start, end)` behaves as in IpfsClient.stream().
+        """
+        url = f"{gateway_url or self.gateway_url}{cid}"
+        headers = {"Range": "bytes=%d-%d" % byte_range} if byte_range else None
+        resp = await self._send("GET", url, deadline, headers=headers)
+
+        if resp.status_code not in (200, 206):
+            await resp.aread()
+            await resp.aclose()
+            raise Exception(f"IPFS download failed: {resp.status_code} {resp.text}")
+
+        async def _gen():
+            try:
+                async for data in resp.aiter_bytes(chunk_size):
+                    yield data
+            finally:
+                await resp.aclose()
+
+        if byte_range and resp.status_code == 200:
+            return _aslice(_gen(), byte_range[0], byte_range[1] - byte_range[0] + 1)
+        return _gen()
+
+    async def probe(self, cid: str, size: int, gateway_url=None, deadline=None):
+        """Async counterpart of IpfsClient.probe()."""
+        url = f"{gateway_url or self.gateway_url}{cid}"
+        resp = await self._send("GET", url, deadline, headers={"Range": f"bytes=0-{size - 1}"})
+        try:
+            if resp.status_code not in (200, 206):
+                await resp.aread()
+                raise Exception(f"IPFS download failed: {resp.status_code} {resp.text}")
+            head = b""
+            async for data in resp.aiter_bytes():
+                head += data
+                if len(head) >= size:
+                    break
+            return head[:size], _total_size(resp.status_code, resp.headers)
+        finally:
+            await resp.aclose()
+
+    def metrics(self) -> dict:
+        return dict(self._counters)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+ipfs_client = IpfsClient.from_env()
+async_ipfs_client = AsyncIpfsClient.from_env()
+cid_cache = CidCache()
+
+
+def upload_to_ipfs_bytes(raw_bytes: bytes, ipfs_api=None) -> str:
+    if use_dag_upload(len(raw_bytes)) and ipfs_api is None:
+        return upload_to_ipfs_stream([raw_bytes])
+    return ipfs_client.add(raw_bytes, api_url=ipfs_api)
+
+def upload_to_ipfs_stream(chunks, workers=UPLOAD_WORKERS) -> str:
+    """
+    Upload an iterable of byte chunks and return the CID: streamed to /add
+    by default, or as parallel raw blocks plus a locally built UnixFS root
+    when IPFS_DAG_UPLOAD_THRESHOLD is set.
+    """
+    if use_dag_upload(None):
+        return DagUploader(ipfs_client, workers=workers).upload(chunks)
+    return ipfs_client.add_stream(chunks)
+
+def download_from_ipfs_bytes(cid: str, ipfs_gateway=None) -> bytes:
+    """
+    Download encrypted bytes from IPFS (or the local CID cache),
+    decrypt in-memory, return decrypted bytes.
+    """
+    return b"".join(download_from_ipfs_stream(cid, ipfs_gateway))
+
+def download_from_ipfs_stream(cid: str, ipfs_gateway=None):
+    """
+    Stream encrypted bytes from the local CID cache, or from IPFS while
+    filling the cache, and yield decrypted chunks as they arrive.
+    The gateway request is opened eagerly so a bad CID fails before streaming starts.
+    """
+    cached = cid_cache.open(cid)
+    if cached is not None:
+        return decrypt_stream(cached)
+    return _decrypt_filling_cache(cid, ipfs_client.stream(cid, gateway_url=ipfs_gateway))
+
+async def download_from_ipfs_stream_async(cid: str, ipfs_gateway=None):
+    """
+    Async variant of download_from_ipfs_stream(). On a cache hit this
+    returns a plain iterator over the mmap (StreamingResponse runs it in
+    the threadpool); otherwise it awaits the gateway response headers and
+    returns an async iterator of decrypted chunks.
+    """
+    cached = cid_cache.open(cid)
+    if cached is not None:
+        return decrypt_stream(cached)
+    raw = await async_ipfs_client.stream(cid, gateway_url=ipfs_gateway)
+    return _decrypt_filling_cache_async(cid, raw)
+
+def _decrypt_filling_cache(cid: str, raw):
+    # Commit to the cache only once the whole bundle authenticated
+    with cid_cache.writer(cid) as w:
+        dec = StreamDecryptor()
+        for data in raw:
+            w.write(data)
+            yield from dec.feed(data)
+        yield dec.finish()
+
+async def _decrypt_filling_cache_async(cid: str, raw):
+    with cid_cache.writer(cid) as w:
+        dec = StreamDecryptor()
+        async for data in raw:
+            w.write(data)
+            for plain in dec.feed(data):
+                yield plain
+        yield dec.finish()
+
+
+#######################################################################
+# Ranged reads
+#######################################################################
+class RangedBundle:
+    """
+    A stream bundle opened for random access. `size` is the plaintext
+    length; read(start, end) yields plaintext [start, end] (inclusive)
+    after fetching and decrypting only the chunks that cover it.
+    """
+
+    def __init__(self, cid: str, layout: StreamLayout, mapped=None, gateway_url=None):
+        self.cid = cid
+        self.layout = layout
+        self.size = layout.plaintext_size
+        self._mapped = mapped
+        self._gateway_url = gateway_url
+
+    def _segments(self, start: int, end: int):
+        enc_start, enc_end = self.layout.encrypted_range(start, end)
+        if self._mapped is not None:
+            for off in range(enc_start, enc_end + 1, DEFAULT_CHUNK_SIZE):
+                yield self._mapped[off:min(off + DEFAULT_CHUNK_SIZE, enc_end + 1)]
+        else:
+            yield from ipfs_client.stream(self.cid, gateway_url=self._gateway_url,
+                                          byte_range=(enc_start, enc_end))
+
+    def read(self, start: int, end: int):
+        try:
+            yield from self.layout.decrypt_range(self._segments(start, end), start, end)
+        finally:
+            self.close()
+
+    async def aread(self, start: int, end: int):
+        """Async read; cache-backed bundles fall back to the sync path."""
+        if self._mapped is not None:
+            for data in self.read(start, end):
+                yield data
+            return
+
+        enc_start, enc_end = self.layout.encrypted_range(start, end)
+        raw = await async_ipfs_client.stream(self.cid, gateway_url=self._gateway_url,
+                                             byte_range=(enc_start, enc_end))
+        dec = RangeDecryptor(self.layout, start, end)
+        async for data in raw:
+            for plain in dec.feed(data):
+                yield plain
+        dec.finish()
+
+    def close(self):
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+
+def open_ranged(cid: str, ipfs_gateway=None):
+    """
+    Open `cid` for ranged reads from the CID cache, or with one small
+    gateway probe for the header and total size. Returns None for legacy
+    single-blob bundles (and gateways that hide the size) — callers should
+    serve the whole file instead.
+    """
+    mapped = cid_cache.open_mapped(cid)
+    if mapped is not None:
+        layout = StreamLayout.from_head(bytes(mapped[:PROBE_SIZE]), len(mapped))
+        if layout is None:
+            mapped.close()
+            return None
+        return RangedBundle(cid, layout, mapped=mapped)
+
+    head, total = ipfs_client.probe(cid, PROBE_SIZE, gateway_url=ipfs_gateway)
+    if total is None:
+        return None
+    layout = StreamLayout.from_head(head, total)
+    return RangedBundle(cid, layout, gateway_url=ipfs_gateway) if layout else None
+
+async def open_ranged_async(cid: str, ipfs_gateway=None):
+    """Async counterpart of open_ranged()."""
+    mapped = cid_cache.open_mapped(cid)
+    if mapped is not None:
+        layout = StreamLayout.from_head(bytes(mapped[:PROBE_SIZE]), len(mapped))
+        if layout is None:
+            mapped.close()
+            return None
+        return RangedBundle(cid, layout, mapped=mapped)
+
+    head, total = await async_ipfs_client.probe(cid, PROBE_SIZE, gateway_url=ipfs_gateway)
+    if total is None:
+        return None
+    layout = StreamLayout.from_head(head, total)
+    return RangedBundle(cid, layout, gateway_url=ipfs_gateway) if layout else None
@@ -0,0 +1,184 @@
+# backend/src/ipfs/key_manager.py
+#
+# Derives each file-encryption key once per process and keeps a bounded
+# LRU of ready AESGCM contexts, so request handlers never pay for key
+# derivation or cipher setup.
+
+import os
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# KDF identifiers as written into the stream header
+KDF_SHA256 = 0      # legacy: key = SHA-256(password)
+KDF_SCRYPT = 1
+
+KDF_NAMES = {"sha256": KDF_SHA256, "scrypt": KDF_SCRYPT}
+
+# scrypt cost (~32 MiB, ~0.1 s) — paid once per key per process
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+MAX_CONTEXTS = int(os.environ.get("FILE_ENCRYPT_MAX_CONTEXTS", "32"))
+
+# Key id "" means the password is supplied by the caller, not the key ring
+EXPLICIT_KID = ""
+DEFAULT_KID = "default"
+
+
+def derive_key(password: str, kdf: int = KDF_SCRYPT, kid: str = EXPLICIT_KID) -> bytes:
+    """
+    Derive a 32-byte AES-256 key from a password.
+    The scrypt salt is bound to the key id so each named key is domain-separated.
+    """
+    if kdf == KDF_SHA256:
+        return sha256(str(password).encode()).digest()
+    if kdf == KDF_SCRYPT:
+        salt = b"ehr-ipfs-kdf:" + kid.encode()
+        return Scrypt(salt=salt, length=32, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P).derive(
+            str(password).encode()
+        )
+    raise Exception(f"Unknown KDF id: {kdf}")
+
+
+def _parse_keys(spec: str) -> dict:
+    """Parse FILE_ENCRYPT_KEYS = "kid1=password1;kid2=password2"."""
+    keys = {}
+    for item in filter(None, (p.strip() for p in spec.split(";"))):
+        kid, sep, pwd = item.partition("=")
+        if not sep or not kid:
+            raise Exception(f"Malformed FILE_ENCRYPT_KEYS entry: {item!r}")
+        keys[kid.strip()] = pwd
+    return keys
+
+
+class KeyRing:
+    """
+    Named passwords plus an LRU of derived AESGCM contexts keyed by
+    (key id, kdf). New bundles are sealed under `active_kid`; old bundles
+    carry their key id in the header, so keys can be rotated by adding a
+    new entry and switching the active id.
+    """
+
+    def __init__(self, passwords: dict, active_kid: str = DEFAULT_KID,
+                 kdf: int = KDF_SCRYPT, max_contexts: int = MAX_CONTEXTS):
+        self.passwords = dict(passwords)
+        self.active_kid = active_kid
+        self.kdf = kdf
+        self.max_contexts = max_contexts
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per cache key being derived, so a cold scrypt run only
+        # blocks callers waiting for that same key
+        self._deriving = {}
+        self.derivations = 0
+
+    @classmethod
+    def from_env(cls):
+        passwords = _parse_keys(os.environ.get("FILE_ENCRYPT_KEYS", ""))
+        default_pwd = os.environ.get("FILE_ENCRYPT_PASSWORD")
+        if default_pwd is not None:
+            if passwords.get(DEFAULT_KID, default_pwd) != default_pwd:
+                raise Exception(
+                    f"FILE_ENCRYPT_PASSWORD conflicts with the {DEFAULT_KID!r} "
+                    f"entry in FILE_ENCRYPT_KEYS; set only one of them"
+                )
+            passwords[DEFAULT_KID] = default_pwd
+
+        kdf_name = os.environ.get("FILE_ENCRYPT_KDF", "scrypt").lower()
+        if kdf_name not in KDF_NAMES:
+            raise Exception(f"Unknown FILE_ENCRYPT_KDF: {kdf_name}")
+
+        return cls(
+            passwords,
+            active_kid=os.environ.get("FILE_ENCRYPT_ACTIVE_KEY", DEFAULT_KID),
+            kdf=KDF_NAMES[kdf_name],
+        )
+
+    def cipher(self, kid: str, kdf: int, password: str = "") -> AESGCM:
+        """
+        Return a cached AESGCM for (kid, kdf). An explicit `password`
+        overrides the ring and is cached under a digest of itself.
+        """
+        if password:
+            cache_key = (EXPLICIT_KID, kdf, sha256(password.encode()).digest())
+        else:
+            cache_key = (kid, kdf, None)
+
+        ctx = self._cached(cache_key)
+        if ctx is not None:
+            return ctx
+
+        if password:
+            pwd = password
+        elif kid in self.passwords:
+            pwd = self.passwords[kid]
+        else:
+            raise Exception(f"No AES password for key id {kid!r}")
+
+        with self._lock:
+            key_lock = self._deriving.setdefault(cache_key, threading.Lock())
+
+        # scrypt runs outside the ring lock; concurrent callers for the same
+        # key wait here and then find the context cached
+        with key_lock:
+            try:
+                ctx = self._cached(cache_key)
+                if ctx is not None:
+                    return ctx
+                ctx = AESGCM(derive_key(pwd, kdf, EXPLICIT_KID if password else kid))
+                with self._lock:
+                    self.derivations += 1
+                    self._contexts[cache_key] = ctx
+                    if len(self._contexts) > self.max_contexts:
+                        self._contexts.popitem(last=False)
+                return ctx
+            finally:
+                with self._lock:
+                    self._deriving.pop(cache_key, None)
+
+    def _cached(self, cache_key):
+        with self._lock:
+            ctx = self._contexts.get(cache_key)
+            if ctx is not None:
+                self._contexts.move_to_end(cache_key)
+            return ctx
+
+    def active(self, password: str = ""):
+        """(kid, kdf, AESGCM) to seal new bundles with."""
+        kid = EXPLICIT_KID if password else self.active_kid
+        return kid, self.kdf, self.cipher(kid, self.kdf, password)
+
+    def warm(self):
+        """Derive the active key up front (call at application startup)."""
+        if self.active_kid in self.passwords:
+            self.active()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "contexts": len(self._contexts),
+                "max_contexts": self.max_contexts,
+                "derivations": self.derivations,
+                "active_kid": self.active_kid,
+            }
+
+
+_keyring = None
+_keyring_lock = threading.Lock()
+
+
+def get_keyring() -> KeyRing:
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                _keyring = KeyRing.from_env()
+    return _keyring
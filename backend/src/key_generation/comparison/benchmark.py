@@ -1,6 +1,32 @@
-import time
+"""
+RSA vs ECC benchmark: key generation, sign, verify and ECDH.
+
+Every operation is timed per call with perf_counter_ns after a warmup.
+p50/p95/p99 and a 95% confidence interval for the median are computed on
+all samples (p95/p99 are left empty when there are too few runs to
+resolve them); the mean and stdev drop Tukey-fence outliers. The parallel
+pass runs the same operation in 1..N processes and reports aggregate
+throughput and scaling efficiency.
+
+Results go to results/ as CSV, plus one JSON file with the environment
+(Python, cryptography, CPU count) so runs can be compared across versions.
+
+Usage (from backend/src):
+    python -m key_generation.comparison.benchmark [--runs N] [--warmup N]
+        [--max-procs N] [--quick]
+"""
+
+import argparse
 import csv
+import json
 import os
+import platform
+import time
+import multiprocessing
+
+import cryptography
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, x25519, x448
 
 # Relative imports for the key generation algorithms
 from .rsa import generate_rsa_key_pair
@@ -8,76 +34,274 @@ from .ecc import generate_ecc_key_pair
 
 # Import all necessary functions from the metrics.py file
 from .metrics import get_rsa_key_size_bytes, get_ecc_metrics, get_equivalent_security_bits
+from .stats import summarize
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+RSA_SIZES = [2048, 3072, 4096]
+ECC_CURVES = ["SECP256R1", "SECP384R1", "SECP521R1", "SECP256K1", "Curve25519", "Curve448"]
+RSA_KEYGEN_RUNS = 20            # RSA-4096 keygen takes ~0.5 s per call
+MESSAGE = b"x" * 256
+OPERATIONS = ("keygen", "sign", "verify", "ecdh")
 
-def run_key_generation_comparison(rsa_sizes, ecc_curves, num_runs=100):
+
+def _pss():
+    return padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+
+
+def make_operation(op: str, algo: str, param):
+    """
+    Zero-argument callable performing one `op` for (algo, param), with keys
+    prepared up front; None if the combination does not exist (RSA has no
+    ECDH, X25519/X448 do not sign).
+    """
+    if op == "keygen":
+        if algo == "RSA":
+            return lambda: generate_rsa_key_pair(key_size=param)
+        return lambda: generate_ecc_key_pair(curve_name=param)
+
+    if algo == "RSA":
+        if op == "ecdh":
+            return None
+        priv, pub = generate_rsa_key_pair(key_size=param)
+        signature = priv.sign(MESSAGE, _pss(), hashes.SHA256())
+        if op == "sign":
+            return lambda: priv.sign(MESSAGE, _pss(), hashes.SHA256())
+        return lambda: pub.verify(signature, MESSAGE, _pss(), hashes.SHA256())
+
+    priv, pub = generate_ecc_key_pair(curve_name=param)
+    _, peer = generate_ecc_key_pair(curve_name=param)
+    montgomery = isinstance(priv, (x25519.X25519PrivateKey, x448.X448PrivateKey))
+
+    if op == "ecdh":
+        if montgomery:
+            return lambda: priv.exchange(peer)
+        return lambda: priv.exchange(ec.ECDH(), peer)
+
+    if montgomery:
+        return None
+    signature = priv.sign(MESSAGE, ec.ECDSA(hashes.SHA256()))
+    if op == "sign":
+        return lambda: priv.sign(MESSAGE, ec.ECDSA(hashes.SHA256()))
+    return lambda: pub.verify(signature, MESSAGE, ec.ECDSA(hashes.SHA256()))
+
+
+def measure(fn, runs: int, warmup: int) -> list:
+    """Per-call latencies in nanoseconds after `warmup` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def _runs_for(op, algo, runs):
+    return min(runs, RSA_KEYGEN_RUNS) if (op, algo) == ("keygen", "RSA") else runs
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_key_generation_comparison(rsa_sizes, ecc_curves, num_runs=100, warmup=5):
     """
     Compares RSA and ECC key generation across different key sizes/curves.
-    
+
     Args:
         rsa_sizes (list): A list of RSA key sizes to test (e.g., [2048, 3072]).
         ecc_curves (list): A list of ECC curve names to test (e.g., ["SECP256R1"]).
-        num_runs (int): Number of times to run each test to get an average.
+        num_runs (int): Timed runs per key size/curve (RSA is capped at RSA_KEYGEN_RUNS).
+        warmup (int): Untimed runs before timing starts.
     """
     results = []
 
     print("Starting RSA key generation comparison...")
     for size in rsa_sizes:
-        total_time = 0
-        key_size_bytes = 0
-        for _ in range(num_runs):
-            start_time = time.time()
-            priv, pub = generate_rsa_key_pair(key_size=size)
-            end_time = time.time()
-            total_time += (end_time - start_time)
-            key_size_bytes = get_rsa_key_size_bytes((priv, pub))
-        
-        avg_time = total_time / num_runs
-
+        stats = summarize(measure(make_operation("keygen", "RSA", size),
+                                  _runs_for("keygen", "RSA", num_runs), min(warmup, 2)))
         results.append({
             "Algorithm": "RSA",
             "Key Size (bits)": size,
-            "Key Size (bytes)": key_size_bytes,
-            "Generation Time (s)": avg_time,
-            "Equivalent Security (bits)": get_equivalent_security_bits(size, "RSA")
+            "Key Size (bytes)": get_rsa_key_size_bytes(generate_rsa_key_pair(key_size=size)),
+            "Generation Time (s)": stats["mean_us"] / 1e6,
+            "Equivalent Security (bits)": get_equivalent_security_bits(size, "RSA"),
+            **stats,
         })
 
     print("Starting ECC key generation comparison...")
     for curve in ecc_curves:
-        total_time = 0
-        key_size_bytes = 0
-        curve_size_bits = 0
-        for _ in range(num_runs):
-            start_time = time.time()
-            priv, pub = generate_ecc_key_pair(curve_name=curve)
-            end_time = time.time()
-            total_time += (end_time - start_time)
-            curve_size_bits, key_size_bytes = get_ecc_metrics((priv, pub), curve)
-            
-        avg_time = total_time / num_runs
-        
+        stats = summarize(measure(make_operation("keygen", "ECC", curve), num_runs, warmup))
+        curve_size_bits, key_size_bytes = get_ecc_metrics(generate_ecc_key_pair(curve_name=curve), curve)
         results.append({
             "Algorithm": f"{curve} ECC",
             "Key Size (bits)": curve_size_bits,
             "Key Size (bytes)": key_size_bytes,
-            "Generation Time (s)": avg_time,
-            "Equivalent Security (bits)": get_equivalent_security_bits(curve, "ECC")
+            "Generation Time (s)": stats["mean_us"] / 1e6,
+            "Equivalent Security (bits)": get_equivalent_security_bits(curve, "ECC"),
+            **stats,
         })
 
-    # Save results to a CSV file
-    output_dir = "backend/src/key_generation/comparison/results"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    csv_file_path = f"{output_dir}/rsa_ecc_comparison.csv"
-    with open(csv_file_path, "w", newline="") as f:
-        fieldnames = ["Algorithm", "Key Size (bits)", "Key Size (bytes)", "Generation Time (s)", "Equivalent Security (bits)"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(results)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    csv_file_path = os.path.join(OUTPUT_DIR, "rsa_ecc_comparison.csv")
+    _write_csv(csv_file_path, results)
 
     print(f"Comparison complete. Results saved to {csv_file_path}")
+    return results
+
+
+def _fmt_us(value) -> str:
+    return f"{'n/a':>10}" if value is None else f"{value:>10.1f}"
+
+
+def run_operation_benchmark(rsa_sizes, ecc_curves, num_runs=200, warmup=10):
+    """Latency of every (operation, algorithm) pair in one process."""
+    results = []
+    targets = [("RSA", s) for s in rsa_sizes] + [("ECC", c) for c in ecc_curves]
+
+    for op in OPERATIONS:
+        for algo, param in targets:
+            fn = make_operation(op, algo, param)
+            if fn is None:
+                continue
+            stats = summarize(measure(fn, _runs_for(op, algo, num_runs), warmup))
+            results.append({"operation": op, "algorithm": algo, "param": param, **stats})
+            print(
+                f"  {op:<7} {algo} {param!s:<11} p50 {stats['p50_us']:>10.1f} us   "
+                f"p99 {_fmt_us(stats['p99_us'])} us   [{stats['p50_ci_low_us']:.1f}, "
+                f"{stats['p50_ci_high_us']:.1f}]   outliers {stats['outliers']}"
+            )
+    return results
+
+
+_worker_fn = None
+_worker_barrier = None
+
+
+def _init_throughput_worker(op, algo, param, barrier):
+    # Key setup (an RSA keygen for sign/verify) and warmup stay out of the timing
+    global _worker_fn, _worker_barrier
+    _worker_fn = make_operation(op, algo, param)
+    _worker_fn()
+    _worker_barrier = barrier
+
+
+def _throughput_worker(count):
+    # A worker blocked here takes no other task, so all p tasks start together
+    _worker_barrier.wait()
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        _worker_fn()
+    return time.perf_counter_ns() - start
+
+
+def run_parallel_scaling(targets, max_procs, count=200):
+    """
+    Aggregate throughput of each (op, algo, param) with 1..max_procs worker
+    processes each doing `count` operations. Workers build and warm up the
+    operation in the pool initializer and start timing together from a
+    barrier; throughput is taken over the slowest worker's elapsed time.
+    """
+    results = []
+    procs = sorted({1, *[p for p in (2, 4, 8, 16, 32, 64) if p < max_procs], max_procs})
+    ctx = multiprocessing.get_context()
+
+    for op, algo, param in targets:
+        base = None
+        for p in procs:
+            barrier = ctx.Barrier(p)
+            with ctx.Pool(p, _init_throughput_worker, (op, algo, param, barrier)) as pool:
+                elapsed = pool.map(_throughput_worker, [count] * p, chunksize=1)
+            wall = max(elapsed)
+
+            ops_per_s = p * count / (wall / 1e9)
+            base = base or ops_per_s
+            row = {
+                "operation": op,
+                "algorithm": algo,
+                "param": param,
+                "processes": p,
+                "ops_per_s": round(ops_per_s, 1),
+                "speedup": round(ops_per_s / base, 2),
+                "efficiency": round(ops_per_s / (base * p), 2),
+            }
+            results.append(row)
+            print(f"  {op:<7} {algo} {param!s:<11} procs={p:<3} {row['ops_per_s']:>10}/s   x{row['speedup']}")
+    return results
+
+
+def environment() -> dict:
+    return {
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "cryptography": cryptography.__version__,
+        "openssl": _openssl_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _openssl_version():
+    try:
+        from cryptography.hazmat.backends.openssl.backend import backend
+        return backend.openssl_version_text()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSA vs ECC keygen/sign/verify/ECDH benchmark")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--max-procs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--scaling-count", type=int, default=200,
+                        help="operations per process in the scaling pass")
+    parser.add_argument("--quick", action="store_true",
+                        help="RSA-2048, P-256, secp256k1 and X25519 only")
+    args = parser.parse_args()
+
+    rsa_sizes = [2048] if args.quick else RSA_SIZES
+    ecc_curves = ["SECP256R1", "SECP256K1", "Curve25519"] if args.quick else ECC_CURVES
+
+    env = environment()
+    print(f"Environment: {env}")
+
+    keygen = run_key_generation_comparison(rsa_sizes, ecc_curves, args.runs, args.warmup)
+
+    print("Per-operation latency...")
+    latency = run_operation_benchmark(rsa_sizes, ecc_curves, args.runs, args.warmup)
+
+    print(f"Parallel scaling up to {args.max_procs} processes...")
+    scaling_targets = [
+        ("keygen", "ECC", "SECP256K1"),
+        ("sign", "ECC", "SECP256K1"),
+        ("verify", "ECC", "SECP256K1"),
+        ("ecdh", "ECC", "SECP256K1"),
+        ("sign", "RSA", 2048),
+        ("verify", "RSA", 2048),
+    ]
+    scaling = run_parallel_scaling(scaling_targets, args.max_procs, args.scaling_count)
+
+    _write_csv(os.path.join(OUTPUT_DIR, "operation_latency.csv"), latency)
+    _write_csv(os.path.join(OUTPUT_DIR, "parallel_scaling.csv"), scaling)
+
+    json_path = os.path.join(OUTPUT_DIR, "benchmark.json")
+    with open(json_path, "w") as f:
+        json.dump({
+            "environment": env,
+            "config": vars(args),
+            "keygen": keygen,
+            "latency": latency,
+            "scaling": scaling,
+        }, f, indent=2)
+
+    print(f"Benchmark complete. Results saved to {OUTPUT_DIR}")
+
 
 if __name__ == "__main__":
-    rsa_key_sizes = [2048, 3072, 4096]
-    ecc_curves = ["SECP256R1", "SECP384R1", "SECP521R1", "SECP256K1", "Curve25519", "Curve448"]
-    
-    run_key_generation_comparison(rsa_key_sizes, ecc_curves)
\ No newline at end of file
+    main()
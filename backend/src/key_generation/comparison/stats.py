@@ -0,0 +1,78 @@
+# src/key_generation/comparison/stats.py
+
+import math
+import statistics
+
+CONFIDENCE = 0.95
+TUKEY_K = 1.5           # samples outside [Q1 - k*IQR, Q3 + k*IQR] are rejected
+
+
+def percentile(sorted_samples, q):
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list."""
+    if not sorted_samples:
+        return float("nan")
+    pos = (len(sorted_samples) - 1) * q / 100
+    lo = math.floor(pos)
+    hi = math.ceil(pos)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (pos - lo)
+
+
+def reject_outliers(samples, k=TUKEY_K):
+    """Tukey fences. Returns (kept, rejected_count)."""
+    ordered = sorted(samples)
+    q1, q3 = percentile(ordered, 25), percentile(ordered, 75)
+    low, high = q1 - k * (q3 - q1), q3 + k * (q3 - q1)
+    kept = [s for s in ordered if low <= s <= high]
+    return kept, len(ordered) - len(kept)
+
+
+def median_ci(sorted_samples, confidence=CONFIDENCE):
+    """
+    Distribution-free confidence interval for the median from order
+    statistics (normal approximation to the binomial). Latency samples are
+    skewed, so this is used instead of a mean ± t·s/√n interval.
+    """
+    n = len(sorted_samples)
+    if n < 6:
+        return sorted_samples[0], sorted_samples[-1]
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    half = z * math.sqrt(n) / 2
+    lo = max(0, math.floor(n / 2 - half) - 1)
+    hi = min(n - 1, math.ceil(n / 2 + half) - 1)
+    return sorted_samples[lo], sorted_samples[hi]
+
+
+def tail_percentile(sorted_samples, q):
+    """
+    percentile(), or None when there are too few samples for q to be more
+    than the maximum (fewer than 100 / (100 - q), e.g. 100 for p99).
+    """
+    if len(sorted_samples) < 100 / (100 - q):
+        return None
+    return percentile(sorted_samples, q)
+
+
+def summarize(samples_ns) -> dict:
+    """
+    Latency summary in microseconds of per-operation samples in nanoseconds.
+    Percentiles and the median CI use every sample, since the tail is what
+    they describe; Tukey outlier rejection applies to mean/stdev only.
+    """
+    raw = sorted(s / 1000 for s in samples_ns)
+    kept, rejected = reject_outliers(raw)
+    ci_low, ci_high = median_ci(raw)
+    p50 = percentile(raw, 50)
+    p95, p99 = tail_percentile(raw, 95), tail_percentile(raw, 99)
+    return {
+        "runs": len(samples_ns),
+        "outliers": rejected,
+        "mean_us": round(statistics.fmean(kept), 3),
+        "stdev_us": round(statistics.stdev(kept), 3) if len(kept) > 1 else 0.0,
+        "p50_us": round(p50, 3),
+        "p95_us": None if p95 is None else round(p95, 3),
+        "p99_us": None if p99 is None else round(p99, 3),
+        "max_us": round(raw[-1], 3),
+        "p50_ci_low_us": round(ci_low, 3),
+        "p50_ci_high_us": round(ci_high, 3),
+        "ops_per_s": round(1e6 / p50, 1) if p50 else 0.0,
+    }
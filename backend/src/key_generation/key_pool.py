@@ -0,0 +1,147 @@
+# backend/src/key_generation/key_pool.py
+#
+# Pool of pre-generated secp256k1 identity key pairs for /ehr/generate-keys.
+# A background thread keeps KEY_POOL_SIZE pairs ready; take() hands each one
+# out exactly once and zeroes the pooled private key bytes. When the pool is
+# empty (burst larger than the pool) a pair is generated inline and counted
+# as a miss.
+#
+# The hex string returned to the caller is an immutable Python str and
+# cannot be wiped; only the pool's own copy is.
+
+import os
+import threading
+import time
+from collections import deque
+
+from cryptography.hazmat.primitives import serialization
+
+from .ecc import generate_ecc_key_pair
+
+KEY_POOL_SIZE = int(os.getenv("KEY_POOL_SIZE", "64"))
+RATE_SMOOTHING = 0.2        # EWMA weight of the newest per-key generation time
+REFILL_WINDOW = 10.0        # seconds of refills behind refill_keys_per_sec
+
+
+def _wipe(buf: bytearray):
+    buf[:] = bytes(len(buf))
+
+
+def generate_key_bytes():
+    """One fresh pair as (private scalar bytearray(32), compressed pubkey bytes(33))."""
+    sk, pk = generate_ecc_key_pair(save_to_disk=False)
+    secret = bytearray(sk.private_numbers().private_value.to_bytes(32, "big"))
+    pub = pk.public_bytes(
+        encoding=serialization.Encoding.X962,
+        format=serialization.PublicFormat.CompressedPoint
+    )
+    return secret, pub
+
+
+class KeyPool:
+    def __init__(self, size: int = KEY_POOL_SIZE):
+        self.size = size
+        self._keys = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.generated = 0
+        self.served = 0
+        self.misses = 0
+        self._sec_per_key = None
+        self._last_refill = None
+        self._refills = deque()     # monotonic times of keys added in the last REFILL_WINDOW
+
+    # ---------------- refill ----------------
+    def _prune_refills(self):
+        horizon = time.monotonic() - REFILL_WINDOW
+        while self._refills and self._refills[0] < horizon:
+            self._refills.popleft()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while len(self._keys) >= self.size and not self._stop.is_set():
+                    self._cond.wait()
+            if self._stop.is_set():
+                break
+
+            try:
+                started = time.perf_counter()
+                pair = generate_key_bytes()
+                elapsed = time.perf_counter() - started
+            except Exception as e:
+                print("KEY POOL ERROR:", e)
+                self._stop.wait(1.0)
+                continue
+
+            with self._cond:
+                self._keys.append(pair)
+                self.generated += 1
+                self._last_refill = time.time()
+                self._refills.append(time.monotonic())
+                self._prune_refills()
+                self._sec_per_key = elapsed if self._sec_per_key is None else (
+                    RATE_SMOOTHING * elapsed + (1 - RATE_SMOOTHING) * self._sec_per_key
+                )
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="key-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._cond:
+            while self._keys:
+                _wipe(self._keys.popleft()[0])
+
+    # ---------------- hand-out ----------------
+    def take(self):
+        """Remove one pair from the pool → (private_key_hex, public_key_hex)."""
+        with self._cond:
+            pair = self._keys.popleft() if self._keys else None
+            self.served += 1
+            if pair is None:
+                self.misses += 1
+            self._cond.notify()
+
+        if pair is None:
+            pair = generate_key_bytes()
+
+        secret, pub = pair
+        try:
+            return secret.hex(), pub.hex()
+        finally:
+            _wipe(secret)
+
+    def metrics(self) -> dict:
+        """
+        keygen_keys_per_sec is the raw generation speed of the refill thread;
+        refill_keys_per_sec is keys actually added per wall-clock second over
+        the last REFILL_WINDOW seconds (0 while the pool is full and idle).
+        """
+        with self._cond:
+            self._prune_refills()
+            return {
+                "depth": len(self._keys),
+                "size": self.size,
+                "generated": self.generated,
+                "served": self.served,
+                "misses": self.misses,
+                "keygen_keys_per_sec": round(1 / self._sec_per_key, 1) if self._sec_per_key else None,
+                "refill_keys_per_sec": round(len(self._refills) / REFILL_WINDOW, 1),
+                "last_refill_at": self._last_refill,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
+
+
+key_pool = KeyPool()
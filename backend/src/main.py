@@ -2,6 +2,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from ehr_routes import router as ehr_router
 from db_init import init_db
+from ipfs.key_manager import get_keyring
+from ipfs.ipfs_helper import async_ipfs_client
+from db_pool import pool as db_pool
+from event_indexer import indexer
+from key_generation.key_pool import key_pool
 
 app = FastAPI(title="Blockchain EHR API", version="1.0")
 
@@ -9,6 +14,19 @@ app = FastAPI(title="Blockchain EHR API", version="1.0")
 def startup():
     init_db()
     print("Database initialized")
+    # Pay the KDF cost once here instead of on the first /ehr request
+    get_keyring().warm()
+    # Follow AccessRegistry events into local tables for /ehr/requests/*
+    indexer.start()
+    # Keep identity key pairs ready for /ehr/generate-keys
+    key_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    indexer.stop()
+    key_pool.stop()
+    await async_ipfs_client.aclose()
+    db_pool.close()
 
 # Enable CORS for frontend (React)
 app.add_middleware(
@@ -0,0 +1,365 @@
+"""
+Batch record onboarding for hospital admins.
+
+A manifest lists (patient_id, path) pairs, as CSV with a header row or as
+JSONL objects. Each file is encrypted, uploaded to IPFS and chameleon-hashed
+by a bounded worker pool. Results are checkpointed into onboard_items in
+batches, so an interrupted job resumes where it stopped. When every item has
+been processed, all storeRecord transactions are prepared in one pass and
+written to pending_records in a single transaction, which also marks the
+items done. Each item's opening r is kept in ch_openings next to its pending
+record and only becomes a witness when the patient's storeRecord is approved,
+the same as the single-record prepare-record → approve-record flow.
+
+Files are only read from ONBOARD_ROOT, which must name a dedicated import
+directory (e.g. /srv/ehr-import) holding nothing but the files to onboard.
+There is no default: with ONBOARD_ROOT unset the admin route refuses to run,
+and a root that contains the backend itself (.env, auth.db) is rejected.
+
+Usage (from backend/src):
+    python onboarding.py manifest.csv --admin-wallet 0x... [--root DIR] [--workers N]
+    python onboarding.py --resume JOB_ID
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from web3 import Web3
+
+from db_pool import pool, DB_PATH
+from blockchain_utils import get_patient_pubkeys, store_records_bulk
+from ipfs.ipfs_helper import ipfs_client, upload_to_ipfs_stream, use_dag_upload
+from ipfs.aes_gcm import encrypt_stream, iter_file
+from chameleon_hash.ch_secp256k1 import encode_message, ch_hash, _rand_scalar
+from ch_audit import record_opening
+
+ONBOARD_ROOT = os.getenv("ONBOARD_ROOT")
+ONBOARD_WORKERS = int(os.getenv("ONBOARD_WORKERS", "8"))
+FLUSH_EVERY = 100           # item results per progress checkpoint
+
+_running = {}               # job id -> Thread
+_running_lock = threading.Lock()
+
+
+def parse_manifest(text: str) -> list:
+    """CSV (header: patient_id,path) or JSONL → [(patient_id, path), ...]"""
+    stripped = text.lstrip()
+    if stripped.startswith("{"):
+        rows = [json.loads(line) for line in stripped.splitlines() if line.strip()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(stripped)))
+
+    entries = []
+    for i, row in enumerate(rows, start=1):
+        patient_id = (row.get("patient_id") or "").strip()
+        path = (row.get("path") or "").strip()
+        if not patient_id or not path:
+            raise ValueError(f"Manifest entry {i} needs patient_id and path")
+        entries.append((patient_id, path))
+    return entries
+
+
+def _check_root(root: str) -> str:
+    """Refuse a missing root or one that would expose the server's own files."""
+    if not root:
+        raise ValueError("ONBOARD_ROOT is not set; point it at a dedicated import directory")
+    root = os.path.realpath(root)
+    if not os.path.isdir(root):
+        raise ValueError(f"Onboarding root is not a directory: {root}")
+    protected = {
+        os.path.dirname(os.path.abspath(__file__)),
+        os.path.dirname(os.path.realpath(DB_PATH)),
+    }
+    for path in protected:
+        if os.path.commonpath([path, root]) == root:
+            raise ValueError(f"Onboarding root must not contain {path}")
+    return root
+
+
+def _resolve(root: str, path: str) -> str:
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([full, os.path.realpath(root)]) != os.path.realpath(root):
+        raise ValueError(f"Path escapes onboarding root: {path}")
+    return full
+
+
+def _encrypt_upload(path: str) -> str:
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        sealed = encrypt_stream(iter_file(f))
+        if use_dag_upload(size):
+            return upload_to_ipfs_stream(sealed)
+        return ipfs_client.add(b"".join(sealed))
+
+
+class OnboardingJob:
+    def __init__(self, job_id: str, admin_wallet: str, root: str,
+                 workers: int = ONBOARD_WORKERS, db_pool=pool):
+        self.id = job_id
+        self.admin_wallet = admin_wallet
+        self.root = root
+        self.workers = workers
+        self.pool = db_pool
+
+    # ---------------- persistence ----------------
+    @classmethod
+    def create(cls, entries: list, admin_wallet: str, root: str = ONBOARD_ROOT,
+               workers: int = ONBOARD_WORKERS, db_pool=pool):
+        job = cls(uuid.uuid4().hex, admin_wallet.lower(), _check_root(root), workers, db_pool)
+        now = int(time.time())
+
+        with db_pool.connection() as db, db.transaction():
+            db.execute(
+                "INSERT INTO onboard_jobs VALUES (?,?,?,'created',?,NULL,?,?)",
+                (job.id, job.admin_wallet, job.root, len(entries), now, now),
+            )
+            db.executemany(
+                "INSERT INTO onboard_items (job_id, line, patient_id, path) VALUES (?,?,?,?)",
+                ((job.id, i, pid, path) for i, (pid, path) in enumerate(entries)),
+            )
+        return job
+
+    @classmethod
+    def load(cls, job_id: str, workers: int = ONBOARD_WORKERS, db_pool=pool):
+        with db_pool.connection() as db:
+            row = db.one("SELECT admin_wallet, root FROM onboard_jobs WHERE id=?", (job_id,))
+        if not row:
+            raise KeyError(job_id)
+        return cls(job_id, row[0], row[1], workers, db_pool)
+
+    def _set_status(self, db, status: str, error: str = None):
+        db.execute(
+            "UPDATE onboard_jobs SET status=?, error=?, updated_at=? WHERE id=?",
+            (status, error, int(time.time()), self.id),
+        )
+        db.commit()
+
+    def _flush(self, db, results: list):
+        uploaded = [r for r in results if r[1] is None]
+        failed = [r for r in results if r[1] is not None]
+        with db.transaction():
+            db.executemany(
+                """
+                UPDATE onboard_items
+                SET status='uploaded', cid=?, ch=?, r=?, record_id=?, error=NULL
+                WHERE job_id=? AND line=?
+                """,
+                ((*fields, self.id, line) for line, _, fields in uploaded),
+            )
+            db.executemany(
+                "UPDATE onboard_items SET status='failed', error=? WHERE job_id=? AND line=?",
+                ((error, self.id, line) for line, error, _ in failed),
+            )
+        results.clear()
+
+    # ---------------- pipeline ----------------
+    def _process(self, path: str, wallet: str, pub_bytes: bytes):
+        cid = _encrypt_upload(_resolve(self.root, path))
+
+        msg = encode_message(cid, True, pub_bytes)
+        r = _rand_scalar()
+        ch_hex, _ = ch_hash(msg, r, pub_bytes)
+        record_id = Web3.keccak(text=cid + wallet).hex()
+
+        return cid, ch_hex, hex(r), record_id
+
+    def _stage_upload(self, db, wallets: dict):
+        items = db.all(
+            """
+            SELECT line, patient_id, path FROM onboard_items
+            WHERE job_id=? AND status IN ('pending','failed')
+            ORDER BY line
+            """,
+            (self.id,),
+        )
+        if not items:
+            return
+
+        pubkeys = get_patient_pubkeys([w for w in wallets.values()])
+        results = []
+        pending = {}
+
+        def collect(done):
+            for fut in done:
+                line = pending.pop(fut)
+                try:
+                    results.append((line, None, fut.result()))
+                except Exception as e:
+                    results.append((line, str(e) or type(e).__name__, None))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for line, patient_id, path in items:
+                wallet = wallets.get(patient_id)
+                pub_bytes = pubkeys.get(wallet) if wallet else None
+                if wallet is None:
+                    results.append((line, "Patient not found", None))
+                elif pub_bytes is None:
+                    results.append((line, "Patient identity not registered on-chain", None))
+                else:
+                    pending[executor.submit(self._process, path, wallet, pub_bytes)] = line
+
+                if len(pending) >= self.workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if len(results) >= FLUSH_EVERY:
+                    self._flush(db, results)
+
+            collect(list(pending))
+        self._flush(db, results)
+
+    def _stage_pending_records(self, db, wallets: dict):
+        items = db.all(
+            """
+            SELECT line, patient_id, cid, ch, r, record_id FROM onboard_items
+            WHERE job_id=? AND status='uploaded'
+            ORDER BY line
+            """,
+            (self.id,),
+        )
+        if not items:
+            return
+
+        # MetaMask assigns the nonce when the patient signs, as in prepare-record
+        txs = store_records_bulk(
+            [(wallets[pid], record_id, ch, cid, True) for _, pid, cid, ch, _, record_id in items],
+            with_nonce=False,
+        )
+        now = int(time.time())
+
+        with db.transaction():
+            db.executemany(
+                """
+                INSERT INTO pending_records
+                (patient_id, admin_wallet, cid, ch, record_id, tx_data, created_at)
+                VALUES (?,?,?,?,?,?,?)
+                """,
+                (
+                    (pid, self.admin_wallet, cid, ch, record_id, json.dumps(tx), now)
+                    for (_, pid, cid, ch, _, record_id), tx in zip(items, txs)
+                ),
+            )
+            # Witnessed on approve-record, once the patient has signed
+            for _, _, cid, ch, r, record_id in items:
+                record_opening(db, record_id, ch, cid, int(r, 16), True, now)
+            db.execute(
+                "UPDATE onboard_items SET status='done' WHERE job_id=? AND status='uploaded'",
+                (self.id,),
+            )
+
+    def run(self):
+        with self.pool.connection() as db:
+            self._set_status(db, "running")
+            try:
+                # Jobs created before the root checks may point anywhere
+                _check_root(self.root)
+                wallets = dict(db.all(
+                    """
+                    SELECT u.patient_id, u.wallet FROM users u
+                    JOIN (SELECT DISTINCT patient_id FROM onboard_items WHERE job_id=?) i
+                      ON i.patient_id = u.patient_id
+                    WHERE u.role='patient'
+                    """,
+                    (self.id,),
+                ))
+                self._stage_upload(db, wallets)
+                self._stage_pending_records(db, wallets)
+            except Exception as e:
+                print("ONBOARDING ERROR:", e)
+                self._set_status(db, "failed", str(e))
+                raise
+            self._set_status(db, "done")
+
+    def start(self) -> bool:
+        """Run in a background thread. False if this job is already running."""
+        with _running_lock:
+            thread = _running.get(self.id)
+            if thread and thread.is_alive():
+                return False
+
+            def target():
+                try:
+                    self.run()
+                except Exception:
+                    pass
+                finally:
+                    with _running_lock:
+                        _running.pop(self.id, None)
+
+            thread = threading.Thread(target=target, name=f"onboard-{self.id}", daemon=True)
+            _running[self.id] = thread
+            thread.start()
+            return True
+
+    def progress(self) -> dict:
+        with self.pool.connection() as db:
+            job = db.one(
+                "SELECT status, total, error, created_at, updated_at FROM onboard_jobs WHERE id=?",
+                (self.id,),
+            )
+            counts = dict(db.all(
+                "SELECT status, COUNT(*) FROM onboard_items WHERE job_id=? GROUP BY status",
+                (self.id,),
+            ))
+            failures = db.all(
+                """
+                SELECT line, patient_id, path, error FROM onboard_items
+                WHERE job_id=? AND status='failed' ORDER BY line LIMIT 100
+                """,
+                (self.id,),
+            )
+
+        status, total, error, created_at, updated_at = job
+        return {
+            "job_id": self.id,
+            "status": status,
+            "total": total,
+            "counts": {s: counts.get(s, 0) for s in ("pending", "uploaded", "done", "failed")},
+            "error": error,
+            "failures": [
+                {"line": line, "patient_id": pid, "path": path, "error": err}
+                for line, pid, path, err in failures
+            ],
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-onboard EHR files into pending_records")
+    parser.add_argument("manifest", nargs="?", help="CSV or JSONL manifest")
+    parser.add_argument("--admin-wallet")
+    parser.add_argument("--root", help="directory manifest paths are relative to "
+                                       "(default: the manifest's directory)")
+    parser.add_argument("--workers", type=int, default=ONBOARD_WORKERS)
+    parser.add_argument("--resume", metavar="JOB_ID")
+    args = parser.parse_args()
+
+    from db_init import init_db
+    init_db()
+
+    if args.resume:
+        job = OnboardingJob.load(args.resume, workers=args.workers)
+    else:
+        if not args.manifest or not args.admin_wallet:
+            parser.error("manifest and --admin-wallet are required unless --resume is given")
+        with open(args.manifest) as f:
+            entries = parse_manifest(f.read())
+        root = args.root or os.path.dirname(os.path.abspath(args.manifest))
+        job = OnboardingJob.create(entries, args.admin_wallet, root, args.workers)
+        print(f"Created job {job.id} with {len(entries)} records")
+
+    try:
+        job.run()
+    finally:
+        print(json.dumps(job.progress(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
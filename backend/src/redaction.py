@@ -0,0 +1,438 @@
+"""
+Bulk redaction of EHR records.
+
+A job takes a set of record ids and a byte-level transform. Each record's
+current version is streamed from IPFS through decrypt → transform → encrypt
+→ block upload on a bounded worker pool, and checkpointed in redact_items.
+Then all new r values are forged with forge_r and checked in one batch with
+verify_many. All updateRecord transactions are prepared in one pass and
+stored with the items in a single transaction.
+
+Forging needs each owner's trapdoor (identity private key). Trapdoors are
+passed to run() and held in memory only; resuming a job requires them again.
+
+Transforms work on the decrypted file bytes. They are length-preserving by
+default, which keeps PDF cross-reference offsets valid. Text inside
+compressed PDF streams is not visible to them.
+"""
+
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from coincurve import PrivateKey, PublicKey
+
+from db_pool import pool
+from chain_cache import record_key
+from blockchain_utils import get_records_by_ids, get_patient_pubkeys, update_records_bulk
+from ipfs.ipfs_helper import download_from_ipfs_stream, upload_to_ipfs_stream
+from ipfs.aes_gcm import encrypt_stream, DEFAULT_CHUNK_SIZE
+from chameleon_hash.ch_secp256k1 import encode_message, forge_r
+from chameleon_hash.verify import verify_many
+from ch_audit import record_witness
+
+REDACT_WORKERS = int(os.getenv("REDACT_WORKERS", "8"))
+FLUSH_EVERY = 100           # item results per progress checkpoint
+SPOOL_MEMORY = 8 * 1024 * 1024  # transformed bytes held in memory before the first match
+
+_running = {}               # job id -> Thread
+_running_lock = threading.Lock()
+
+
+# ======================================================
+# TRANSFORMS
+# ======================================================
+class StreamReplace:
+    """
+    Streaming multi-pattern byte replacement. Keeps the last
+    (longest pattern - 1) bytes between chunks so matches that straddle a
+    chunk boundary are still found.
+    """
+
+    def __init__(self, pairs):
+        pairs = [(bytes(f), bytes(r)) for f, r in pairs if f]
+        if not pairs:
+            raise ValueError("Transform needs at least one non-empty pattern")
+        self.replacements = dict(pairs)
+        finds = sorted(self.replacements, key=len, reverse=True)
+        self.regex = re.compile(b"|".join(re.escape(f) for f in finds))
+        self.carry = len(finds[0]) - 1
+        self.tail = b""
+        self.count = 0
+
+    def _process(self, buf: bytes, final: bool) -> bytes:
+        limit = len(buf) if final else max(len(buf) - self.carry, 0)
+        out = []
+        pos = 0
+        for m in self.regex.finditer(buf):
+            if m.start() >= limit:
+                break
+            out.append(buf[pos:m.start()])
+            out.append(self.replacements[m.group()])
+            pos = m.end()
+            self.count += 1
+
+        cut = len(buf) if final else max(pos, limit)
+        out.append(buf[pos:cut])
+        self.tail = buf[cut:]
+        return b"".join(out)
+
+    def feed(self, data: bytes) -> bytes:
+        return self._process(self.tail + data, final=False)
+
+    def finish(self) -> bytes:
+        return self._process(self.tail, final=True)
+
+
+def build_transform(spec: dict) -> StreamReplace:
+    """
+    {"name": "mask", "patterns": ["..."], "mask": "X"}
+        replace each pattern with the mask character (same length)
+    {"name": "replace", "pairs": [["find", "replacement"], ...]}
+    """
+    name = spec.get("name")
+    if name == "mask":
+        mask = spec.get("mask", "X").encode()
+        if len(mask) != 1:
+            raise ValueError("mask must be a single byte")
+        return StreamReplace((p.encode(), mask * len(p.encode())) for p in spec.get("patterns", []))
+    if name == "replace":
+        return StreamReplace((f.encode(), r.encode()) for f, r in spec.get("pairs", []))
+    raise ValueError(f"Unknown transform: {name!r}")
+
+
+def _transformed(chunks, transform: StreamReplace):
+    for data in chunks:
+        out = transform.feed(data)
+        if out:
+            yield out
+    yield transform.finish()
+
+
+def _trapdoor_matches(x: int, pub_bytes: bytes) -> bool:
+    try:
+        derived = PrivateKey(x.to_bytes(32, "big")).public_key.format(compressed=True)
+        return derived == PublicKey(pub_bytes).format(compressed=True)
+    except Exception:
+        return False
+
+
+# ======================================================
+# JOB
+# ======================================================
+class RedactionJob:
+    def __init__(self, job_id: str, spec: dict, workers: int = REDACT_WORKERS, db_pool=pool):
+        self.id = job_id
+        self.spec = spec
+        self.workers = workers
+        self.pool = db_pool
+
+    # ---------------- persistence ----------------
+    @classmethod
+    def create(cls, record_ids: list, spec: dict, workers: int = REDACT_WORKERS, db_pool=pool):
+        build_transform(spec)           # reject bad specs before anything is stored
+        record_ids = list(dict.fromkeys(record_key(r) for r in record_ids))
+
+        job = cls(uuid.uuid4().hex, spec, workers, db_pool)
+        now = int(time.time())
+
+        with db_pool.connection() as db, db.transaction():
+            db.execute(
+                "INSERT INTO redact_jobs VALUES (?,?,'created',?,NULL,?,?)",
+                (job.id, json.dumps(spec), len(record_ids), now, now),
+            )
+            db.executemany(
+                "INSERT INTO redact_items (job_id, record_id) VALUES (?,?)",
+                ((job.id, record_id) for record_id in record_ids),
+            )
+        return job
+
+    @classmethod
+    def load(cls, job_id: str, workers: int = REDACT_WORKERS, db_pool=pool):
+        with db_pool.connection() as db:
+            row = db.one("SELECT transform FROM redact_jobs WHERE id=?", (job_id,))
+        if not row:
+            raise KeyError(job_id)
+        return cls(job_id, json.loads(row[0]), workers, db_pool)
+
+    def _set_status(self, db, status: str, error: str = None):
+        db.execute(
+            "UPDATE redact_jobs SET status=?, error=?, updated_at=? WHERE id=?",
+            (status, error, int(time.time()), self.id),
+        )
+        db.commit()
+
+    def _fail(self, db, failed: list):
+        """failed: [(record_id, error), ...]"""
+        db.executemany(
+            "UPDATE redact_items SET status='failed', error=? WHERE job_id=? AND record_id=?",
+            ((error, self.id, record_id) for record_id, error in failed),
+        )
+
+    def _flush(self, db, results: list):
+        with db.transaction():
+            db.executemany(
+                """
+                UPDATE redact_items
+                SET status='uploaded', owner=?, old_cid=?, new_cid=?, error=NULL
+                WHERE job_id=? AND record_id=?
+                """,
+                (
+                    (*fields, self.id, record_id)
+                    for record_id, error, fields in results if error is None
+                ),
+            )
+            self._fail(db, [(record_id, error) for record_id, error, _ in results if error is not None])
+        results.clear()
+
+    # ---------------- pipeline ----------------
+    def _transform_upload(self, old_cid: str) -> str:
+        transform = build_transform(self.spec)
+        plain = _transformed(download_from_ipfs_stream(old_cid), transform)
+
+        # Hold output back until the first match, so a record the transform
+        # does not touch is never re-encrypted or uploaded
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY) as head:
+            for data in plain:
+                head.write(data)
+                if transform.count:
+                    break
+            else:
+                raise ValueError("Transform matched nothing")
+
+            head.seek(0)
+            spooled = iter(lambda: head.read(DEFAULT_CHUNK_SIZE), b"")
+            return upload_to_ipfs_stream(encrypt_stream(itertools.chain(spooled, plain)))
+
+    def _load_state(self, db, trapdoors: dict):
+        """
+        Per open item: (owner, current cid, on-chain hash, pubkey, trapdoor,
+        old r, consent), or an error string.
+        """
+        record_ids = [r for (r,) in db.all(
+            "SELECT record_id FROM redact_items WHERE job_id=? AND status != 'done'",
+            (self.id,),
+        )]
+        records = get_records_by_ids(record_ids)
+        pubkeys = get_patient_pubkeys([rec["owner"] for rec in records if rec])
+
+        state = {}
+        for record_id, rec in zip(record_ids, records):
+            if rec is None:
+                state[record_id] = "Record not found on-chain"
+                continue
+
+            owner = rec["owner"].lower()
+            pub_bytes = pubkeys.get(owner)
+            x = trapdoors.get(owner)
+            witness = db.one(
+                "SELECT r, consent FROM ch_witnesses WHERE record_id=? AND cid=?",
+                (record_id, rec["encryptedCid"]),
+            )
+
+            if pub_bytes is None:
+                state[record_id] = "Owner identity not registered on-chain"
+            elif x is None:
+                state[record_id] = "No trapdoor key supplied for owner"
+            elif not _trapdoor_matches(x, pub_bytes):
+                state[record_id] = "Trapdoor key does not match owner identity"
+            elif witness is None:
+                state[record_id] = "No chameleon-hash witness for current version"
+            else:
+                state[record_id] = (
+                    owner, rec["encryptedCid"], rec["h"], pub_bytes, x,
+                    int(witness[0], 16), bool(witness[1]),
+                )
+        return state
+
+    def _stage_upload(self, db, state: dict):
+        todo = [r for (r,) in db.all(
+            """
+            SELECT record_id FROM redact_items
+            WHERE job_id=? AND status IN ('pending','failed')
+            """,
+            (self.id,),
+        )]
+        results = []
+        pending = {}
+
+        def collect(done):
+            for fut in done:
+                record_id, owner, old_cid = pending.pop(fut)
+                try:
+                    results.append((record_id, None, (owner, old_cid, fut.result())))
+                except Exception as e:
+                    results.append((record_id, str(e) or type(e).__name__, None))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for record_id in todo:
+                item = state.get(record_id, "Record not found on-chain")
+                if isinstance(item, str):
+                    results.append((record_id, item, None))
+                else:
+                    owner, old_cid = item[0], item[1]
+                    fut = executor.submit(self._transform_upload, old_cid)
+                    pending[fut] = (record_id, owner, old_cid)
+
+                if len(pending) >= self.workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if len(results) >= FLUSH_EVERY:
+                    self._flush(db, results)
+
+            collect(list(pending))
+        self._flush(db, results)
+
+    def _stage_forge(self, db, state: dict):
+        uploaded = db.all(
+            """
+            SELECT record_id, old_cid, new_cid FROM redact_items
+            WHERE job_id=? AND status='uploaded'
+            """,
+            (self.id,),
+        )
+        if not uploaded:
+            return
+
+        ready, failed = [], []
+        for record_id, old_cid, new_cid in uploaded:
+            item = state.get(record_id)
+            if isinstance(item, str) or item is None:
+                failed.append((record_id, item or "Record not found on-chain"))
+            elif item[1] != old_cid:
+                failed.append((record_id, "Record changed on-chain since upload; retry"))
+            else:
+                ready.append((record_id, new_cid, item))
+
+        # Batch forge, then verify every forged r against the on-chain hash
+        checks, forged = [], []
+        for record_id, new_cid, (owner, old_cid, h, pub_bytes, x, old_r, consent) in ready:
+            old_msg = encode_message(old_cid, consent, pub_bytes)
+            new_msg = encode_message(new_cid, consent, pub_bytes)
+            new_r = forge_r(old_r, x, old_msg, new_msg)
+            forged.append(new_r)
+            checks.append((new_msg, new_r, pub_bytes, h))
+
+        report = verify_many(checks)
+        bad = {f["index"] for f in report["failures"]}
+        failed += [(ready[i][0], "Forged hash does not match on-chain hash") for i in sorted(bad)]
+        good = [i for i in range(len(ready)) if i not in bad]
+
+        # No nonces: these are signed later by each owner's wallet, like prepare-record
+        txs = update_records_bulk(
+            [(ready[i][2][0], ready[i][0], ready[i][1], ready[i][2][2]) for i in good],
+            with_nonce=False,
+        )
+        now = int(time.time())
+
+        with db.transaction():
+            db.executemany(
+                """
+                UPDATE redact_items SET status='done', new_r=?, tx_data=?, error=NULL
+                WHERE job_id=? AND record_id=?
+                """,
+                (
+                    (hex(forged[i]), json.dumps(tx), self.id, ready[i][0])
+                    for i, tx in zip(good, txs)
+                ),
+            )
+            for i in good:
+                record_id, new_cid, item = ready[i]
+                record_witness(db, record_id, new_cid, forged[i], item[6], now)
+            self._fail(db, failed)
+
+    def run(self, trapdoors: dict):
+        """trapdoors: {owner wallet: private key (hex str or int)}"""
+        trapdoors = {
+            wallet.lower(): int(x, 16) if isinstance(x, str) else int(x)
+            for wallet, x in trapdoors.items()
+        }
+
+        with self.pool.connection() as db:
+            self._set_status(db, "running")
+            try:
+                state = self._load_state(db, trapdoors)
+                self._stage_upload(db, state)
+                self._stage_forge(db, state)
+            except Exception as e:
+                print("REDACTION ERROR:", e)
+                self._set_status(db, "failed", str(e))
+                raise
+            self._set_status(db, "done")
+
+    def start(self, trapdoors: dict) -> bool:
+        """Run in a background thread. False if this job is already running."""
+        with _running_lock:
+            thread = _running.get(self.id)
+            if thread and thread.is_alive():
+                return False
+
+            def target():
+                try:
+                    self.run(trapdoors)
+                except Exception:
+                    pass
+                finally:
+                    with _running_lock:
+                        _running.pop(self.id, None)
+
+            thread = threading.Thread(target=target, name=f"redact-{self.id}", daemon=True)
+            _running[self.id] = thread
+            thread.start()
+            return True
+
+    def progress(self, with_transactions: bool = False) -> dict:
+        with self.pool.connection() as db:
+            job = db.one(
+                "SELECT status, total, error, created_at, updated_at FROM redact_jobs WHERE id=?",
+                (self.id,),
+            )
+            counts = dict(db.all(
+                "SELECT status, COUNT(*) FROM redact_items WHERE job_id=? GROUP BY status",
+                (self.id,),
+            ))
+            failures = db.all(
+                """
+                SELECT record_id, error FROM redact_items
+                WHERE job_id=? AND status='failed' ORDER BY record_id LIMIT 100
+                """,
+                (self.id,),
+            )
+            done = db.all(
+                """
+                SELECT record_id, old_cid, new_cid, new_r, tx_data FROM redact_items
+                WHERE job_id=? AND status='done' ORDER BY record_id
+                """,
+                (self.id,),
+            ) if with_transactions else []
+
+        status, total, error, created_at, updated_at = job
+        out = {
+            "job_id": self.id,
+            "status": status,
+            "total": total,
+            "transform": self.spec,
+            "counts": {s: counts.get(s, 0) for s in ("pending", "uploaded", "done", "failed")},
+            "error": error,
+            "failures": [{"record_id": r, "error": e} for r, e in failures],
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+        if with_transactions:
+            out["transactions"] = [
+                {
+                    "record_id": record_id,
+                    "old_cid": old_cid,
+                    "new_cid": new_cid,
+                    "new_r": new_r,
+                    "tx_data": json.loads(tx_data),
+                }
+                for record_id, old_cid, new_cid, new_r, tx_data in done
+            ]
+        return out
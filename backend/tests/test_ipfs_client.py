@@ -0,0 +1,167 @@
+# backend/tests/test_ipfs_client.py
+#
+# IpfsClient against a local stub of the IPFS API and gateway that counts
+# accepted TCP connections, so keep-alive reuse can be asserted directly.
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ipfs.ipfs_helper import IpfsClient
+
+POOL_SIZE = 4
+
+
+class StubIpfs(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.blobs = {}
+        self.fail_next = 0          # answer this many requests with 503
+        self.delay = 0.0            # seconds to stall every request
+
+    def handle_error(self, request, client_address):
+        pass                        # clients abandoning timed-out requests
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body: bytes, content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _failing(self) -> bool:
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            if self.server.fail_next > 0:
+                self.server.fail_next -= 1
+                return True
+        return False
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        parts = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if not size:
+                self.rfile.readline()
+                return b"".join(parts)
+            parts.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self):
+        body = self._body()
+        if self._failing():
+            return self._reply(503, b"busy")
+        # Single-part multipart body: drop the part headers and closing boundary
+        boundary = body.split(b"\r\n", 1)[0]
+        body = body.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n" + boundary, 1)[0]
+        cid = f"cid{len(body)}-{hash(body) & 0xffffffff:x}"
+        with self.server.lock:
+            self.server.blobs[cid] = body
+        self._reply(200, json.dumps({"Hash": cid}).encode(), "application/json")
+
+    def do_GET(self):
+        if self._failing():
+            return self._reply(503, b"busy")
+        cid = self.path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            blob = self.server.blobs.get(cid)
+        if blob is None:
+            return self._reply(404, b"not found")
+        self._reply(200, blob)
+
+
+@pytest.fixture
+def stub():
+    server = StubIpfs()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub):
+    c = IpfsClient(api_url=f"{stub.base}/api/v0", gateway_url=f"{stub.base}/ipfs/",
+                   pool_size=POOL_SIZE, deadline=5.0, attempt_timeout=2.0,
+                   max_retries=3, backoff=0.01)
+    yield c
+    c.close()
+
+
+def test_sequential_calls_reuse_one_connection(stub, client):
+    for i in range(10):
+        cid = client.add(f"payload {i}".encode())
+        assert client.cat(cid) == f"payload {i}".encode()
+    assert stub.connections == 1
+
+
+def test_concurrent_calls_stay_within_pool(stub, client):
+    def roundtrip(i):
+        data = bytes([i % 256]) * (1000 + i)
+        return client.cat(client.add(data)) == data
+
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        assert all(ex.map(roundtrip, range(64)))
+    assert stub.connections <= POOL_SIZE
+
+
+def test_add_stream_sends_chunks_as_one_file(stub, client):
+    cid = client.add_stream(iter([b"streamed ", b"in ", b"chunks"]))
+    assert client.cat(cid) == b"streamed in chunks"
+
+
+def test_add_stream_is_not_retried(stub, client):
+    stub.fail_next = 1
+    with pytest.raises(Exception, match="after 1 attempt"):
+        client.add_stream(iter([b"once"]))
+
+
+def test_retries_busy_responses(stub, client):
+    stub.fail_next = 2
+    cid = client.add(b"retried")
+    assert client.cat(cid) == b"retried"
+    metrics = client.metrics()
+    assert metrics["retries"] == 2
+    assert metrics["failures"] == 0
+
+
+def test_gives_up_after_max_retries(stub, client):
+    stub.fail_next = 10
+    with pytest.raises(Exception, match="after 4 attempt"):
+        client.add(b"never stored")
+    assert client.metrics()["failures"] == 1
+
+
+def test_deadline_bounds_total_time(stub, client):
+    stub.delay = 0.5
+    start = time.monotonic()
+    with pytest.raises(Exception):
+        client.add(b"too slow", deadline=0.3)
+    assert time.monotonic() - start < 1.0